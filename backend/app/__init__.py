@@ -1,13 +1,15 @@
 import os
-import sqlite3
-from flask import Flask, current_app
+import time
+from flask import Flask
 from flask_cors import CORS
-from .database.connection import init_db, get_db # Import init_db and get_db directly
+from .database.startup import initialize_database
+from .database.migrations import MigrationError
 # config.py is in the parent directory (backend/), so import it directly
 from config import AppConfig
 
 def create_app(config_class=AppConfig):
     """Creates and configures the Flask application."""
+    startup_start = time.monotonic()
     app = Flask(__name__, static_folder='../../frontend/build', static_url_path='/')
     app.config.from_object(config_class)
 
@@ -15,67 +17,49 @@ def create_app(config_class=AppConfig):
     # TODO: Restrict CORS origins in production.
     CORS(app, resources={r"/api/*": {"origins": "*"}}) # Allow frontend dev server
 
-    # Initialize database check and creation logic
-    try:
-        # Ensure the data directory exists
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(app.root_path)), 'data')
-        os.makedirs(data_dir, exist_ok=True)
+    # Register database commands (like 'flask init-db') and teardown.
+    # Done before the startup check so its pooled connection is returned on teardown.
+    from .database import connection, backup, maintenance, slow_queries, plan_import
+    connection.init_app(app) # Registers init_db_command for CLI and close_db
+    slow_queries.init_app(app) # Threshold and log file for the slow-query log
+    backup.init_app(app) # Registers backup-db for CLI and starts the backup scheduler on first request
+    maintenance.init_app(app) # Same for db-maintenance and the quiet-window maintenance scheduler
+    plan_import.init_app(app) # Registers import-plan for CLI
 
-        # Perform DB initialization check directly here, within app context
+    # Create/migrate the database once per deployment. Workers started together
+    # serialize on a file lock; later ones only compare PRAGMA user_version.
+    db_startup_ms = None
+    try:
         with app.app_context():
-            db_path = current_app.config['DATABASE_URI'].replace('sqlite:///', '')
-            needs_init = False
-            if not os.path.exists(db_path):
-                app.logger.info(f"Database file not found at {db_path}. Will initialize.")
-                needs_init = True
-            else:
-                # Check if tables exist if DB file exists
-                try:
-                    db = get_db() # Get DB connection within context
-                    cursor = db.cursor()
-                    # Check for a key table (e.g., Workers)
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Workers';")
-                    if cursor.fetchone() is None:
-                        app.logger.info("Tables not found in existing database. Will initialize schema.")
-                        needs_init = True
-                    # else:
-                    #     app.logger.debug("Database schema appears initialized.")
-                except sqlite3.Error as e:
-                    app.logger.error(f"Error checking database schema: {e}. Will attempt to initialize.")
-                    needs_init = True
-                # Connection is managed by the app context (get_db/close_db)
-
-            if needs_init:
-                try:
-                    init_db() # Call the actual initialization function directly
-                    app.logger.info("Database initialized successfully.")
-                except Exception as init_e:
-                     app.logger.error(f"Database initialization failed during init_db call: {init_e}", exc_info=True)
-                     # Optionally re-raise to halt app creation if DB is critical
-                     # raise init_e
+            try:
+                db_startup_ms = initialize_database()['total_ms']
+            except MigrationError as migrate_e:
+                app.logger.error(f"Database migration failed: {migrate_e}", exc_info=True)
+                # Optionally re-raise to halt app creation if DB is critical
+                # raise migrate_e
 
     except Exception as e:
-        # Catch errors during path creation or app_context setup
+        # Catch errors during directory creation, locking or app_context setup
         app.logger.error(f"Database setup failed: {e}", exc_info=True)
         # Optionally re-raise to halt app creation
         # raise e
 
-    # Register database commands (like 'flask init-db') and teardown
-    from .database import connection
-    connection.init_app(app) # Registers init_db_command for CLI and close_db
-
     # Register blueprints
     # Import the individual blueprints from their respective files
     from .api.admin_personnel import admin_personnel_bp
     from .api.admin_projects import admin_projects_bp
     from .api.admin_definitions import admin_definitions_bp
+    from .api.admin_database import admin_database_bp
     from .api.auth import auth_bp # Import the new auth blueprint
+    from .api.changes import changes_bp
 
     # Register each blueprint with the same URL prefix
     app.register_blueprint(admin_personnel_bp, url_prefix='/api/admin')
     app.register_blueprint(admin_projects_bp, url_prefix='/api/admin')
     app.register_blueprint(admin_definitions_bp, url_prefix='/api/admin')
+    app.register_blueprint(admin_database_bp, url_prefix='/api/admin')
     app.register_blueprint(auth_bp, url_prefix='/api/auth') # Register the auth blueprint
+    app.register_blueprint(changes_bp, url_prefix='/api') # GET /api/changes
     # Add other blueprints here later (worker, etc.)
 
     # Serve React App
@@ -100,4 +84,8 @@ def create_app(config_class=AppConfig):
     def health_check():
         return "OK", 200
 
+    app.logger.info(
+        f"App startup took {(time.monotonic() - startup_start) * 1000:.1f} ms "
+        f"(database: {db_startup_ms} ms, pid {os.getpid()})"
+    )
     return app
@@ -0,0 +1,146 @@
+import logging
+import os
+from flask import Blueprint, request, jsonify, current_app
+from ..database import backup, instrumentation, maintenance, reference_cache, slow_queries
+
+# Configure logging for this blueprint
+logger = logging.getLogger(__name__)
+
+admin_database_bp = Blueprint('admin_database', __name__, url_prefix='/admin')
+
+# === Error Handler ===
+@admin_database_bp.errorhandler(Exception)
+def handle_exception(e):
+    # Log the error internally
+    logger.error(f"Unhandled exception in admin_database: {e}", exc_info=True)
+    # Return a generic error message
+    return jsonify(error="An internal server error occurred"), 500
+
+# === Backup Routes ===
+
+@admin_database_bp.route('/database/backups', methods=['GET'])
+def get_backups():
+    """List snapshots and the progress of the current/last backup of this worker."""
+    try:
+        manager = backup.get_backup_manager()
+        return jsonify(status=manager.status(), snapshots=manager.list_snapshots())
+    except Exception as e:
+        logger.error(f"Error in get_backups: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch backups"), 500
+
+@admin_database_bp.route('/database/backups', methods=['POST'])
+def create_backup():
+    """Start a snapshot in the background. Poll GET /database/backups for progress."""
+    try:
+        status = backup.get_backup_manager().start(trigger='manual')
+        return jsonify(message="Backup started", status=status), 202
+    except backup.BackupInProgress as e:
+        return jsonify(error=str(e)), 409 # Conflict
+    except Exception as e:
+        logger.error(f"Error in create_backup: {e}", exc_info=True)
+        return jsonify(error="Failed to start backup"), 500
+
+# === Maintenance Routes ===
+
+@admin_database_bp.route('/database/maintenance', methods=['GET'])
+def get_maintenance():
+    """Recent maintenance runs (from any worker), quiet windows and this worker's current run."""
+    try:
+        runner = maintenance.get_maintenance_runner()
+        windows = maintenance.parse_windows(current_app.config.get('DATABASE_MAINTENANCE_WINDOWS'))
+        return jsonify(
+            status=runner.status(),
+            windows=[f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')}" for start, end in windows],
+            runs=maintenance.get_recent_runs(request.args.get('limit', 10, type=int))
+        )
+    except Exception as e:
+        logger.error(f"Error in get_maintenance: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch maintenance status"), 500
+
+@admin_database_bp.route('/database/maintenance', methods=['POST'])
+def run_maintenance():
+    """Start a maintenance run in the background, outside the quiet windows if needed."""
+    try:
+        status = maintenance.get_maintenance_runner().start(triggered_by='manual')
+        return jsonify(message="Maintenance started", status=status), 202
+    except maintenance.MaintenanceInProgress as e:
+        return jsonify(error=str(e)), 409 # Conflict
+    except Exception as e:
+        logger.error(f"Error in run_maintenance: {e}", exc_info=True)
+        return jsonify(error="Failed to start maintenance"), 500
+
+# === Query Statistics Routes ===
+
+@admin_database_bp.route('/database/query-stats', methods=['GET'])
+def get_query_stats():
+    """Top statements of this worker process by total time, mean time and execution count.
+    Optional ?limit=N (default 10).
+    """
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        stats = instrumentation.query_stats
+        return jsonify(
+            pid=os.getpid(),
+            summary=stats.summary(),
+            most_time=stats.top(limit, sort='total'),
+            slowest=stats.top(limit, sort='mean'),
+            most_frequent=stats.top(limit, sort='count')
+        )
+    except Exception as e:
+        logger.error(f"Error in get_query_stats: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch query statistics"), 500
+
+@admin_database_bp.route('/database/query-stats', methods=['DELETE'])
+def reset_query_stats():
+    """Clear this worker's query statistics (e.g. before measuring a shift)."""
+    try:
+        instrumentation.query_stats.reset()
+        return jsonify(message="Query statistics reset"), 200
+    except Exception as e:
+        logger.error(f"Error in reset_query_stats: {e}", exc_info=True)
+        return jsonify(error="Failed to reset query statistics"), 500
+
+@admin_database_bp.route('/database/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Most recent slow statements with their query plans, newest first.
+    Read from the shared log file (all workers) when one is configured. Optional ?limit=N (default 50).
+    """
+    try:
+        log = slow_queries.slow_query_log
+        limit = max(1, min(request.args.get('limit', 50, type=int), 1000))
+        return jsonify(
+            threshold_ms=log.threshold_ms,
+            enabled=log.enabled and current_app.config.get('DATABASE_QUERY_STATS', True),
+            log_file=log.path,
+            queries=log.recent(limit)
+        )
+    except Exception as e:
+        logger.error(f"Error in get_slow_queries: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch slow queries"), 500
+
+# === Reference Data Cache Routes ===
+
+@admin_database_bp.route('/database/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Reference data cache of this worker process: entries held, lookups and hit rate per
+    cached query function.
+    """
+    try:
+        return jsonify(
+            pid=os.getpid(),
+            enabled=current_app.config.get('DATABASE_REFERENCE_CACHE', True),
+            **reference_cache.reference_cache.stats()
+        )
+    except Exception as e:
+        logger.error(f"Error in get_cache_stats: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch cache statistics"), 500
+
+@admin_database_bp.route('/database/cache-stats', methods=['DELETE'])
+def reset_cache():
+    """Empty this worker's reference data cache and its counters."""
+    try:
+        reference_cache.reference_cache.clear()
+        return jsonify(message="Reference data cache cleared"), 200
+    except Exception as e:
+        logger.error(f"Error in reset_cache: {e}", exc_info=True)
+        return jsonify(error="Failed to clear the reference data cache"), 500
@@ -1,7 +1,10 @@
 import logging
 import sqlite3
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from ..database import queries, connection # Import connection for direct db access if needed
+from ..database import station_events
+from .conditional import conditional_get
+from .streaming import json_list_response
 
 # Configure logging for this blueprint
 logger = logging.getLogger(__name__)
@@ -20,6 +23,7 @@ def handle_exception(e):
 # === House Types Routes ===
 
 @admin_definitions_bp.route('/house_types', methods=['GET'])
+@conditional_get('HouseTypes', 'HouseTypeParameters', 'HouseParameters', 'HouseTypeTipologias')
 def get_house_types():
     """Get all house types for dropdowns."""
     try:
@@ -141,6 +145,7 @@ def delete_house_type(house_type_id):
 # === House Type Tipologias Routes ===
 
 @admin_definitions_bp.route('/house_types/<int:house_type_id>/tipologias', methods=['GET'])
+@conditional_get('HouseTypeTipologias')
 def get_house_type_tipologias_route(house_type_id):
     """Get all tipologias for a specific house type."""
     try:
@@ -258,6 +263,7 @@ def delete_tipologia_route(tipologia_id):
 # === House Parameters Routes ===
 
 @admin_definitions_bp.route('/house_parameters', methods=['GET'])
+@conditional_get('HouseParameters')
 def get_house_parameters():
     """Get all house parameter definitions."""
     try:
@@ -363,6 +369,7 @@ def delete_house_parameter(parameter_id):
 # === House Type Parameters (Linking) Routes ===
 
 @admin_definitions_bp.route('/house_types/<int:house_type_id>/parameters', methods=['GET'])
+@conditional_get('HouseTypeParameters', 'HouseParameters', 'HouseTypeTipologias')
 def get_house_type_parameters(house_type_id):
     """Get all parameters assigned to a specific house type."""
     try:
@@ -477,6 +484,7 @@ def delete_parameter_from_house_type_module_route(house_type_id, parameter_id, m
 # === Multiwalls Routes ===
 
 @admin_definitions_bp.route('/house_types/<int:house_type_id>/modules/<int:module_sequence_number>/multiwalls', methods=['GET'])
+@conditional_get('Multiwalls')
 def get_house_type_module_multiwalls(house_type_id, module_sequence_number):
     """Get all multiwalls for a specific module within a house type."""
     try:
@@ -613,6 +621,7 @@ def delete_house_type_module_multiwall(multiwall_id):
 # === House Type Panels Routes ===
 
 @admin_definitions_bp.route('/house_types/<int:house_type_id>/modules/<int:module_sequence_number>/panels', methods=['GET'])
+@conditional_get('HouseTypePanels', 'Multiwalls')
 def get_house_type_module_panels(house_type_id, module_sequence_number):
     """Get all panels for a specific module within a house type."""
     try:
@@ -804,15 +813,29 @@ def delete_house_type_module_panel(house_type_panel_id):
 # === Task Definitions Routes ===
 
 @admin_definitions_bp.route('/task_definitions', methods=['GET'])
+@conditional_get('TaskDefinitions', 'HouseTypes', 'Specialties')
 def get_task_definitions():
-    """Get all task definitions."""
+    """Get all task definitions (stream=true streams the list)."""
     try:
-        task_defs = queries.get_all_task_definitions()
-        return jsonify(task_defs)
+        return json_list_response(queries.iter_task_definitions())
     except Exception as e:
         logger.error(f"Error in get_task_definitions: {e}", exc_info=True)
         return jsonify(error="Failed to fetch task definitions"), 500
 
+def _parse_task_dependencies(value):
+    """Task dependency IDs from a request (a list of IDs, possibly as strings), unique and
+    in order; None if the value is not such a list.
+    """
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        return None
+    try:
+        ids = [int(task_id) for task_id in value]
+    except (ValueError, TypeError):
+        return None
+    return list(dict.fromkeys(ids))
+
 @admin_definitions_bp.route('/task_definitions', methods=['POST'])
 def add_task_definition():
     """Add a new task definition."""
@@ -834,12 +857,12 @@ def add_task_definition():
     except (ValueError, TypeError):
         return jsonify(error="Invalid station_sequence_order, must be an integer or null"), 400
 
-    # Convert dependencies list to comma-separated string for DB storage
-    # Ensure all elements are strings before joining
-    task_dependencies_str = ",".join(map(str, task_dependencies_input)) if task_dependencies_input else None
+    task_dependencies = _parse_task_dependencies(task_dependencies_input)
+    if task_dependencies is None:
+        return jsonify(error="Invalid task_dependencies, must be a list of task definition IDs"), 400
 
     try:
-        new_id = queries.add_task_definition(name, description, house_type_id, specialty_id, station_seq_int, task_dependencies_str)
+        new_id = queries.add_task_definition(name, description, house_type_id, specialty_id, station_seq_int, task_dependencies)
         if new_id:
             # Fetch the newly created task def to return it (including related names and dependencies)
             new_task_def = queries.get_task_definition_by_id(new_id) # This query needs to exist in queries.py
@@ -850,7 +873,7 @@ def add_task_definition():
                 new_task_def_basic = {
                     'task_definition_id': new_id, 'name': name, 'description': description,
                     'house_type_id': house_type_id, 'specialty_id': specialty_id, 'station_sequence_order': station_seq_int,
-                    'task_dependencies': task_dependencies_str # Return the string format
+                    'task_dependencies': ','.join(map(str, task_dependencies)) or None # Same format as the DB mirror
                 }
                 return jsonify(new_task_def_basic), 201
         else:
@@ -871,6 +894,8 @@ def add_task_definition():
          else:
              logger.error(f"Integrity error adding task definition: {ie}", exc_info=True)
              return jsonify(error="Database integrity error"), 409
+    except ValueError as ve: # Unknown prerequisite or a dependency cycle
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error in add_task_definition: {e}", exc_info=True)
         return jsonify(error="Failed to add task definition"), 500
@@ -896,11 +921,12 @@ def update_task_definition(task_definition_id):
     except (ValueError, TypeError):
         return jsonify(error="Invalid station_sequence_order, must be an integer or null"), 400
 
-    # Convert dependencies list to comma-separated string for DB storage
-    task_dependencies_str = ",".join(map(str, task_dependencies_input)) if task_dependencies_input else None
+    task_dependencies = _parse_task_dependencies(task_dependencies_input)
+    if task_dependencies is None:
+        return jsonify(error="Invalid task_dependencies, must be a list of task definition IDs"), 400
 
     try:
-        success = queries.update_task_definition(task_definition_id, name, description, house_type_id, specialty_id, station_seq_int, task_dependencies_str)
+        success = queries.update_task_definition(task_definition_id, name, description, house_type_id, specialty_id, station_seq_int, task_dependencies)
         if success:
             # Fetch updated task definition data to include potentially changed names and dependencies
             updated_task_def = queries.get_task_definition_by_id(task_definition_id) # This query needs to exist in queries.py
@@ -911,7 +937,7 @@ def update_task_definition(task_definition_id):
                 updated_task_def_basic = {
                     'task_definition_id': task_definition_id, 'name': name, 'description': description,
                     'house_type_id': house_type_id, 'specialty_id': specialty_id, 'station_sequence_order': station_seq_int,
-                    'task_dependencies': task_dependencies_str # Return the string format
+                    'task_dependencies': ','.join(map(str, task_dependencies)) or None # Same format as the DB mirror
                 }
                 return jsonify(updated_task_def_basic)
         else:
@@ -931,6 +957,8 @@ def update_task_definition(task_definition_id):
          else:
              logger.error(f"Integrity error updating task definition {task_definition_id}: {ie}", exc_info=True)
              return jsonify(error="Database integrity error"), 409
+    except ValueError as ve: # Unknown prerequisite or a dependency cycle
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error in update_task_definition {task_definition_id}: {e}", exc_info=True)
         return jsonify(error="Failed to update task definition"), 500
@@ -962,11 +990,13 @@ def delete_task_definition(task_definition_id):
 
 
 @admin_definitions_bp.route('/task_definitions/potential_dependencies', methods=['GET'])
+@conditional_get('TaskDefinitions', 'TaskDependencies')
 def get_potential_dependencies():
     """
     Get potential task dependencies based on the station sequence order
     of the task being defined/edited.
-    Requires 'current_station_sequence_order' as a query parameter.
+    Requires 'current_station_sequence_order' as a query parameter; 'task_definition_id'
+    (optional) is the task being edited.
     """
     sequence_order_str = request.args.get('current_station_sequence_order')
 
@@ -982,11 +1012,14 @@ def get_potential_dependencies():
         except ValueError:
             return jsonify(error="Invalid 'current_station_sequence_order' parameter. Must be a positive integer."), 400
 
+    # Task being edited, if any: candidates that depend on it would create a cycle and are left out
+    task_definition_id = request.args.get('task_definition_id', type=int)
+
     try:
-        potential_deps = queries.get_potential_task_dependencies(current_sequence_order)
+        potential_deps = queries.get_potential_task_dependencies(current_sequence_order, task_definition_id)
         # Add an indicator if a potential dependency has its own dependencies
         for dep in potential_deps:
-            dep['has_dependencies'] = bool(dep.get('task_dependencies')) # True if the string is not empty/null
+            dep['has_dependencies'] = bool(dep['dependencies'])
         return jsonify(potential_deps)
     except Exception as e:
         logger.error(f"Error fetching potential task dependencies for sequence {current_sequence_order}: {e}", exc_info=True)
@@ -996,6 +1029,7 @@ def get_potential_dependencies():
 # === Stations Route (Read-only for dropdowns) ===
 
 @admin_definitions_bp.route('/stations', methods=['GET'])
+@conditional_get('Stations')
 def get_stations():
     """Get all stations for dropdowns."""
     try:
@@ -1026,76 +1060,80 @@ def get_station_overview_data(station_id):
     # which correctly fetches tasks with specialty_id IS NULL.
 
     try:
-        module_info = queries.get_current_module_for_station(station_id)
-        upcoming_module_info = None
-        tasks = []
-        panels = []
-
-        # Get station details (sequence order)
-        station_details_cursor = connection.get_db().execute("SELECT sequence_order FROM Stations WHERE station_id = ?", (station_id,))
-        station_details = station_details_cursor.fetchone()
-        station_sequence_order = station_details['sequence_order'] if station_details else None
-
-        if module_info:
-            # --- Scenario 1: Module is currently at the station ---
-            current_module_id = module_info.get('module_id')
-            current_house_type_id = module_info.get('house_type_id')
-
-            if current_module_id:
-                tasks = queries.get_tasks_for_module_at_station(
-                    station_id=station_id,
-                    module_id=current_module_id,
-                    house_type_id=current_house_type_id,
-                    worker_specialty_id=worker_specialty_id
-                )
-                # Fetch panels if applicable (Panel Line W1-W5)
-                if station_sequence_order and 1 <= station_sequence_order <= 5 and current_house_type_id and module_info.get('module_sequence_in_house'):
-                    panels = queries.get_panels_for_house_type_module(
-                        house_type_id=current_house_type_id,
-                        module_sequence_number=module_info['module_sequence_in_house']
-                    )
-            else:
-                 logger.warn(f"Module info found for station {station_id}, but module_id is missing. Info: {module_info}")
-
-        elif station_sequence_order == 1:
-            # --- Scenario 2: No module at station, AND it's the first station (Seq 1) ---
-            # Try to get the next planned module
-            upcoming_module_info = queries.get_next_planned_module()
-            if upcoming_module_info:
-                upcoming_plan_id = upcoming_module_info.get('plan_id')
-                upcoming_house_type_id = upcoming_module_info.get('house_type_id')
-
-                if upcoming_plan_id and upcoming_house_type_id:
-                    # Fetch tasks relevant to this *plan* at this station
-                    tasks = queries.get_tasks_for_plan_at_station(
-                        station_id=station_id,
-                        plan_id=upcoming_plan_id, # Pass plan_id here
-                        house_type_id=upcoming_house_type_id,
-                        worker_specialty_id=worker_specialty_id
-                    )
-                    # Fetch panels if applicable (W1 is sequence 1, so this check is relevant)
-                    if upcoming_house_type_id and upcoming_module_info.get('module_sequence_in_house'):
-                         panels = queries.get_panels_for_house_type_module(
-                            house_type_id=upcoming_house_type_id,
-                            module_sequence_number=upcoming_module_info['module_sequence_in_house']
-                         )
-                else:
-                    logger.warn(f"Upcoming module found for station {station_id}, but plan_id or house_type_id missing. Info: {upcoming_module_info}")
-                    upcoming_module_info = None # Reset if essential info is missing
-
-        # --- Scenario 3: No module at station, and it's NOT the first station ---
-        # (Handled by module_info and upcoming_module_info both being None/empty)
-
+        # Module (current, or the next planned one at the first station), tasks and panels
+        # in at most two statements; see queries.get_station_overview
+        overview = queries.get_station_overview(station_id, worker_specialty_id)
         return jsonify(
-            module=module_info,
-            upcoming_module=upcoming_module_info, # Add upcoming module info
-            tasks=tasks,
-            panels=panels
+            module=overview['module'],
+            upcoming_module=overview['upcoming_module'],
+            tasks=overview['tasks'],
+            panels=overview['panels']
         )
     except Exception as e:
         logger.error(f"Error fetching station overview data for station {station_id}: {e}", exc_info=True)
         return jsonify(error=f"Failed to fetch station overview data: {str(e)}"), 500
 
+@admin_definitions_bp.route('/station_overview/<string:station_id>/events', methods=['GET'])
+def station_overview_events(station_id):
+    """Server-Sent Events stream telling a station's tablets when to refetch its overview
+    (see database/station_events.py): a `station` event whenever the module at the station
+    changes or one of its task logs does. Reconnecting clients send Last-Event-ID (or
+    ?lastEventId=) and get a `missed` event if the station changed meanwhile. 404 for an
+    unknown station, 503 when this worker has too many subscribers.
+    """
+    try:
+        messages = station_events.get_station_watcher().subscribe(
+            station_id,
+            last_event_id=request.headers.get('Last-Event-ID') or request.args.get('lastEventId'),
+            heartbeat=current_app.config.get('STATION_EVENTS_HEARTBEAT_SECONDS', 15)
+        )
+    except KeyError:
+        return jsonify(error=f"Station {station_id} not found"), 404
+    except station_events.EventsUnavailable as eu:
+        return jsonify(error=str(eu)), 503, {'Retry-After': '30'}
+    except Exception as e:
+        logger.error(f"Error opening station events for station {station_id}: {e}", exc_info=True)
+        return jsonify(error="Failed to open station events"), 500
+    # The subscription holds no connection or request context; it is closed when the client goes away
+    return Response(messages, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Let events through a buffering reverse proxy (nginx) as they come
+    })
+
+@admin_definitions_bp.route('/station_overview', methods=['GET'])
+def get_plant_overview_data():
+    """
+    Station overviews for wall displays, in one request.
+    Optional query parameters:
+    - station_ids: comma-separated station IDs (e.g. 'W1,W2,M1'); all stations if omitted.
+    - specialty_id: filter tasks as the station page does (an integer, or 'null' for tasks
+      without specialty); tasks of every specialty if omitted.
+    """
+    station_ids_str = request.args.get('station_ids')
+    station_ids = None
+    if station_ids_str is not None:
+        station_ids = [station_id.strip() for station_id in station_ids_str.split(',') if station_id.strip()]
+        if not station_ids:
+            return jsonify(error="station_ids must list at least one station ID."), 400
+
+    worker_specialty_id = None
+    filter_by_specialty = 'specialty_id' in request.args
+    worker_specialty_id_str = request.args.get('specialty_id')
+    if worker_specialty_id_str and worker_specialty_id_str.lower() != 'null':
+        try:
+            worker_specialty_id = int(worker_specialty_id_str)
+        except ValueError:
+            return jsonify(error="Invalid specialty_id format. Must be an integer or null."), 400
+
+    try:
+        stations = queries.get_plant_overview(station_ids, worker_specialty_id, filter_by_specialty)
+        return jsonify(stations=stations)
+    except ValueError as e: # Unknown station IDs
+        return jsonify(error=str(e)), 404
+    except Exception as e:
+        logger.error(f"Error fetching plant overview data: {e}", exc_info=True)
+        return jsonify(error=f"Failed to fetch plant overview data: {str(e)}"), 500
+
 
 # === Task Operations ===
 
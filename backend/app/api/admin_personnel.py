@@ -2,6 +2,8 @@ import logging
 import sqlite3
 from flask import Blueprint, request, jsonify, current_app
 from ..database import queries, connection # Import connection if needed for direct db access
+from .conditional import conditional_get
+from .streaming import json_list_response
 
 # Configure logging for this blueprint
 logger = logging.getLogger(__name__)
@@ -20,6 +22,7 @@ def handle_exception(e):
 # === Specialties Routes ===
 
 @admin_personnel_bp.route('/specialties', methods=['GET'])
+@conditional_get('Specialties')
 def get_specialties():
     """Get all specialties."""
     try:
@@ -116,11 +119,11 @@ def delete_specialty(specialty_id):
 # === Workers Routes ===
 
 @admin_personnel_bp.route('/workers', methods=['GET'])
+@conditional_get('Workers', 'AdminTeam', 'Specialties')
 def get_workers():
-    """Get all workers."""
+    """Get all workers (stream=true streams the list)."""
     try:
-        workers = queries.get_all_workers()
-        return jsonify(workers)
+        return json_list_response(queries.iter_workers())
     except Exception as e:
         logger.error(f"Error in get_workers: {e}", exc_info=True)
         return jsonify(error="Failed to fetch workers"), 500
@@ -286,6 +289,7 @@ def delete_worker(worker_id):
 # === Admin Team Routes ===
 
 @admin_personnel_bp.route('/admin_team', methods=['GET'])
+@conditional_get('AdminTeam')
 def get_admin_team():
     """Get all admin team members."""
     try:
@@ -410,6 +414,7 @@ def delete_admin_team_member(admin_team_id):
 # === Supervisors Route ===
 
 @admin_personnel_bp.route('/supervisors', methods=['GET'])
+@conditional_get('AdminTeam')
 def get_supervisors():
     """Get all active admin team members with the 'Supervisor' role."""
     try:
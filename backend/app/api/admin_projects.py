@@ -1,7 +1,10 @@
 import logging
 import sqlite3
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from ..database import queries, connection # Import connection if needed
+from ..database import plan_import, status_feed
+from .conditional import conditional_get
+from .streaming import json_list_response
 
 # Configure logging for this blueprint
 logger = logging.getLogger(__name__)
@@ -20,6 +23,7 @@ def handle_exception(e):
 # === Projects Routes ===
 
 @admin_projects_bp.route('/projects', methods=['GET'])
+@conditional_get('Projects', 'ProjectModules', 'HouseTypes')
 def get_projects():
     """Get all projects with their associated house types."""
     try:
@@ -90,6 +94,7 @@ def add_project():
 
 
 @admin_projects_bp.route('/projects/<int:project_id>', methods=['GET'])
+@conditional_get('Projects', 'ProjectModules', 'HouseTypes')
 def get_project(project_id):
     """Get a single project by ID."""
     try:
@@ -177,6 +182,36 @@ def update_project(project_id):
         return jsonify(error="Failed to update project"), 500
 
 
+@admin_projects_bp.route('/projects/<int:project_id>/append_houses', methods=['POST'])
+def append_houses_to_project(project_id):
+    """Adds houses to an active project and plans them at the end of the production plan.
+    Body: {"house_type_id": id, "count": n}. Returns the new plan_ids.
+    """
+    data = request.get_json()
+    if not data or 'house_type_id' not in data or 'count' not in data:
+        return jsonify(error="Missing required fields (house_type_id, count)"), 400
+    try:
+        house_type_id = int(data['house_type_id'])
+        count = int(data['count'])
+    except (ValueError, TypeError):
+        return jsonify(error="Invalid house_type_id or count (must be integers)"), 400
+    if count <= 0:
+        return jsonify(error="Count must be a positive integer"), 400
+
+    try:
+        plan_ids = queries.append_houses_to_project(project_id, house_type_id, count)
+        return jsonify(plan_ids=plan_ids), 201
+    except queries.NotFoundError as nfe:
+        return jsonify(error=str(nfe)), 404
+    except queries.ProjectStateError as pse:
+        return jsonify(error=str(pse)), 409
+    except ValueError as ve:
+        return jsonify(error=str(ve)), 400
+    except Exception as e:
+        logger.error(f"Error in append_houses_to_project {project_id}: {e}", exc_info=True)
+        return jsonify(error="Failed to append houses to project"), 500
+
+
 @admin_projects_bp.route('/projects/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
     """Delete a project."""
@@ -208,8 +243,15 @@ def delete_project(project_id):
 # is now handled automatically via the PUT /projects/<id> endpoint when status changes.
 
 @admin_projects_bp.route('/production_plan', methods=['GET'])
+@conditional_get('ProductionPlan', 'HouseTypeTipologias', 'HouseTypes', 'Projects')
 def get_production_plan_route():
-    """Get production plan items with filtering, sorting, pagination."""
+    """Get production plan items with filtering, sorting, pagination.
+    With pageSize and/or cursor, returns a keyset page in plan order:
+    {"items": [...], "next_cursor": ... | null, "total": n}; pass next_cursor back as
+    cursor for the following page. Otherwise returns a list (limit/offset, sortBy,
+    sortOrder), with the matching count in X-Total-Count when limit is given;
+    stream=true streams the list (see api/streaming.py).
+    """
     try:
         # Extract query parameters
         filters = {
@@ -222,24 +264,34 @@ def get_production_plan_route():
         # Remove None values from filters
         filters = {k: v for k, v in filters.items() if v is not None}
 
+        if 'cursor' in request.args or 'pageSize' in request.args:
+            page_size = request.args.get('pageSize', queries.PLAN_PAGE_SIZE, type=int)
+            page = queries.get_production_plan_page(
+                filters=filters,
+                limit=page_size,
+                cursor=request.args.get('cursor') or None,
+                include_total=request.args.get('includeTotal', 'true').lower() != 'false'
+            )
+            return jsonify(page)
+
         sort_by = request.args.get('sortBy', 'planned_sequence')
         sort_order = request.args.get('sortOrder', 'ASC')
         limit = request.args.get('limit', type=int)
         offset = request.args.get('offset', type=int)
 
-        plan_items = queries.get_production_plan(
+        plan_items = queries.iter_production_plan(
             filters=filters,
             sort_by=sort_by,
             sort_order=sort_order,
             limit=limit,
             offset=offset
         )
-        # Could also return total count for pagination headers if needed
-        # total_count = queries.get_production_plan_count(filters=filters) # This query needs to exist
-        # response = make_response(jsonify(plan_items))
-        # response.headers['X-Total-Count'] = total_count
-        # return response
-        return jsonify(plan_items)
+        response = json_list_response(plan_items)
+        if limit is not None:
+            response.headers['X-Total-Count'] = str(queries.count_production_plan(filters=filters))
+        return response
+    except ValueError as ve: # Malformed cursor
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error in get_production_plan_route: {e}", exc_info=True)
         return jsonify(error="Failed to fetch production plan"), 500
@@ -276,6 +328,104 @@ def reorder_production_plan():
         return jsonify(error="Failed to reorder production plan"), 500
 
 
+@admin_projects_bp.route('/production_plan/move', methods=['POST'])
+def move_production_plan_items():
+    """Moves plan items just before or after another item.
+    Body: {"plan_ids": [...], "position": "before" | "after", "anchor_plan_id": id}.
+    Only the moved items (and, rarely, a few neighbours) get new planned_sequence keys;
+    they are returned so the client can update its copy of the plan.
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get('plan_ids'), list) or 'anchor_plan_id' not in data:
+        return jsonify(error="Missing or invalid 'plan_ids' list or 'anchor_plan_id' in request data"), 400
+
+    try:
+        plan_ids = [int(pid) for pid in data['plan_ids']]
+        anchor_plan_id = int(data['anchor_plan_id'])
+    except (ValueError, TypeError):
+        return jsonify(error="'plan_ids' and 'anchor_plan_id' must be integers"), 400
+
+    position = data.get('position', 'before')
+    if position not in ('before', 'after'):
+        return jsonify(error="'position' must be 'before' or 'after'"), 400
+    if not plan_ids:
+        return jsonify(error="No plan IDs provided, nothing to move"), 400
+    if anchor_plan_id in plan_ids:
+        return jsonify(error="'anchor_plan_id' cannot be one of the moved items"), 400
+
+    try:
+        updated = queries.move_production_plan_items(plan_ids, anchor_plan_id, position)
+        return jsonify(updated=updated), 200
+    except ValueError as ve: # Unknown plan items
+        return jsonify(error=str(ve)), 404
+    except Exception as e:
+        logger.error(f"Error in move_production_plan_items: {e}", exc_info=True)
+        return jsonify(error="Failed to move production plan items"), 500
+
+
+@admin_projects_bp.route('/production_plan/import', methods=['POST'])
+def import_production_plan():
+    """Imports plan items from CSV (see database/plan_import.py for the columns), sent as
+    a 'file' upload or as the raw request body. The file is streamed in chunks, not
+    loaded into memory. Query parameters: dry_run=true validates without writing;
+    chunk_size (default 500, at most plan_import.MAX_CHUNK_SIZE). Returns counts and per-line errors.
+    """
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+    chunk_size = request.args.get('chunk_size', plan_import.DEFAULT_CHUNK_SIZE, type=int)
+    if chunk_size <= 0:
+        return jsonify(error="'chunk_size' must be a positive integer"), 400
+    upload = request.files.get('file')
+    binary = upload.stream if upload is not None else request.stream
+
+    try:
+        summary = plan_import.import_plan_csv(plan_import.text_stream(binary), dry_run=dry_run, chunk_size=chunk_size)
+        return jsonify(summary), 200
+    except plan_import.PlanImportError as pie:
+        return jsonify(error=str(pie)), 400
+    except UnicodeDecodeError:
+        return jsonify(error="The file must be UTF-8 encoded CSV"), 400
+    except Exception as e:
+        logger.error(f"Error in import_production_plan: {e}", exc_info=True)
+        return jsonify(error="Failed to import production plan"), 500
+
+
+@admin_projects_bp.route('/production_plan/patch', methods=['POST'])
+def patch_production_plan_items():
+    """Applies per-item updates to plan items in one transaction.
+    Body: {"patches": [{"plan_id": id, "planned_assembly_line": ..., "tipologia_id": ...,
+    "planned_start_datetime": ..., "status": ..., "planned_sequence": ...}, ...]},
+    each patch carrying only the fields it changes. For the same changes on many items,
+    {"plan_ids": [...], "set": {field: value, ...}} is accepted too.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify(error="Missing 'patches' or 'plan_ids' and 'set' in request data"), 400
+    if 'patches' in data:
+        patches = data['patches']
+        if not isinstance(patches, list):
+            return jsonify(error="'patches' must be a list"), 400
+    elif isinstance(data.get('plan_ids'), list) and isinstance(data.get('set'), dict):
+        if 'plan_id' in data['set']:
+            return jsonify(error="'set' cannot change 'plan_id'"), 400
+        patches = [dict(data['set'], plan_id=plan_id) for plan_id in data['plan_ids']]
+    else:
+        return jsonify(error="Missing 'patches' or 'plan_ids' and 'set' in request data"), 400
+
+    if not patches:
+        return jsonify(message="No patches provided, nothing updated", updated_count=0), 200
+
+    try:
+        updated_count = queries.patch_production_plan_items(patches)
+        return jsonify(message=f"Successfully updated {updated_count} items.", updated_count=updated_count), 200
+    except queries.NotFoundError as nfe: # Unknown plan items; nothing was written
+        return jsonify(error=str(nfe)), 404
+    except ValueError as ve: # Invalid values; nothing was written
+        return jsonify(error=str(ve)), 400
+    except Exception as e:
+        logger.error(f"Error patching production plan items: {e}", exc_info=True)
+        return jsonify(error="Failed to patch production plan items"), 500
+
+
 @admin_projects_bp.route('/production_plan/change_line_bulk', methods=['POST'])
 def change_production_plan_line_bulk():
     """Updates the planned assembly line for multiple production plan items."""
@@ -336,6 +486,8 @@ def set_production_plan_tipologia_bulk():
         updated_count = queries.update_production_plan_items_tipologia_bulk(plan_ids, tipologia_id)
         # Fetch the updated items? Maybe not necessary, frontend can refetch or update locally.
         return jsonify(message=f"Successfully updated tipologia for {updated_count} items.", updated_count=updated_count), 200
+    except ValueError as ve: # Invalid value or unknown plan items
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error setting tipologia bulk for plan items: {e}", exc_info=True)
         return jsonify(error="Failed to set production plan tipologias in bulk"), 500
@@ -370,6 +522,8 @@ def set_production_plan_datetime_bulk():
     try:
         updated_count = queries.update_production_plan_items_datetime_bulk(plan_ids, new_datetime_str)
         return jsonify(message=f"Successfully updated datetime for {updated_count} items.", updated_count=updated_count), 200
+    except ValueError as ve: # Invalid value or unknown plan items
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error setting datetime bulk for plan items: {e}", exc_info=True)
         return jsonify(error="Failed to set production plan datetimes in bulk"), 500
@@ -416,12 +570,43 @@ def change_production_plan_line(plan_id):
 # === Production Status Route ===
 
 @admin_projects_bp.route('/production_status', methods=['GET'])
+@conditional_get(*status_feed.STATUS_TABLES)
 def get_production_status_route():
-    """Get current station status and all upcoming planned items."""
+    """Get current station status and a window of the upcoming planned items.
+    upcomingLimit sets the window size; upcoming_next_cursor pages through the rest
+    (here as upcomingCursor, or with GET /production_plan?status=Planned,Scheduled&cursor=...).
+    """
     try:
-        # upcoming_count parameter is removed
-        status_data = queries.get_station_status_and_upcoming() # Call without count
+        status_data = queries.get_station_status_and_upcoming(
+            upcoming_limit=request.args.get('upcomingLimit', queries.UPCOMING_WINDOW, type=int),
+            upcoming_cursor=request.args.get('upcomingCursor') or None
+        )
         return jsonify(status_data)
+    except ValueError as ve: # Malformed cursor
+        return jsonify(error=str(ve)), 400
     except Exception as e:
         logger.error(f"Error in get_production_status_route: {e}", exc_info=True)
         return jsonify(error="Failed to fetch production status"), 500
+
+@admin_projects_bp.route('/production_status/events', methods=['GET'])
+def production_status_events_route():
+    """Server-Sent Events stream of production status changes (see database/status_feed.py).
+    A `snapshot` event carries the /production_status payload; `delta` events carry only
+    what changed since the previous event. Reconnecting clients send Last-Event-ID (or
+    ?lastEventId=) and resume from there. 503 when this worker has too many subscribers.
+    """
+    try:
+        messages = status_feed.get_status_feed().subscribe(
+            last_event_id=request.headers.get('Last-Event-ID') or request.args.get('lastEventId'),
+            heartbeat=current_app.config.get('STATUS_FEED_HEARTBEAT_SECONDS', 15)
+        )
+    except status_feed.FeedUnavailable as fu:
+        return jsonify(error=str(fu)), 503, {'Retry-After': '30'}
+    except Exception as e:
+        logger.error(f"Error in production_status_events_route: {e}", exc_info=True)
+        return jsonify(error="Failed to open production status events"), 500
+    # The subscription holds no connection or request context; it is closed when the client goes away
+    return Response(messages, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Let events through a buffering reverse proxy (nginx) as they come
+    })
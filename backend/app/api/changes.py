@@ -0,0 +1,37 @@
+import logging
+from flask import Blueprint, request, jsonify
+from ..database import change_log
+
+logger = logging.getLogger(__name__)
+changes_bp = Blueprint('changes', __name__) # The url_prefix will be set during registration in create_app
+
+@changes_bp.route('/changes', methods=['GET'])
+def get_changes_route():
+    """Row-level changes since a cursor, for clients keeping local copies of the tables
+    (see database/change_log.py). Query parameters:
+    - since: next_cursor of the previous call; without it, returns the current cursor only.
+    - tables: comma-separated table names (e.g. 'ProductionPlan,Workers'); all logged tables if omitted.
+    - limit: log entries read per page (default 500, at most 5000).
+    Returns {"changes": [...], "key_columns": {...}, "next_cursor": ..., "has_more": bool}.
+    410 when the cursor is older than the log's retention: reload and start over.
+    """
+    tables = None
+    tables_str = request.args.get('tables')
+    if tables_str is not None:
+        tables = list(dict.fromkeys(table.strip() for table in tables_str.split(',') if table.strip()))
+        if not tables:
+            return jsonify(error="tables must list at least one table name."), 400
+    try:
+        page = change_log.get_changes(
+            since=request.args.get('since') or None,
+            tables=tables,
+            limit=request.args.get('limit', change_log.CHANGES_PAGE_SIZE, type=int)
+        )
+        return jsonify(page)
+    except change_log.CursorExpired as ce:
+        return jsonify(error=str(ce)), 410 # Gone
+    except ValueError as ve: # Malformed cursor or unknown table
+        return jsonify(error=str(ve)), 400
+    except Exception as e:
+        logger.error(f"Error in get_changes_route: {e}", exc_info=True)
+        return jsonify(error="Failed to fetch changes"), 500
@@ -0,0 +1,54 @@
+"""Conditional GET (ETag / If-None-Match) for admin routes, driven by table generations.
+
+Routes decorated with @conditional_get(tables...) declare the tables their
+response is built from. Before the view runs, the sum of those tables'
+generation counters (TableGenerations, bumped by triggers on every row
+change) is read with one primary-key query and used as a weak ETag. When
+the client's If-None-Match holds it, the answer is 304 Not Modified with no
+body, so the route's joins and JSON encoding are skipped. Otherwise the view
+runs and its 200 response is tagged.
+
+Responses carry Cache-Control: no-cache, so browsers keep them but
+revalidate every time. fetch() sends If-None-Match by itself and hands the
+stored body to the page on a 304, so polling clients need no changes.
+
+The generation is read before the view's queries: a change committed in
+between is in the body but not in the tag, so the next request just fetches
+it again. Tags are values of the counters, not of the file: after replacing
+the database with an older copy, clients should reload. Routes whose tables
+are not all tracked (e.g. before migration 9) run and answer as usual.
+"""
+import functools
+
+from flask import current_app, request
+
+from ..database.connection import get_db
+from ..database.migrations import tables_generation
+
+
+def conditional_get(*tables):
+    """Decorator for GET views whose response depends only on the rows of `tables`
+    (and the request URL). Disabled with DATABASE_CONDITIONAL_GET = False.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('DATABASE_CONDITIONAL_GET', True):
+                return view(*args, **kwargs)
+            generation = tables_generation(get_db(), tables)
+            if generation is None:
+                return view(*args, **kwargs)
+            etag = f"g{generation}"
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200: # Errors are not cached
+                    return response
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            response.cache_control.private = True
+            return response
+        return wrapper
+    return decorator
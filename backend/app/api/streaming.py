@@ -0,0 +1,82 @@
+"""Streamed JSON array responses for large list endpoints.
+
+List routes hand their row iterator to json_list_response(). By default it
+returns jsonify(list(rows)) as before. With ?stream=true the response is a
+generator instead: rows are pulled from the SQLite cursor while the body is
+being sent, encoded with the app's JSON provider and written roughly
+STREAM_CHUNK_BYTES at a time. Memory then stays flat whatever the result
+size, and the first bytes leave as soon as the first row is read.
+
+Flask tears the app context down as soon as the view returns, even for a
+streamed response, so the pooled connection is detached from g and returned
+to the pool when the response is closed (after the last row, or when the
+client goes away). A query that fails to start still gets the route's
+normal error response, because the first row is read before the response
+begins. A failure after that can only cut the array short: it is
+logged, and the client sees invalid JSON.
+"""
+import logging
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from ..database.connection import detach_db
+
+logger = logging.getLogger(__name__)
+
+# Encoded rows are buffered up to about this size before being handed to the server
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_STREAM_FLAG_VALUES = ('1', 'true', 'yes')
+
+_END = object()
+
+
+def wants_stream():
+    """True if the client asked for a streamed response (?stream=true)."""
+    return request.args.get('stream', '').lower() in _STREAM_FLAG_VALUES
+
+def json_list_response(rows, stream=None):
+    """Response with `rows` (an iterable of JSON-serializable items) as a JSON array,
+    streamed if `stream` (by default: if the client asked for it with wants_stream).
+    """
+    if stream is None:
+        stream = wants_stream()
+    if not stream:
+        return jsonify(list(rows))
+
+    rows = iter(rows)
+    first = next(rows, _END) # Runs the query now, so errors still reach the route's handler
+    response = Response(stream_with_context(_generate_json_array(first, rows)), mimetype='application/json')
+    response.call_on_close(detach_db()) # Runs after the generator (and the query) is closed
+    return response
+
+def _generate_json_array(first, rows):
+    try:
+        json_provider = current_app.json
+        def dumps(row):
+            return json_provider.dumps(row, separators=(',', ':')) # Compact, like jsonify outside debug mode
+        if first is _END:
+            yield '[]'
+            return
+        chunk = ['[', dumps(first)]
+        size = len(chunk[1])
+        try:
+            for row in rows:
+                encoded = dumps(row)
+                chunk.append(',')
+                chunk.append(encoded)
+                size += len(encoded) + 1
+                if size >= STREAM_CHUNK_BYTES:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        except Exception as e:
+            logger.error(f"Error while streaming {request.path}, response cut short: {e}", exc_info=True)
+            yield ''.join(chunk)
+            return
+        chunk.append(']')
+        yield ''.join(chunk)
+    finally:
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            close() # Finishes the query generator and its cursor
@@ -0,0 +1,279 @@
+"""Online snapshots of the live database with the sqlite3 backup API.
+
+Pages are copied in batches with a short sleep in between, so a backup of a
+large database never holds the CPU or disk long enough to delay tablet writes.
+In WAL mode the source connection holds one read transaction for the whole
+copy. The snapshot is consistent as of that moment, writers are never
+blocked, and the copy is not restarted when someone writes meanwhile.
+
+Snapshots are written as `<prefix>-YYYYmmdd-HHMMSS.db` (via a `.partial` file
+renamed on success) and only the newest `keep` are kept. A scheduler thread
+takes backups every `interval`; only the process holding the scheduler lock
+runs it, so several gunicorn workers produce one backup, not one each.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .connection import get_db_path
+from .locks import FileLock, RunLock
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.db'
+
+# One manager and scheduler per (process, database path), like the connection pools
+_managers = {}
+_schedulers = {}
+_lock = threading.Lock()
+
+
+class BackupInProgress(RuntimeError):
+    """Raised when a backup is requested while another one is running."""
+
+
+class BackupManager:
+    """Takes, rotates and lists snapshots of one database file."""
+
+    def __init__(self, db_path, backup_dir, keep=7, pages_per_step=256, step_sleep=0.02):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.prefix = os.path.splitext(os.path.basename(db_path))[0]
+        self._run_lock = RunLock(os.path.join(backup_dir, '.backup.lock')) # Held while a backup runs
+        self._status_lock = threading.Lock()
+        self._status = {'state': 'idle'}
+
+    # --- Public API ---
+
+    def status(self):
+        """Progress of the current (or last) backup taken by this process."""
+        with self._status_lock:
+            return dict(self._status)
+
+    def list_snapshots(self):
+        """Completed snapshots, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        snapshots = []
+        for name in os.listdir(self.backup_dir):
+            if name.startswith(self.prefix + '-') and name.endswith(SNAPSHOT_SUFFIX):
+                stat = os.stat(os.path.join(self.backup_dir, name))
+                snapshots.append({
+                    'file': name,
+                    'size_bytes': stat.st_size,
+                    'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                    'mtime': stat.st_mtime,
+                })
+        snapshots.sort(key=lambda s: s['file'], reverse=True) # Timestamped names sort chronologically
+        return snapshots
+
+    def last_snapshot_time(self):
+        snapshots = self.list_snapshots()
+        return snapshots[0]['mtime'] if snapshots else None
+
+    def run(self, trigger='manual'):
+        """Takes a snapshot now and returns the final status dict.
+        Raises BackupInProgress if a backup is already running (in any process).
+        """
+        self._acquire()
+        return self._run_locked(trigger)
+
+    def start(self, trigger='manual'):
+        """Like run(), but copies on a background thread and returns immediately."""
+        self._acquire()
+        self._set_status(state='starting', trigger=trigger)
+        threading.Thread(target=self._run_locked, args=(trigger,), name='db-backup', daemon=True).start()
+        return self.status()
+
+    # --- Internals ---
+
+    def _acquire(self):
+        if not self._run_lock.try_acquire():
+            raise BackupInProgress("A database backup is already running")
+
+    def _set_status(self, **values):
+        with self._status_lock:
+            if values.get('state') == 'starting':
+                self._status = {}
+            self._status.update(values)
+
+    def _run_locked(self, trigger):
+        """Runs a backup; the caller has acquired the run lock, which is released here."""
+        start = time.monotonic()
+        started_at = datetime.now()
+        name = f"{self.prefix}-{started_at.strftime('%Y%m%d-%H%M%S')}{SNAPSHOT_SUFFIX}"
+        target = os.path.join(self.backup_dir, name)
+        partial = target + '.partial'
+        self._set_status(
+            state='running', trigger=trigger, file=name, started_at=started_at.isoformat(timespec='seconds'),
+            pages_total=None, pages_remaining=None, percent=0.0
+        )
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._copy(partial)
+            os.replace(partial, target)
+            removed = self._rotate()
+            duration_ms = round((time.monotonic() - start) * 1000, 3)
+            self._set_status(
+                state='succeeded', percent=100.0, pages_remaining=0, duration_ms=duration_ms,
+                size_bytes=os.path.getsize(target), rotated_out=removed,
+                finished_at=datetime.now().isoformat(timespec='seconds')
+            )
+            logger.info(f"Database backup {name} ({trigger}) finished in {duration_ms:.0f} ms, removed {len(removed)} old snapshot(s)")
+        except Exception as e:
+            logger.error(f"Database backup {name} ({trigger}) failed: {e}", exc_info=True)
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._set_status(
+                state='failed', error=str(e), duration_ms=round((time.monotonic() - start) * 1000, 3),
+                finished_at=datetime.now().isoformat(timespec='seconds')
+            )
+        finally:
+            self._run_lock.release()
+        return self.status()
+
+    def _progress(self, status, remaining, total):
+        self._set_status(
+            pages_total=total, pages_remaining=remaining,
+            percent=round(100.0 * (total - remaining) / total, 1) if total else 100.0
+        )
+        # Called between steps. Connection.backup()'s own `sleep` only applies
+        # when a step hits a lock, so the pacing between batches happens here.
+        if remaining and self.step_sleep > 0:
+            time.sleep(self.step_sleep)
+
+    def _copy(self, target_path):
+        source = sqlite3.connect(f"file:{urllib.parse.quote(self.db_path)}?mode=ro", uri=True, isolation_level=None)
+        dest = sqlite3.connect(target_path)
+        try:
+            source.execute("PRAGMA busy_timeout = 5000;")
+            wal = source.execute("PRAGMA journal_mode;").fetchone()[0].lower() == 'wal'
+            if wal:
+                # Pin one read snapshot for the whole copy (see module docstring)
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(dest, pages=self.pages_per_step, progress=self._progress)
+            if wal:
+                source.execute("COMMIT")
+            # The copy inherits WAL mode; a snapshot should be one self-contained file
+            dest.execute("PRAGMA journal_mode = DELETE;")
+        finally:
+            dest.close()
+            source.close()
+
+    def _rotate(self):
+        removed = []
+        for snapshot in self.list_snapshots()[self.keep:]:
+            os.remove(os.path.join(self.backup_dir, snapshot['file']))
+            removed.append(snapshot['file'])
+        return removed
+
+
+class BackupScheduler:
+    """Background thread taking a backup every `interval` seconds.
+
+    Every process starts one, but only the process holding the scheduler lock
+    takes backups; the others keep trying, so the job moves to another worker
+    when the current one exits. The next backup is due `interval` after the
+    newest snapshot on disk, so restarts do not reset the schedule.
+    """
+
+    def __init__(self, manager, interval, lock_path, tick=60.0):
+        self.manager = manager
+        self.interval = interval
+        self.tick = min(tick, interval)
+        self._leader_lock = FileLock(lock_path)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='db-backup-scheduler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self._leader_lock.held or self._leader_lock.acquire(blocking=False):
+                    last = self.manager.last_snapshot_time()
+                    if last is None or time.time() - last >= self.interval:
+                        self.manager.run(trigger='schedule')
+            except BackupInProgress:
+                pass # A manual backup is running; it counts as this interval's backup
+            except Exception as e:
+                logger.error(f"Backup scheduler error: {e}", exc_info=True)
+            self._stop.wait(self.tick)
+
+
+def get_backup_manager():
+    """Returns this process's BackupManager for the configured database."""
+    db_path = get_db_path()
+    key = (os.getpid(), db_path)
+    manager = _managers.get(key)
+    if manager is None:
+        with _lock:
+            manager = _managers.get(key)
+            if manager is None:
+                config = current_app.config
+                manager = BackupManager(
+                    db_path,
+                    config.get('DATABASE_BACKUP_DIR') or os.path.join(os.path.dirname(db_path), 'backups'),
+                    keep=config.get('DATABASE_BACKUP_KEEP', 7),
+                    pages_per_step=config.get('DATABASE_BACKUP_PAGES_PER_STEP', 256),
+                    step_sleep=config.get('DATABASE_BACKUP_STEP_SLEEP_MS', 20) / 1000.0
+                )
+                _managers[key] = manager
+    return manager
+
+def _start_scheduler():
+    """Starts this process's backup scheduler once. Runs on the first request
+    (not in create_app) so CLI commands and a preloading gunicorn master,
+    whose threads would not survive the fork, never start one.
+    """
+    interval = current_app.config.get('DATABASE_BACKUP_INTERVAL_MINUTES', 0) * 60
+    if interval <= 0:
+        return
+    manager = get_backup_manager()
+    key = (os.getpid(), manager.db_path)
+    if key in _schedulers:
+        return
+    with _lock:
+        if key not in _schedulers:
+            _schedulers[key] = BackupScheduler(
+                manager, interval, os.path.join(manager.backup_dir, '.scheduler.lock')
+            ).start()
+
+
+@click.command('backup-db')
+@with_appcontext
+def backup_db_command():
+    """Take a snapshot of the database now."""
+    try:
+        status = get_backup_manager().run(trigger='cli')
+    except BackupInProgress as e:
+        print(e)
+        return
+    if status['state'] == 'succeeded':
+        print(f"Backup written to {status['file']} ({status['size_bytes']} bytes, {status['duration_ms']:.0f} ms).")
+    else:
+        print(f"Backup failed: {status.get('error')}")
+
+
+def init_app(app):
+    """Registers the backup CLI command and the scheduler start hook."""
+    app.before_request(_start_scheduler)
+    app.cli.add_command(backup_db_command)
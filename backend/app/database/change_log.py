@@ -0,0 +1,145 @@
+"""Incremental change feed (GET /api/changes).
+
+Triggers on CHANGE_LOG_TABLES (see migrations.change_log_triggers) append
+every insert, update and delete to ChangeLog as (change_id, table, key,
+upsert|delete), in the transaction that made the change. change_id is
+AUTOINCREMENT: it only grows and is never reused, so the last change_id a
+client has applied is its position in the log.
+
+A page holds the changes after a cursor, at most one per row (its latest):
+an upsert carries the row as it is now, read in the same snapshot as the
+log, and a delete only the key. A client keeps a local replica in sync by
+1. asking for the current cursor (no `since`);
+2. loading its lists as before;
+3. asking for the changes since the cursor from then on, applying them by key
+   and passing next_cursor back until has_more is false.
+Changes made between 1 and 2 are sent again by 3; applying them is
+idempotent. What a page costs depends on the changes since the cursor, not on
+the size of the tables.
+
+Maintenance prunes entries older than DATABASE_CHANGE_LOG_RETENTION_DAYS. A
+cursor from before the oldest entry kept, or past the newest (a database
+restored from a backup), raises CursorExpired: the client reloads from 1.
+"""
+import json
+
+from .connection import get_db
+from .migrations import CHANGE_LOG_TABLES, primary_key_columns
+from .pagination import decode_cursor, encode_cursor
+
+# Entries read per page: default and maximum
+CHANGES_PAGE_SIZE = 500
+CHANGES_PAGE_MAX = 5000
+
+_KEYS_PER_STATEMENT = 500 # Stays under SQLite's bound parameter limit for composite keys
+
+
+class CursorExpired(RuntimeError):
+    """Raised when a cursor points at changes that are no longer in the log."""
+
+
+def _head(db):
+    """The last change_id ever issued (0 if none); deleted entries do not lower it."""
+    row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+def _rows_by_key(db, table, key_columns, keys):
+    """Current rows of `table` with the given keys (tuples), as key -> dict."""
+    rows = {}
+    for start in range(0, len(keys), _KEYS_PER_STATEMENT):
+        chunk = keys[start:start + _KEYS_PER_STATEMENT]
+        if len(key_columns) == 1:
+            condition = f"{key_columns[0]} IN ({','.join('?' * len(chunk))})"
+        else:
+            row_values = ','.join(f"({','.join('?' * len(key_columns))})" for _ in chunk)
+            condition = f"({', '.join(key_columns)}) IN (VALUES {row_values})"
+        params = [value for key in chunk for value in key]
+        for row in db.execute(f"SELECT * FROM {table} WHERE {condition}", params):
+            rows[tuple(row[column] for column in key_columns)] = dict(row)
+    return rows
+
+def get_changes(since=None, tables=None, limit=CHANGES_PAGE_SIZE):
+    """
+    Changes after the cursor `since` (a next_cursor of this function; None for the current
+    position and no changes), optionally only those of `tables`. Returns {'changes',
+    'key_columns' (table -> its key columns, for the tables in this page), 'next_cursor',
+    'has_more'}. Each change is {'table', 'op': 'upsert' | 'delete', 'key': [key values]},
+    upserts with the current 'row'; a row deleted after the page's last change is reported
+    as deleted. Raises ValueError for a malformed cursor or an unknown table, and
+    CursorExpired if the log no longer has everything after `since`.
+    """
+    db = get_db()
+    limit = max(1, min(int(limit), CHANGES_PAGE_MAX))
+    if tables is not None:
+        unknown = sorted(set(tables) - set(CHANGE_LOG_TABLES))
+        if unknown:
+            raise ValueError(f"Unknown table(s): {', '.join(unknown)}")
+    after = None
+    if since is not None:
+        (after,) = decode_cursor(since, 1)
+        if not isinstance(after, int):
+            raise ValueError(f"Invalid cursor: {since!r}")
+
+    db.execute("BEGIN") # The log and the rows it points to, from one snapshot
+    try:
+        head = _head(db)
+        if after is None:
+            return {'changes': [], 'key_columns': {}, 'next_cursor': encode_cursor(head), 'has_more': False}
+        oldest = db.execute("SELECT MIN(change_id) FROM ChangeLog").fetchone()[0]
+        if after > head or after < (oldest if oldest is not None else head + 1) - 1:
+            raise CursorExpired("The change log no longer goes back to this cursor; reload and start again")
+
+        query = "SELECT change_id, table_name, row_key, operation FROM ChangeLog WHERE change_id > ?"
+        params = [after]
+        if tables is not None:
+            query += f" AND table_name IN ({','.join('?' * len(tables))})"
+            params += list(tables)
+        query += " ORDER BY change_id LIMIT ?"
+        entries = db.execute(query, params + [limit + 1]).fetchall() # One extra entry tells whether there is more
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        latest = {} # (table, row_key) -> operation, ordered by the row's last change
+        for entry in entries:
+            row = (entry['table_name'], entry['row_key'])
+            latest.pop(row, None)
+            latest[row] = entry['operation']
+        key_columns = {}
+        upserts = {}
+        for (table, row_key), operation in latest.items():
+            if table not in key_columns:
+                key_columns[table] = primary_key_columns(db, table)
+            if operation == 'upsert':
+                upserts.setdefault(table, []).append(tuple(json.loads(row_key)))
+        rows = {table: _rows_by_key(db, table, key_columns[table], keys) for table, keys in upserts.items()}
+
+        changes = []
+        for (table, row_key), operation in latest.items():
+            key = json.loads(row_key)
+            row = rows[table].get(tuple(key)) if operation == 'upsert' else None
+            if row is None:
+                changes.append({'table': table, 'op': 'delete', 'key': key})
+            else:
+                changes.append({'table': table, 'op': 'upsert', 'key': key, 'row': row})
+        return {
+            'changes': changes,
+            'key_columns': key_columns,
+            # Past the entries of other tables too, so a filtered client does not scan them again
+            'next_cursor': encode_cursor(entries[-1]['change_id'] if has_more else head),
+            'has_more': has_more,
+        }
+    finally:
+        db.rollback()
+
+def prune(conn, retention_days):
+    """Deletes the entries logged more than `retention_days` days ago; call in a write
+    transaction. Returns the number of entries deleted.
+    """
+    # change_id and changed_at grow together: scanning from the oldest entry stops at the first one kept
+    first_kept = conn.execute(
+        "SELECT change_id FROM ChangeLog WHERE changed_at >= datetime('now', ?) ORDER BY change_id LIMIT 1",
+        (f'-{int(retention_days)} days',)
+    ).fetchone()
+    if first_kept is None:
+        return conn.execute("DELETE FROM ChangeLog").rowcount
+    return conn.execute("DELETE FROM ChangeLog WHERE change_id < ?", (first_kept[0],)).rowcount
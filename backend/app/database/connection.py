@@ -1,77 +1,289 @@
 import sqlite3
 import os
+import atexit
+import functools
+import threading
+import urllib.parse
 import click
-from flask import current_app, g
+from flask import current_app, g, request, has_request_context
 from flask.cli import with_appcontext
+from .pool import ConnectionPool
+from . import writer as db_writer
+from . import migrations
+from . import instrumentation
+from . import slow_queries
 
-def get_db():
-    """Connects to the application's configured database. The connection
-    is unique for each request and will be reused if this is called
-    again.
-    """
-    if 'db' not in g:
-        db_path = current_app.config['DATABASE_URI'].replace('sqlite:///', '')
-        # Ensure the directory exists
-        db_dir = os.path.dirname(db_path)
-        if db_dir: # Check if db_dir is not empty (i.e., not just root)
-             os.makedirs(db_dir, exist_ok=True)
+# One read-write pool, one read-only pool and one writer per (process, database
+# path). Keyed on the PID so nothing created before gunicorn forks its workers
+# is shared across processes.
+_pools = {}
+_writers = {}
+_pools_lock = threading.Lock()
+
+def get_db_path():
+    """Returns the filesystem path of the configured SQLite database."""
+    return current_app.config['DATABASE_URI'].replace('sqlite:///', '')
+
+# Allowed values per pragma; anything else is rejected before it reaches SQL.
+_PROFILE_PRAGMAS = {
+    'busy_timeout': int, # Applied first so the journal_mode switch can wait on locks
+    'auto_vacuum': ('NONE', 'FULL', 'INCREMENTAL'), # Only takes effect on a new, empty database (before WAL)
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'cache_size': int,
+    'mmap_size': int,
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
 
-        g.db = sqlite3.connect(
+def get_profile(config):
+    """Returns the pragma dict of the database profile selected in `config`."""
+    name = config.get('DATABASE_PROFILE')
+    profiles = config.get('DATABASE_PROFILES', {})
+    if not name:
+        return {}
+    if name not in profiles:
+        raise ValueError(f"Unknown DATABASE_PROFILE '{name}'. Must be one of {sorted(profiles)}")
+    return profiles[name]
+
+def apply_profile(conn, profile):
+    """Applies a durability/concurrency profile (dict of pragma -> value) to a connection."""
+    unknown = set(profile) - set(_PROFILE_PRAGMAS)
+    if unknown:
+        raise ValueError(f"Unsupported pragma(s) in database profile: {sorted(unknown)}")
+    for pragma, allowed in _PROFILE_PRAGMAS.items():
+        if pragma not in profile:
+            continue
+        value = profile[pragma]
+        if allowed is int:
+            value = int(value)
+        else:
+            value = str(value).upper()
+            if value not in allowed:
+                raise ValueError(f"Invalid value for PRAGMA {pragma}: {profile[pragma]}. Must be one of {allowed}")
+        conn.execute(f"PRAGMA {pragma} = {value};")
+
+# Requests with these methods only read, so they are served from the read-only pool
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# journal_mode and auto_vacuum are properties of the database file; read-only connections cannot change them
+_READ_ONLY_SKIPPED_PRAGMAS = ('journal_mode', 'auto_vacuum')
+
+def _connect(db_path, profile=None, read_only=False, factory=sqlite3.Connection):
+    """Opens and configures a new connection. Pragmas are applied once here,
+    pooled connections keep them for their whole lifetime.
+    Read-only connections are opened with mode=ro and PRAGMA query_only, so
+    they never take the write lock even by accident.
+    """
+    if read_only:
+        conn = sqlite3.connect(
+            f"file:{urllib.parse.quote(db_path)}?mode=ro",
+            uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=factory
+        )
+    else:
+        conn = sqlite3.connect(
             db_path,
-            detect_types=sqlite3.PARSE_DECLTYPES
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False, # Pooled connections are handed between request threads
+            factory=factory
         )
-        g.db.row_factory = sqlite3.Row # Return rows that behave like dicts
-        g.db.execute("PRAGMA foreign_keys = ON;") # Enforce foreign key constraints
+    conn.row_factory = sqlite3.Row # Return rows that behave like dicts
+    conn.execute("PRAGMA foreign_keys = ON;") # Enforce foreign key constraints
+    if profile:
+        if read_only:
+            profile = {k: v for k, v in profile.items() if k not in _READ_ONLY_SKIPPED_PRAGMAS}
+        apply_profile(conn, profile)
+    if read_only:
+        conn.execute("PRAGMA query_only = ON;")
+    return conn
+
+def _connection_factory():
+    """Connection class for pooled and writer connections: instrumented unless
+    DATABASE_QUERY_STATS is off (see instrumentation.py).
+    """
+    if current_app.config.get('DATABASE_QUERY_STATS', True):
+        return instrumentation.InstrumentedConnection
+    return sqlite3.Connection
+
+def get_pool(read_only=False):
+    """Returns this process's read-write or read-only connection pool, creating it on first use."""
+    db_path = get_db_path()
+    key = (os.getpid(), db_path, read_only)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # Ensure the directory exists (once per pool, not per request)
+                db_dir = os.path.dirname(db_path)
+                if db_dir: # Check if db_dir is not empty (i.e., not just root)
+                    os.makedirs(db_dir, exist_ok=True)
+                profile = get_profile(current_app.config)
+                factory = _connection_factory()
+                if read_only:
+                    size = current_app.config.get('DATABASE_READ_POOL_SIZE', 16)
+                else:
+                    size = current_app.config.get('DATABASE_POOL_SIZE', 8)
+                pool = ConnectionPool(
+                    lambda: _connect(db_path, profile, read_only=read_only, factory=factory),
+                    max_size=size,
+                    timeout=current_app.config.get('DATABASE_POOL_TIMEOUT', 10.0)
+                )
+                _pools[key] = pool
+    return pool
+
+def get_pool_stats():
+    """Returns stats for this process's pools, keyed 'read_write'/'read_only'."""
+    pid = os.getpid()
+    return {
+        ('read_only' if read_only else 'read_write'): pool.stats()
+        for (pool_pid, _, read_only), pool in list(_pools.items())
+        if pool_pid == pid
+    }
+
+def _use_read_only_pool():
+    """GET/HEAD/OPTIONS requests read from the read-only pool; everything
+    else (write routes, CLI commands, startup) uses the read-write pool.
+    """
+    return (
+        current_app.config.get('DATABASE_READ_ONLY_GETS', True)
+        and has_request_context()
+        and request.method in READ_ONLY_METHODS
+    )
+
+def get_writer():
+    """Returns the single-writer thread for this process, or None if disabled."""
+    if not current_app.config.get('DATABASE_WRITER_ENABLED', True):
+        return None
+    db_path = get_db_path()
+    key = (os.getpid(), db_path)
+    writer = _writers.get(key)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                profile = get_profile(current_app.config)
+                factory = _connection_factory()
+                writer = db_writer.DatabaseWriter(
+                    lambda: _connect(db_path, profile, factory=factory),
+                    max_batch=current_app.config.get('DATABASE_WRITER_MAX_BATCH', 64),
+                    batch_window=current_app.config.get('DATABASE_WRITER_BATCH_WINDOW_MS', 2) / 1000.0
+                )
+                writer.start()
+                atexit.register(writer.stop, 5) # Flush queued writes on interpreter exit
+                _writers[key] = writer
+    return writer
+
+def write_operation(fn):
+    """Decorator for query functions that modify the database. Calls are
+    executed on the process's writer thread (group-committed with other
+    concurrent writes) and the caller blocks until the batch has committed.
+    Calls made from the writer thread itself (nested write functions) run inline.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if db_writer.current_connection() is not None:
+            return fn(*args, **kwargs)
+        writer = get_writer()
+        if writer is None:
+            return fn(*args, **kwargs)
+        # Statements run on the writer thread are attributed to this request's route
+        route = slow_queries.current_route()
+        return writer.run(slow_queries.with_route(fn, route), *args, timeout=current_app.config.get('DATABASE_WRITER_TIMEOUT', 30), **kwargs)
+    return wrapper
+
+def get_db():
+    """Borrows a connection from the process-wide pool. The connection is
+    unique for each request and will be reused if this is called again;
+    it goes back to the pool when the app context is torn down.
+    Read-only requests get a read-only connection (see _use_read_only_pool).
+    On the writer thread this returns the write connection instead.
+    """
+    writer_conn = db_writer.current_connection()
+    if writer_conn is not None:
+        return writer_conn
+
+    if 'db' not in g:
+        pool = get_pool(read_only=_use_read_only_pool())
+        g.db = pool.acquire()
+        g.db_pool = pool
 
     return g.db
 
 def close_db(e=None):
-    """Closes the database connection."""
+    """Returns the request's connection to the pool it was borrowed from."""
     db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
 
     if db is not None:
-        db.close()
+        pool.release(db)
+
+def detach_db():
+    """Takes the request's connection out of the app context, so teardown does not
+    return it to the pool, and returns a function that does. Used by streamed
+    responses, which keep reading from a cursor after the view has returned.
+    """
+    db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
+
+    def release():
+        if db is not None:
+            pool.release(db)
+    return release
 
 def init_db():
-    """Initializes the database using schema.sql."""
+    """Drops every table and rebuilds the schema from the migrations
+    (schema.sql baseline plus every later migration).
+    """
     db = get_db()
-    schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
-    # Explicitly open with UTF-8 encoding
-    with open(schema_path, 'r', encoding='utf-8') as f:
-        db.executescript(f.read())
+    names = db.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    script = "PRAGMA foreign_keys = OFF;\n"
+    script += ''.join(f'DROP {kind.upper()} IF EXISTS "{name}";\n' for kind, name in names)
+    script += "PRAGMA user_version = 0;\n"
+    db.executescript(script)
+    migrations.migrate(db)
     print("Database initialized.")
 
+def migrate_db():
+    """Brings the database up to migrations.LATEST_VERSION. Cheap when it
+    already is: only PRAGMA user_version is read. Returns what was run.
+    """
+    db = get_db()
+    if not migrations.needs_migration(db):
+        return []
+    return migrations.migrate(db)
+
 
 @click.command('init-db')
+@click.option('--reset', is_flag=True, help='Drop all tables and data before creating the schema.')
 @with_appcontext
-def init_db_command():
-    """Clear existing data and create new tables."""
-    db_path = current_app.config['DATABASE_URI'].replace('sqlite:///', '')
-    if not os.path.exists(db_path):
-        print(f"Database file not found at {db_path}. Initializing...")
+def init_db_command(reset):
+    """Create or upgrade the database schema (--reset clears existing data)."""
+    if reset:
         init_db()
-    else:
-        # Optional: Add logic here if you want to re-initialize even if it exists
-        # For now, we just print that it exists.
-        # print(f"Database already exists at {db_path}.")
-        # Check if tables exist, if not, initialize
-        db = get_db()
-        cursor = db.cursor()
-        try:
-            # Check if a key table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Workers';")
-            if cursor.fetchone() is None:
-                print("Tables not found in existing database. Initializing schema...")
-                init_db()
-            # else:
-            #     print("Tables found. Database schema appears initialized.")
-        except sqlite3.Error as e:
-            print(f"Error checking database schema: {e}")
-            print("Attempting to initialize schema...")
-            init_db()
-        finally:
-            # The connection is managed by get_db/close_db via app context
-            pass
+        return
+    db = get_db()
+    version = migrations.get_version(db)
+    results = migrate_db()
+    for number, name, status in results:
+        print(f"Migration {number} ({name}): {status}")
+    print(f"Database at schema version {migrations.get_version(db)} (was {version}, latest {migrations.LATEST_VERSION}).")
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status_command():
+    """Show the schema version and migration history."""
+    db = get_db()
+    print(f"Schema version {migrations.get_version(db)} (latest {migrations.LATEST_VERSION})")
+    for row in migrations.history(db):
+        print(f"  {row['version']:>3}  {row['status']:<8} {row['applied_at']}  {row['name']}")
+    if migrations.needs_migration(db):
+        print("Pending migrations: run 'flask init-db'.")
 
 
 def init_app(app):
@@ -80,3 +292,4 @@ def init_app(app):
     """
     app.teardown_appcontext(close_db) # Call close_db when cleaning up after returning the response
     app.cli.add_command(init_db_command) # Add the init-db command
+    app.cli.add_command(db_status_command)
@@ -0,0 +1,282 @@
+"""Per-statement timing for every query run through a pooled connection.
+
+Connections opened with factory=InstrumentedConnection hand out
+InstrumentedCursors. Each statement is timed from execute() until its
+results have been fetched (or the cursor is reused/closed), and recorded
+under its fingerprint: the SQL with literals replaced by '?' and whitespace
+collapsed, so the same query with different values aggregates together.
+
+Stats are kept per process (QueryStats) with a latency histogram, row
+counts and the query functions that issued the statement. Statements over
+the slow-query threshold are also handed to slow_queries.slow_query_log.
+"""
+import functools
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from .slow_queries import slow_query_log
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is unbounded
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+# Frames skipped when looking for the calling query function: whole modules (None)
+# or only the named functions (the WriterConnection proxy methods)
+_INTERNAL_FRAMES = {
+    __name__: None,
+    'app.database.connection': None,
+    'app.database.slow_queries': None,
+    'app.database.writer': {'execute', 'executemany', 'cursor', '__getattr__', '__enter__', '__exit__'},
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_COMMENT = re.compile(r"--[^\n]*")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalizes a statement so executions that differ only in literal values
+    (or in the length of an IN (?, ?, ...) list) share one entry.
+    """
+    text = _COMMENT.sub(' ', sql)
+    text = _STRING_LITERAL.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('(?+)', text)
+    return _WHITESPACE.sub(' ', text).strip().rstrip(';')
+
+
+def _calling_function():
+    """Returns 'module.function' of the nearest caller outside the database plumbing."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__')
+        if module not in _INTERNAL_FRAMES:
+            break
+        names = _INTERNAL_FRAMES[module]
+        if names is not None and frame.f_code.co_name not in names:
+            break
+        frame = frame.f_back
+    if frame is None:
+        return None
+    module = frame.f_globals.get('__name__', '?').rsplit('.', 1)[-1]
+    return f"{module}.{frame.f_code.co_name}"
+
+
+class _Entry:
+    __slots__ = ('sql', 'count', 'errors', 'total', 'max', 'rows', 'buckets', 'callers')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.callers = {}
+
+    def percentile_ms(self, pct):
+        """Upper bound of the histogram bucket holding the pct-th percentile."""
+        if not self.count:
+            return 0.0
+        slowest = round(self.max * 1000, 3)
+        target = pct / 100.0 * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= target:
+                return min(bound, slowest)
+        return slowest
+
+    def as_dict(self):
+        return {
+            'statement': self.sql,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': self.percentile_ms(50),
+            'p95_ms': self.percentile_ms(95),
+            'p99_ms': self.percentile_ms(99),
+            'rows_total': self.rows,
+            'rows_mean': round(self.rows / self.count, 2) if self.count else 0.0,
+            'callers': dict(sorted(self.callers.items(), key=lambda item: -item[1])),
+            'histogram_ms': {
+                ('inf' if bound == float('inf') else str(bound)): n
+                for bound, n in zip(BUCKETS_MS, self.buckets) if n
+            },
+        }
+
+
+class QueryStats:
+    """Thread-safe aggregate of statement timings for this process."""
+
+    SORT_KEYS = {
+        'total': lambda e: e.total,
+        'mean': lambda e: e.total / e.count if e.count else 0.0,
+        'max': lambda e: e.max,
+        'count': lambda e: e.count,
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.since = time.time()
+
+    def record(self, sql, duration, rows, caller, error=False):
+        key = fingerprint(sql)
+        bucket = 0
+        ms = duration * 1000
+        while ms > BUCKETS_MS[bucket]:
+            bucket += 1
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(key)
+            entry.count += 1
+            entry.errors += 1 if error else 0
+            entry.total += duration
+            entry.max = max(entry.max, duration)
+            entry.rows += rows
+            entry.buckets[bucket] += 1
+            if caller:
+                entry.callers[caller] = entry.callers.get(caller, 0) + 1
+
+    def top(self, n=10, sort='total'):
+        """Returns the n statements with the highest `sort` value (total, mean, max or count)."""
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"Invalid sort '{sort}'. Must be one of {sorted(self.SORT_KEYS)}")
+        with self._lock:
+            entries = sorted(self._entries.values(), key=self.SORT_KEYS[sort], reverse=True)[:n]
+            return [entry.as_dict() for entry in entries]
+
+    def summary(self):
+        with self._lock:
+            return {
+                'since': self.since,
+                'statements': len(self._entries),
+                'executions': sum(e.count for e in self._entries.values()),
+                'total_ms': round(sum(e.total for e in self._entries.values()) * 1000, 3),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.since = time.time()
+
+
+# Statistics for this process; shared by every instrumented connection
+query_stats = QueryStats()
+
+
+def _record(cursor, sql, parameters, duration, rows, caller):
+    """Records a completed statement; explains and logs it if it was slow."""
+    query_stats.record(sql, duration, rows, caller)
+    if slow_query_log.enabled and duration * 1000 >= slow_query_log.threshold_ms:
+        slow_query_log.capture(cursor.connection, sql, parameters, duration, rows, caller, fingerprint(sql))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement, including fetching its rows."""
+
+    _pending = None # [sql, caller, elapsed seconds, rows, parameters] of the statement being fetched
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        caller = _calling_function()
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            query_stats.record(sql, time.perf_counter() - start, 0, caller, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        if self.description is None: # No result set (INSERT/UPDATE/DELETE/DDL)
+            _record(self, sql, parameters, elapsed, max(self.rowcount, 0), caller)
+        else:
+            self._pending = [sql, caller, elapsed, 0, parameters]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        caller = _calling_function()
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except Exception:
+            query_stats.record(sql, time.perf_counter() - start, 0, caller, error=True)
+            raise
+        # No single parameter set to explain the statement with
+        _record(self, sql, None, time.perf_counter() - start, max(self.rowcount, 0), caller)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1, done=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), done=True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, done=True)
+            raise
+        self._fetched(start, 1, done=False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _fetched(self, start, rows, done):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += time.perf_counter() - start
+            pending[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            _record(self, pending[0], pending[4], pending[2], pending[3], pending[1])
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors record into query_stats. Pass as
+    sqlite3.connect(..., factory=InstrumentedConnection).
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
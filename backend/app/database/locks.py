@@ -0,0 +1,93 @@
+"""Advisory file locks shared between worker processes (fcntl.flock).
+
+flock is not available on Windows; there the locks are no-ops and callers
+fall back to SQLite's own locking.
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock on `path`, created if missing.
+
+    acquire(blocking=False) returns False instead of waiting when the lock is
+    held elsewhere. An instance is not reentrant (acquiring it twice raises);
+    give each holder its own instance or use RunLock. The
+    lock is released by release() or when the process exits, so a crashed
+    holder never leaves it stuck.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.wait_time = 0.0 # Seconds spent in the last blocking acquire()
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self, blocking=True):
+        if self._file is not None:
+            raise RuntimeError(f"Lock {self.path} is already held by this object")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.path, 'a')
+        start = time.monotonic()
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                lock_file.close()
+                return False
+        self.wait_time = time.monotonic() - start
+        self._file = lock_file
+        return True
+
+    def release(self):
+        lock_file, self._file = self._file, None
+        if lock_file is not None:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class RunLock:
+    """Non-blocking "only one at a time" guard for a job, across the threads
+    of this process (threading.Lock) and across processes (FileLock).
+    """
+
+    def __init__(self, path):
+        self._thread_lock = threading.Lock()
+        self._file_lock = FileLock(path)
+
+    def try_acquire(self):
+        """Returns False if the job is already running here or in another process."""
+        if not self._thread_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._file_lock.acquire(blocking=False):
+                return True
+        except Exception:
+            self._thread_lock.release()
+            raise
+        self._thread_lock.release()
+        return False
+
+    def release(self):
+        self._file_lock.release()
+        self._thread_lock.release()
@@ -0,0 +1,368 @@
+"""Routine database maintenance, run during configured quiet windows.
+
+One run executes, in order and each timed on its own:
+  plan_rebalance      respaces the production plan's planned_sequence keys once
+                      reorders have used up the gaps (see plan_sequence.py)
+  change_log_prune    deletes ChangeLog entries past their retention (see change_log.py)
+  analyze             ANALYZE (bounded by analysis_limit) + PRAGMA optimize, so the
+                      query planner has statistics for the growing log tables
+  incremental_vacuum  returns free pages to the OS (needs auto_vacuum=INCREMENTAL;
+                      older files can be converted once with a full VACUUM)
+  wal_checkpoint      copies the WAL back into the database and truncates it
+  quick_check         PRAGMA quick_check; any problem marks the run as failed
+
+Runs use their own connection, not the pool or the writer, and are recorded
+in the MaintenanceRuns table, so any worker can report the last run. Like
+backups, every process starts a scheduler but only the one holding the
+scheduler lock runs it, at most once per window.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .connection import _connect, get_db, get_db_path, get_profile
+from .locks import FileLock, RunLock
+from . import change_log, plan_sequence
+
+logger = logging.getLogger(__name__)
+
+STEPS = ('plan_rebalance', 'change_log_prune', 'analyze', 'incremental_vacuum', 'wal_checkpoint', 'quick_check')
+
+_CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+# One runner and scheduler per (process, database path), like the connection pools
+_runners = {}
+_schedulers = {}
+_lock = threading.Lock()
+
+
+class MaintenanceInProgress(RuntimeError):
+    """Raised when maintenance is requested while a run is in progress."""
+
+
+def parse_windows(spec):
+    """Parses quiet windows given as "HH:MM-HH:MM,HH:MM-HH:MM" (or a list of
+    (start, end) strings) into (datetime.time, datetime.time) pairs. A window
+    may cross midnight, e.g. "22:00-04:00".
+    """
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        spec = [tuple(part.split('-')) for part in spec.split(',') if part.strip()]
+    windows = []
+    for start, end in spec:
+        try:
+            windows.append((
+                datetime.strptime(start.strip(), '%H:%M').time(),
+                datetime.strptime(end.strip(), '%H:%M').time()
+            ))
+        except ValueError:
+            raise ValueError(f"Invalid maintenance window '{start}-{end}'. Expected HH:MM-HH:MM")
+    return windows
+
+def current_window_start(windows, now):
+    """Returns when the quiet window containing `now` began, or None outside all windows."""
+    for start, end in windows:
+        if start <= end:
+            if start <= now.time() < end:
+                return datetime.combine(now.date(), start)
+        elif now.time() >= start: # Window crosses midnight, before midnight
+            return datetime.combine(now.date(), start)
+        elif now.time() < end: # Window crosses midnight, after midnight
+            return datetime.combine(now.date() - timedelta(days=1), start)
+    return None
+
+
+class MaintenanceRunner:
+    """Runs the maintenance steps against one database file."""
+
+    def __init__(self, db_path, profile=None, analysis_limit=1000, vacuum_pages=0,
+                 convert_auto_vacuum=False, checkpoint_mode='TRUNCATE', change_log_retention_days=7):
+        checkpoint_mode = checkpoint_mode.upper()
+        if checkpoint_mode not in _CHECKPOINT_MODES:
+            raise ValueError(f"Invalid checkpoint mode: {checkpoint_mode}. Must be one of {_CHECKPOINT_MODES}")
+        self.db_path = db_path
+        self.profile = profile
+        self.analysis_limit = int(analysis_limit)
+        self.vacuum_pages = int(vacuum_pages)
+        self.convert_auto_vacuum = convert_auto_vacuum
+        self.checkpoint_mode = checkpoint_mode
+        self.change_log_retention_days = int(change_log_retention_days)
+        self._run_lock = RunLock(db_path + '.maintenance.lock') # Held while a run is in progress
+        self._status_lock = threading.Lock()
+        self._status = {'state': 'idle'}
+
+    def status(self):
+        """State of the current (or last) run started by this process."""
+        with self._status_lock:
+            return dict(self._status)
+
+    def run(self, triggered_by='manual'):
+        """Runs all steps now and returns the run record.
+        Raises MaintenanceInProgress if a run is already in progress (in any process).
+        """
+        self._acquire()
+        return self._run_locked(triggered_by)
+
+    def start(self, triggered_by='manual'):
+        """Like run(), but on a background thread; returns immediately."""
+        self._acquire()
+        with self._status_lock:
+            self._status = {'state': 'starting', 'triggered_by': triggered_by}
+        threading.Thread(target=self._run_locked, args=(triggered_by,), name='db-maintenance', daemon=True).start()
+        return self.status()
+
+    def _acquire(self):
+        if not self._run_lock.try_acquire():
+            raise MaintenanceInProgress("Database maintenance is already running")
+
+    def _set_status(self, **values):
+        with self._status_lock:
+            self._status.update(values)
+
+    def _run_locked(self, triggered_by):
+        """Runs the steps; the caller has acquired the run lock, which is released here."""
+        start = time.monotonic()
+        started_at = datetime.now().isoformat(timespec='seconds')
+        record = {'triggered_by': triggered_by, 'status': 'running', 'started_at': started_at, 'steps': {}}
+        self._set_status(state='running', triggered_by=triggered_by, started_at=started_at, step=None)
+        conn = None
+        try:
+            conn = _connect(self.db_path, self.profile)
+            conn.isolation_level = None # Autocommit: VACUUM and checkpoints cannot run in a transaction
+            run_id = conn.execute(
+                "INSERT INTO MaintenanceRuns (triggered_by, status, started_at) VALUES (?, 'running', ?)",
+                (triggered_by, started_at)
+            ).lastrowid
+            record['run_id'] = run_id
+
+            failed = False
+            for step in STEPS:
+                self._set_status(step=step)
+                step_start = time.monotonic()
+                try:
+                    result = getattr(self, f'_{step}')(conn)
+                    failed = failed or result.get('ok') is False
+                except Exception as e:
+                    logger.error(f"Maintenance step {step} failed: {e}", exc_info=True)
+                    result = {'ok': False, 'error': str(e)}
+                    failed = True
+                result['duration_ms'] = round((time.monotonic() - step_start) * 1000, 3)
+                record['steps'][step] = result
+                logger.info(f"Maintenance step {step} took {result['duration_ms']:.0f} ms: {result}")
+
+            record['status'] = 'failed' if failed else 'succeeded'
+            record['finished_at'] = datetime.now().isoformat(timespec='seconds')
+            record['duration_ms'] = round((time.monotonic() - start) * 1000, 3)
+            conn.execute(
+                "UPDATE MaintenanceRuns SET status = ?, finished_at = ?, duration_ms = ?, details = ? WHERE run_id = ?",
+                (record['status'], record['finished_at'], record['duration_ms'], json.dumps(record['steps']), run_id)
+            )
+            log = logger.error if failed else logger.info
+            log(f"Database maintenance ({triggered_by}) {record['status']} in {record['duration_ms']:.0f} ms")
+        except Exception as e:
+            logger.error(f"Database maintenance ({triggered_by}) could not run: {e}", exc_info=True)
+            record.update(status='failed', error=str(e), duration_ms=round((time.monotonic() - start) * 1000, 3))
+        finally:
+            if conn is not None:
+                conn.close()
+            self._set_status(state=record['status'], step=None, last_run=record)
+            self._run_lock.release()
+        return record
+
+    # --- Steps. Each returns a dict; 'ok': False marks the run as failed ---
+
+    def _plan_rebalance(self, conn):
+        crowded = plan_sequence.crowded_gaps(conn)
+        if not crowded:
+            return {'ok': True, 'skipped': 'plan keys are spread out', 'crowded_gaps': 0}
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            renumbered = plan_sequence.rebalance(conn)
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+        return {'ok': True, 'crowded_gaps': crowded, 'renumbered': renumbered}
+
+    def _change_log_prune(self, conn):
+        if self.change_log_retention_days <= 0:
+            return {'ok': True, 'skipped': 'change log retention is unlimited'}
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            pruned = change_log.prune(conn, self.change_log_retention_days)
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+        return {'ok': True, 'pruned': pruned, 'retention_days': self.change_log_retention_days}
+
+    def _analyze(self, conn):
+        if self.analysis_limit > 0:
+            # Samples about this many rows per index instead of reading every row
+            conn.execute(f"PRAGMA analysis_limit = {self.analysis_limit};")
+        conn.execute("ANALYZE;")
+        conn.execute("PRAGMA optimize;")
+        tables = conn.execute("SELECT COUNT(DISTINCT tbl) FROM sqlite_stat1").fetchone()[0]
+        return {'ok': True, 'tables_with_stats': tables}
+
+    def _incremental_vacuum(self, conn):
+        mode = conn.execute("PRAGMA auto_vacuum;").fetchone()[0] # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+        free_before = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        if mode == 0 and self.convert_auto_vacuum:
+            # One-time switch; rewrites the whole file and blocks writers while it runs
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+            conn.execute("VACUUM;")
+            action = 'converted to auto_vacuum=INCREMENTAL with VACUUM'
+        elif mode != 2:
+            return {
+                'ok': True, 'skipped': f"auto_vacuum is {('NONE', 'FULL')[mode]}",
+                'free_pages': free_before
+            }
+        else:
+            pages = f"({self.vacuum_pages})" if self.vacuum_pages > 0 else ''
+            conn.execute(f"PRAGMA incremental_vacuum{pages};").fetchall() # Runs one step per returned row
+            action = 'incremental_vacuum'
+        free_after = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        return {'ok': True, 'action': action, 'free_pages_before': free_before, 'free_pages_after': free_after}
+
+    def _wal_checkpoint(self, conn):
+        if conn.execute("PRAGMA journal_mode;").fetchone()[0].lower() != 'wal':
+            return {'ok': True, 'skipped': 'not in WAL mode'}
+        busy, wal_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({self.checkpoint_mode});").fetchone()
+        # busy only means readers/writers kept part of the WAL; the next run catches up
+        return {'ok': True, 'mode': self.checkpoint_mode, 'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed_pages': checkpointed}
+
+    def _quick_check(self, conn):
+        problems = [row[0] for row in conn.execute("PRAGMA quick_check;").fetchall()]
+        if problems == ['ok']:
+            return {'ok': True}
+        logger.error(f"PRAGMA quick_check reported {len(problems)} problem(s): {problems[:10]}")
+        return {'ok': False, 'problems': problems[:100]}
+
+
+class MaintenanceScheduler:
+    """Background thread that runs maintenance once per quiet window.
+
+    Only the process holding the scheduler lock runs it; a window counts as
+    done once any run (scheduled or manual) started inside it, so a failing
+    run is retried in the next window, not every minute.
+    """
+
+    def __init__(self, runner, windows, lock_path, tick=60.0):
+        self.runner = runner
+        self.windows = windows
+        self.tick = tick
+        self._leader_lock = FileLock(lock_path)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='db-maintenance-scheduler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                window_start = current_window_start(self.windows, datetime.now())
+                if window_start is not None and (self._leader_lock.held or self._leader_lock.acquire(blocking=False)):
+                    last = last_started_at(self.runner.db_path)
+                    if last is None or last < window_start.isoformat(timespec='seconds'):
+                        self.runner.run(triggered_by='schedule')
+            except MaintenanceInProgress:
+                pass # A manual run is in progress inside this window
+            except Exception as e:
+                logger.error(f"Maintenance scheduler error: {e}", exc_info=True)
+            self._stop.wait(self.tick)
+
+
+def last_started_at(db_path):
+    """Start time (ISO string) of the most recent maintenance run, or None."""
+    conn = _connect(db_path)
+    try:
+        return conn.execute("SELECT MAX(started_at) FROM MaintenanceRuns").fetchone()[0]
+    finally:
+        conn.close()
+
+def get_recent_runs(limit=10):
+    """Most recent MaintenanceRuns rows (newest first) with their step details."""
+    db = get_db()
+    cursor = db.execute(
+        """SELECT run_id, triggered_by, status, started_at, finished_at, duration_ms, details
+           FROM MaintenanceRuns ORDER BY run_id DESC LIMIT ?""", (limit,)
+    )
+    runs = []
+    for row in cursor.fetchall():
+        run = dict(row)
+        run['details'] = json.loads(run['details']) if run['details'] else None
+        runs.append(run)
+    return runs
+
+def get_maintenance_runner():
+    """Returns this process's MaintenanceRunner for the configured database."""
+    db_path = get_db_path()
+    key = (os.getpid(), db_path)
+    runner = _runners.get(key)
+    if runner is None:
+        with _lock:
+            runner = _runners.get(key)
+            if runner is None:
+                config = current_app.config
+                runner = MaintenanceRunner(
+                    db_path,
+                    get_profile(config),
+                    analysis_limit=config.get('DATABASE_MAINTENANCE_ANALYSIS_LIMIT', 1000),
+                    vacuum_pages=config.get('DATABASE_MAINTENANCE_VACUUM_PAGES', 0),
+                    convert_auto_vacuum=config.get('DATABASE_MAINTENANCE_CONVERT_AUTO_VACUUM', False),
+                    checkpoint_mode=config.get('DATABASE_MAINTENANCE_CHECKPOINT_MODE', 'TRUNCATE'),
+                    change_log_retention_days=config.get('DATABASE_CHANGE_LOG_RETENTION_DAYS', 7)
+                )
+                _runners[key] = runner
+    return runner
+
+def _start_scheduler():
+    """Starts this process's maintenance scheduler once, on the first request
+    (see backup._start_scheduler for why not in create_app).
+    """
+    windows = parse_windows(current_app.config.get('DATABASE_MAINTENANCE_WINDOWS'))
+    if not windows:
+        return
+    runner = get_maintenance_runner()
+    key = (os.getpid(), runner.db_path)
+    if key in _schedulers:
+        return
+    with _lock:
+        if key not in _schedulers:
+            _schedulers[key] = MaintenanceScheduler(
+                runner, windows, runner.db_path + '.maintenance-scheduler.lock'
+            ).start()
+
+
+@click.command('db-maintenance')
+@with_appcontext
+def db_maintenance_command():
+    """Run database maintenance (plan rebalance, ANALYZE, vacuum, checkpoint, quick_check) now."""
+    try:
+        record = get_maintenance_runner().run(triggered_by='cli')
+    except MaintenanceInProgress as e:
+        print(e)
+        return
+    for step, result in record['steps'].items():
+        print(f"  {step:<20} {result['duration_ms']:>10.1f} ms  {result}")
+    print(f"Maintenance {record['status']} in {record.get('duration_ms', 0):.0f} ms.")
+
+
+def init_app(app):
+    """Registers the maintenance CLI command and the scheduler start hook."""
+    parse_windows(app.config.get('DATABASE_MAINTENANCE_WINDOWS')) # Fail fast on a bad setting
+    app.before_request(_start_scheduler)
+    app.cli.add_command(db_maintenance_command)
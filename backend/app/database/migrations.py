@@ -0,0 +1,468 @@
+"""Forward-only, numbered schema migrations.
+
+The schema version lives in the database header (PRAGMA user_version), so
+checking whether a database is up to date is a single integer comparison.
+Every migration runs in its own BEGIN IMMEDIATE transaction together with
+the version bump, so a failed migration leaves the database at the previous
+version. Applied migrations are also recorded in the SchemaMigrations table.
+
+Migrations are never edited once released; schema changes are made by
+appending a new Migration to MIGRATIONS. A version that was withdrawn keeps
+its number with no apply function and is recorded as 'skipped'.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+from . import plan_sequence
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_DIR = os.path.dirname(__file__)
+
+
+class MigrationError(sqlite3.DatabaseError):
+    """Raised when a migration fails; the database stays at the previous version."""
+
+
+class Migration:
+    """A numbered schema change.
+
+    `apply(db)` runs inside the migration's transaction and must not
+    commit. None marks a withdrawn version: the version advances and nothing runs.
+    """
+
+    __slots__ = ('version', 'name', 'apply')
+
+    def __init__(self, version, name, apply):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+
+# --- Helpers shared by migrations ---
+
+def split_statements(script):
+    """Splits an SQL script into single statements so it can run inside a
+    transaction (executescript() would COMMIT first). Comment-only chunks
+    are dropped.
+    """
+    statements = []
+    current = ''
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    return statements
+
+def read_sql(filename):
+    with open(os.path.join(SCHEMA_DIR, filename), 'r', encoding='utf-8') as f:
+        return f.read()
+
+def table_exists(db, name):
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+# --- Migrations ---
+
+def _baseline(db):
+    """Version 1: the schema.sql schema. Databases created by the old
+    drop-and-recreate init_db already have it and are adopted as they are.
+    """
+    if table_exists(db, 'Workers'):
+        logger.info("Existing schema.sql database found, adopting it as schema version 1")
+        return
+    for statement in split_statements(read_sql('schema.sql')):
+        db.execute(statement)
+
+
+def _maintenance_runs(db):
+    """Version 3: history of database maintenance runs (see maintenance.py)."""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS MaintenanceRuns (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            triggered_by TEXT NOT NULL, -- 'schedule', 'manual' or 'cli'
+            status TEXT NOT NULL CHECK(status IN ('running', 'succeeded', 'failed')),
+            started_at TEXT NOT NULL, -- Local time, ISO8601
+            finished_at TEXT,
+            duration_ms REAL,
+            details TEXT -- JSON: timing and result of every step
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_maintenanceruns_started_at ON MaintenanceRuns (started_at)")
+
+
+
+# Specialty keys a task is listed under: its specialty_id, or 0 (workers without a
+# specialty) plus every specialty when the task has none.
+_SPECIALTY_KEYS = "(SELECT 0 AS specialty_key UNION ALL SELECT specialty_id FROM Specialties)"
+
+def _applicability_select(task, task_table=None):
+    """SELECT producing TaskApplicability rows for `task`: NEW in triggers, or an alias
+    of `task_table` to cover every task definition.
+    """
+    source = f"{task_table} {task}, " if task_table else ''
+    return f"""
+        SELECT {task}.station_sequence_order, ht.house_type_id, sk.specialty_key, {task}.task_definition_id
+        FROM {source}HouseTypes ht, {_SPECIALTY_KEYS} sk
+        WHERE {task}.station_sequence_order IS NOT NULL
+          AND ({task}.house_type_id IS NULL OR ht.house_type_id = {task}.house_type_id)
+          AND ({task}.specialty_id IS NULL OR sk.specialty_key = {task}.specialty_id)
+    """
+
+_APPLICABILITY_INSERT = "INSERT OR IGNORE INTO TaskApplicability (station_sequence_order, house_type_id, specialty_key, task_definition_id)"
+
+_APPLICABILITY_TRIGGERS = {
+    'trg_taskapplicability_task_insert': f"""
+        AFTER INSERT ON TaskDefinitions BEGIN
+            {_APPLICABILITY_INSERT} {_applicability_select('NEW')};
+        END""",
+    'trg_taskapplicability_task_update': f"""
+        AFTER UPDATE OF task_definition_id, station_sequence_order, house_type_id, specialty_id ON TaskDefinitions BEGIN
+            DELETE FROM TaskApplicability WHERE task_definition_id = OLD.task_definition_id;
+            {_APPLICABILITY_INSERT} {_applicability_select('NEW')};
+        END""",
+    'trg_taskapplicability_task_delete': """
+        AFTER DELETE ON TaskDefinitions BEGIN
+            DELETE FROM TaskApplicability WHERE task_definition_id = OLD.task_definition_id;
+        END""",
+    # Generic tasks (house_type_id / specialty_id NULL) apply to new house types and specialties
+    'trg_taskapplicability_house_type_insert': f"""
+        AFTER INSERT ON HouseTypes BEGIN
+            {_APPLICABILITY_INSERT}
+            SELECT td.station_sequence_order, NEW.house_type_id, sk.specialty_key, td.task_definition_id
+            FROM TaskDefinitions td, {_SPECIALTY_KEYS} sk
+            WHERE td.house_type_id IS NULL AND td.station_sequence_order IS NOT NULL
+              AND (td.specialty_id IS NULL OR sk.specialty_key = td.specialty_id);
+        END""",
+    'trg_taskapplicability_house_type_delete': """
+        AFTER DELETE ON HouseTypes BEGIN
+            DELETE FROM TaskApplicability WHERE house_type_id = OLD.house_type_id;
+        END""",
+    'trg_taskapplicability_specialty_insert': f"""
+        AFTER INSERT ON Specialties BEGIN
+            {_APPLICABILITY_INSERT}
+            SELECT td.station_sequence_order, ht.house_type_id, NEW.specialty_id, td.task_definition_id
+            FROM TaskDefinitions td
+            JOIN HouseTypes ht ON td.house_type_id IS NULL OR ht.house_type_id = td.house_type_id
+            WHERE td.specialty_id IS NULL AND td.station_sequence_order IS NOT NULL;
+        END""",
+    'trg_taskapplicability_specialty_delete': """
+        AFTER DELETE ON Specialties BEGIN
+            DELETE FROM TaskApplicability WHERE specialty_key = OLD.specialty_id;
+        END""",
+}
+
+def install_task_applicability(db):
+    """Creates (or recreates) TaskApplicability's triggers and rebuilds its rows
+    from the current catalog. Idempotent.
+    """
+    for name, body in _APPLICABILITY_TRIGGERS.items():
+        db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        db.execute(f"CREATE TRIGGER {name} {body}")
+    db.execute("DELETE FROM TaskApplicability")
+    db.execute(f"{_APPLICABILITY_INSERT} {_applicability_select('td', 'TaskDefinitions')}")
+
+def _task_applicability(db):
+    """Version 4: TaskApplicability, which task definitions a station shows for a house type
+    and worker specialty, so a station's task list is a keyed lookup instead of the
+    `(house_type_id = ? OR house_type_id IS NULL) AND (specialty_id = ? OR ...)` filter.
+    Kept current by triggers on TaskDefinitions, HouseTypes and Specialties (including
+    ON DELETE SET NULL cascades), in the same transaction as the catalog change.
+    """
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS TaskApplicability (
+            station_sequence_order INTEGER NOT NULL,
+            house_type_id INTEGER NOT NULL,
+            specialty_key INTEGER NOT NULL, -- Worker's specialty_id, or 0 for workers without one
+            task_definition_id INTEGER NOT NULL,
+            PRIMARY KEY (station_sequence_order, house_type_id, specialty_key, task_definition_id)
+        ) WITHOUT ROWID
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_taskapplicability_task ON TaskApplicability (task_definition_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_taskapplicability_house_type ON TaskApplicability (house_type_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_taskapplicability_specialty ON TaskApplicability (specialty_key)")
+    install_task_applicability(db)
+
+
+# Catalog tables cached by reference_cache.py
+REFERENCE_TABLES = (
+    'Stations', 'Specialties', 'HouseTypes', 'HouseParameters', 'HouseTypeParameters',
+    'HouseTypeTipologias', 'HouseTypePanels', 'Multiwalls',
+)
+
+# Other tables read by admin GET routes that answer conditional requests (api/conditional.py)
+ADMIN_VIEW_TABLES = (
+    'Projects', 'ProjectModules', 'ProductionPlan', 'Modules', 'Workers', 'AdminTeam',
+)
+
+# Task execution logs (module and panel tasks), watched for station events (station_events.py)
+TASK_LOG_TABLES = ('TaskLogs',)
+
+def bump_generation_triggers(table):
+    """Triggers that count every row change of `table` in TableGenerations, so caches in
+    any worker can tell whether the table changed by comparing one integer.
+    """
+    upsert = (f"INSERT INTO TableGenerations (table_name, generation) VALUES ('{table}', 1) "
+              "ON CONFLICT(table_name) DO UPDATE SET generation = generation + 1;")
+    return {
+        f"trg_generation_{table.lower()}_{event.lower()}": f"AFTER {event} ON {table} BEGIN {upsert} END"
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    }
+
+def tables_generation(db, tables):
+    """Sum of the generation counters of `tables`. It moves whenever a row of any of
+    them changes (counters only grow), so it identifies a version of their contents.
+    None if some of them have no triggers yet.
+    """
+    tracked, generation = db.execute(
+        f"SELECT COUNT(*), SUM(generation) FROM TableGenerations WHERE table_name IN ({','.join('?' * len(tables))})",
+        tables
+    ).fetchone()
+    return generation if tracked == len(tables) else None
+
+# Tables whose row changes are recorded in ChangeLog for GET /api/changes (see change_log.py)
+CHANGE_LOG_TABLES = REFERENCE_TABLES + ADMIN_VIEW_TABLES + TASK_LOG_TABLES + ('TaskDefinitions', 'TaskDependencies')
+
+def primary_key_columns(db, table):
+    """The primary key columns of `table`, in key order."""
+    columns = sorted((row[5], row[1]) for row in db.execute(f"PRAGMA table_info({table})") if row[5])
+    return [name for _, name in columns]
+
+def change_log_triggers(table, key_columns):
+    """Triggers that append every row change of `table` to ChangeLog: an 'upsert' of the
+    row's key after an insert or update, a 'delete' of the old key after a delete or an
+    update that changed the key. Keys are JSON arrays of the key columns' values.
+    """
+    def entry(row, operation):
+        key = ', '.join(f"{row}.{column}" for column in key_columns)
+        return f"'{table}', json_array({key}), '{operation}'"
+    insert = "INSERT INTO ChangeLog (table_name, row_key, operation)"
+    key_changed = ' OR '.join(f"OLD.{column} IS NOT NEW.{column}" for column in key_columns)
+    return {
+        f"trg_changelog_{table.lower()}_insert":
+            f"AFTER INSERT ON {table} BEGIN {insert} VALUES ({entry('NEW', 'upsert')}); END",
+        f"trg_changelog_{table.lower()}_update":
+            f"AFTER UPDATE ON {table} BEGIN "
+            f"{insert} SELECT {entry('OLD', 'delete')} WHERE {key_changed}; "
+            f"{insert} VALUES ({entry('NEW', 'upsert')}); END",
+        f"trg_changelog_{table.lower()}_delete":
+            f"AFTER DELETE ON {table} BEGIN {insert} VALUES ({entry('OLD', 'delete')}); END",
+    }
+
+def install_change_log_triggers(db, tables):
+    for table in tables:
+        key_columns = primary_key_columns(db, table)
+        if not key_columns:
+            raise MigrationError(f"{table} has no primary key to log its changes by")
+        for name, body in change_log_triggers(table, key_columns).items():
+            db.execute(f"DROP TRIGGER IF EXISTS {name}")
+            db.execute(f"CREATE TRIGGER {name} {body}")
+
+def install_generation_triggers(db, tables):
+    for table in tables:
+        db.execute(
+            "INSERT OR IGNORE INTO TableGenerations (table_name, generation) VALUES (?, 0)", (table,)
+        )
+        for name, body in bump_generation_triggers(table).items():
+            db.execute(f"DROP TRIGGER IF EXISTS {name}")
+            db.execute(f"CREATE TRIGGER {name} {body}")
+
+def parse_task_dependencies(text):
+    """Task IDs in a TaskDefinitions.task_dependencies string ("1,5,8"); junk is skipped."""
+    ids = []
+    for token in (text or '').split(','):
+        token = token.strip()
+        if token.isdigit() and int(token) not in ids:
+            ids.append(int(token))
+    return ids
+
+def _task_dependencies(db):
+    """Version 5: TaskDependencies, one row per task -> prerequisite edge, backfilled from
+    the comma-separated TaskDefinitions.task_dependencies (IDs that do not exist and
+    self-references are dropped). The text column stays as a mirror for the frontend.
+    Also adds TableGenerations, per-table change counters used by in-process caches
+    (see task_graph.py).
+    """
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS TableGenerations (
+            table_name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0 -- Incremented by triggers on every row change
+        ) WITHOUT ROWID
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS TaskDependencies (
+            task_definition_id INTEGER NOT NULL,
+            depends_on_task_definition_id INTEGER NOT NULL, -- Prerequisite
+            PRIMARY KEY (task_definition_id, depends_on_task_definition_id),
+            CHECK (task_definition_id <> depends_on_task_definition_id),
+            FOREIGN KEY (task_definition_id) REFERENCES TaskDefinitions(task_definition_id) ON DELETE CASCADE,
+            FOREIGN KEY (depends_on_task_definition_id) REFERENCES TaskDefinitions(task_definition_id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_taskdependencies_depends_on ON TaskDependencies (depends_on_task_definition_id)")
+
+    existing = {row[0] for row in db.execute("SELECT task_definition_id FROM TaskDefinitions")}
+    edges = []
+    for task_id, text in db.execute(
+        "SELECT task_definition_id, task_dependencies FROM TaskDefinitions WHERE task_dependencies IS NOT NULL AND task_dependencies <> ''"
+    ).fetchall():
+        for prerequisite in parse_task_dependencies(text):
+            if prerequisite in existing and prerequisite != task_id:
+                edges.append((task_id, prerequisite))
+            else:
+                logger.warning(f"Dropping dependency of task {task_id} on {prerequisite}: not a valid task definition")
+    db.executemany(
+        "INSERT OR IGNORE INTO TaskDependencies (task_definition_id, depends_on_task_definition_id) VALUES (?, ?)", edges
+    )
+    logger.info(f"Backfilled {len(edges)} task dependency edges")
+    install_generation_triggers(db, ('TaskDefinitions', 'TaskDependencies'))
+
+def _gapped_plan_sequence(db):
+    """Version 6: spaces planned_sequence SEQUENCE_GAP apart (see plan_sequence.py), so
+    reordering the plan only rewrites the moved items.
+    """
+    plan_sequence.rebalance(db)
+
+def _upcoming_plan_index(db):
+    """Version 7: partial index over the upcoming plan items in plan order, used by keyset
+    pages of the upcoming plan and for counting them. Queries must repeat the index's
+    status condition literally (queries.UPCOMING_STATUS_SQL) for SQLite to use it.
+    """
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_productionplan_upcoming ON ProductionPlan (planned_sequence) "
+        "WHERE status IN ('Planned', 'Scheduled')"
+    )
+
+def _reference_generations(db):
+    """Version 8: generation counters (TableGenerations triggers) on the catalog tables, so
+    the in-process reference data cache of every worker sees their changes.
+    """
+    install_generation_triggers(db, [table for table in REFERENCE_TABLES if table_exists(db, table)])
+
+def _admin_view_generations(db):
+    """Version 9: generation counters on the plan, project, module and personnel tables,
+    from which admin GET routes compute their ETags.
+    """
+    install_generation_triggers(db, [table for table in ADMIN_VIEW_TABLES if table_exists(db, table)])
+
+def _task_log_generations(db):
+    """Version 10: generation counters on the task logs, so station event watchers see
+    tasks started, paused and finished by any worker.
+    """
+    install_generation_triggers(db, [table for table in TASK_LOG_TABLES if table_exists(db, table)])
+
+def _change_log(db):
+    """Version 11: ChangeLog, an append-only record of row changes (table, key, upsert or
+    delete) written by triggers on CHANGE_LOG_TABLES. Its AUTOINCREMENT change_id never
+    goes back or gets reused, so it is the cursor of GET /api/changes; maintenance
+    prunes entries past their retention.
+    """
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS ChangeLog (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_key TEXT NOT NULL, -- JSON array of the row's primary key values
+            operation TEXT NOT NULL CHECK(operation IN ('upsert', 'delete')),
+            changed_at TEXT NOT NULL DEFAULT (datetime('now')) -- UTC
+        )
+    """)
+    install_change_log_triggers(db, [table for table in CHANGE_LOG_TABLES if table_exists(db, table)])
+
+
+MIGRATIONS = (
+    Migration(1, 'baseline schema.sql', _baseline),
+    # Withdrawn: the move to new_schema.sql returns as a new migration once queries.py targets it
+    Migration(2, 'move to new_schema.sql', None),
+    Migration(3, 'maintenance run log', _maintenance_runs),
+    Migration(4, 'task applicability index', _task_applicability),
+    Migration(5, 'task dependency edges and table generations', _task_dependencies),
+    Migration(6, 'gapped plan sequence', _gapped_plan_sequence),
+    Migration(7, 'upcoming plan index', _upcoming_plan_index),
+    Migration(8, 'reference table generations', _reference_generations),
+    Migration(9, 'admin view table generations', _admin_view_generations),
+    Migration(10, 'task log generations', _task_log_generations),
+    Migration(11, 'change log', _change_log),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# --- Runner ---
+
+def get_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def needs_migration(db):
+    """True if the database is behind LATEST_VERSION: a PRAGMA user_version read."""
+    return get_version(db) < LATEST_VERSION
+
+def _next_migration(db):
+    version = get_version(db)
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            return migration
+    return None
+
+def migrate(db):
+    """Applies pending migrations in order, each in its own transaction.
+    Returns a list of (version, name, status) for what was run.
+    """
+    if db.in_transaction:
+        db.commit()
+    isolation_level = db.isolation_level
+    db.isolation_level = None # Transactions are managed explicitly below
+    results = []
+    try:
+        while True:
+            migration = None
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock in case another process migrated meanwhile
+                migration = _next_migration(db)
+                if migration is None:
+                    db.execute("COMMIT")
+                    break
+                start = time.monotonic()
+                status = 'applied' if migration.apply is not None else 'skipped'
+                if status == 'applied':
+                    migration.apply(db)
+                duration_ms = (time.monotonic() - start) * 1000
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        status TEXT NOT NULL CHECK(status IN ('applied', 'skipped')),
+                        applied_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        duration_ms REAL
+                    )
+                """)
+                db.execute(
+                    "INSERT OR REPLACE INTO SchemaMigrations (version, name, status, duration_ms) VALUES (?, ?, ?, ?)",
+                    (migration.version, migration.name, status, round(duration_ms, 3))
+                )
+                db.execute(f"PRAGMA user_version = {migration.version}")
+                db.execute("COMMIT")
+            except Exception as e:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                if isinstance(e, MigrationError) or migration is None:
+                    raise
+                raise MigrationError(f"Migration {migration.version} ({migration.name}) failed: {e}") from e
+            logger.info(f"Schema migration {migration.version} ({migration.name}) {status} in {duration_ms:.1f} ms")
+            results.append((migration.version, migration.name, status))
+    finally:
+        db.isolation_level = isolation_level
+    return results
+
+def history(db):
+    """Returns the SchemaMigrations rows, oldest first."""
+    if not table_exists(db, 'SchemaMigrations'):
+        return []
+    return [dict(row) for row in db.execute(
+        "SELECT version, name, status, applied_at, duration_ms FROM SchemaMigrations ORDER BY version"
+    )]
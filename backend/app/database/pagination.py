@@ -0,0 +1,30 @@
+"""Opaque cursors for keyset pagination.
+
+A keyset page continues after the last row of the previous page instead of
+skipping OFFSET rows, so every page costs the same however deep it is. The
+cursor carries that row's sort key (e.g. (planned_sequence, plan_id)) as
+URL-safe base64 JSON; clients pass it back unchanged and must not build or
+parse it themselves.
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(*values):
+    """Cursor string for a row whose sort key is `values`."""
+    payload = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor, arity):
+    """The sort key (a tuple of `arity` values) from a cursor made by encode_cursor.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (UnicodeEncodeError, binascii.Error, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(values, list) or len(values) != arity:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return tuple(values)
@@ -0,0 +1,282 @@
+"""Streaming CSV import of production plan items.
+
+The CSV has a header row and one row per module:
+
+    project_name, house_type, house_identifier, module_number     (required)
+    sub_type, planned_sequence, planned_start_datetime,
+    planned_assembly_line, status                                  (optional)
+
+house_type and sub_type are names (house_type may also be an ID). Rows are
+read and processed chunk_size at a time, so memory stays bounded whatever
+the file size. Each chunk is validated against the projects, house types
+and tipologias loaded once per import, then upserted on the plan's unique
+key (project, house_identifier, module_number) with one executemany on the
+writer. Every chunk commits on its own; invalid rows are reported by line
+and skipped. Items already in production are never overwritten. A key that
+appears again later in the same chunk updates the item its first row wrote.
+
+Optional columns left empty keep the existing value on update. New items
+without a planned_sequence go to the end of the plan in file order.
+dry_run validates and counts without writing.
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from .connection import get_db, write_operation
+from .plan_sequence import SEQUENCE_GAP
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('project_name', 'house_type', 'house_identifier', 'module_number')
+OPTIONAL_COLUMNS = ('sub_type', 'planned_sequence', 'planned_start_datetime', 'planned_assembly_line', 'status')
+
+DEFAULT_CHUNK_SIZE = 500
+# Looking up a chunk's existing items binds three parameters per row; SQLite's limit is
+# SQLITE_MAX_VARIABLE_NUMBER (32766 by default since 3.32)
+SQLITE_MAX_VARIABLE_NUMBER = 32766
+MAX_CHUNK_SIZE = SQLITE_MAX_VARIABLE_NUMBER // 3
+MAX_REPORTED_ERRORS = 1000 # Further errors are only counted
+
+ASSEMBLY_LINES = ('A', 'B', 'C')
+# Statuses an imported row may set, and the only ones an existing item may have to be updated
+IMPORTABLE_STATUSES = ('Planned', 'Scheduled')
+_DATETIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+
+_UPSERT = """
+    INSERT INTO ProductionPlan
+        (project_id, house_type_id, house_identifier, module_sequence_in_house, planned_sequence,
+         planned_start_datetime, planned_assembly_line, tipologia_id, status)
+    VALUES (:project_id, :house_type_id, :house_identifier, :module_number, :planned_sequence,
+            :planned_start_datetime, :planned_assembly_line, :tipologia_id, :status)
+    ON CONFLICT (project_id, house_identifier, module_sequence_in_house) DO UPDATE SET
+        house_type_id = excluded.house_type_id,
+        planned_sequence = CASE WHEN :set_sequence THEN excluded.planned_sequence ELSE planned_sequence END,
+        planned_start_datetime = CASE WHEN :set_datetime THEN excluded.planned_start_datetime ELSE planned_start_datetime END,
+        planned_assembly_line = CASE WHEN :set_line THEN excluded.planned_assembly_line ELSE planned_assembly_line END,
+        tipologia_id = CASE WHEN :set_sub_type THEN excluded.tipologia_id ELSE tipologia_id END,
+        status = CASE WHEN :set_status THEN excluded.status ELSE status END,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE status IN ('Planned', 'Scheduled')
+"""
+
+
+class PlanImportError(ValueError):
+    """Raised when the file cannot be imported at all (e.g. missing columns)."""
+
+
+class _ReferenceData:
+    """Projects, house types and tipologias, read once per import."""
+
+    def __init__(self, db):
+        self.projects = {row['name']: row['project_id'] for row in db.execute("SELECT project_id, name FROM Projects")}
+        self.house_types = {}
+        self.house_type_names = {}
+        for row in db.execute("SELECT house_type_id, name, number_of_modules FROM HouseTypes"):
+            self.house_types[row['house_type_id']] = row['number_of_modules']
+            self.house_type_names[row['name'].strip().lower()] = row['house_type_id']
+        self.tipologias = {
+            (row['house_type_id'], row['name'].strip().lower()): row['tipologia_id']
+            for row in db.execute("SELECT tipologia_id, house_type_id, name FROM HouseTypeTipologias")
+        }
+
+    def house_type_id(self, value):
+        house_type_id = self.house_type_names.get(value.lower())
+        if house_type_id is None and value.isdigit() and int(value) in self.house_types:
+            house_type_id = int(value)
+        return house_type_id
+
+
+def _parse_datetime(value):
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid planned_start_datetime '{value}' (expected YYYY-MM-DD HH:MM:SS)")
+
+def _parse_row(record, refs):
+    """Validates one CSV record. Returns the upsert parameters; raises ValueError."""
+    values = {column: (record.get(column) or '').strip() for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    missing = [column for column in REQUIRED_COLUMNS if not values[column]]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    project_id = refs.projects.get(values['project_name'])
+    if project_id is None:
+        raise ValueError(f"Unknown project '{values['project_name']}'")
+    house_type_id = refs.house_type_id(values['house_type'])
+    if house_type_id is None:
+        raise ValueError(f"Unknown house type '{values['house_type']}'")
+    try:
+        module_number = int(values['module_number'])
+    except ValueError:
+        raise ValueError(f"Invalid module_number '{values['module_number']}'") from None
+    if not 1 <= module_number <= refs.house_types[house_type_id]:
+        raise ValueError(f"module_number {module_number} out of range for house type '{values['house_type']}' (1-{refs.house_types[house_type_id]})")
+
+    tipologia_id = None
+    if values['sub_type']:
+        tipologia_id = refs.tipologias.get((house_type_id, values['sub_type'].lower()))
+        if tipologia_id is None:
+            raise ValueError(f"Unknown sub_type '{values['sub_type']}' for house type '{values['house_type']}'")
+    planned_sequence = None
+    if values['planned_sequence']:
+        try:
+            planned_sequence = int(values['planned_sequence'])
+        except ValueError:
+            raise ValueError(f"Invalid planned_sequence '{values['planned_sequence']}'") from None
+    line = values['planned_assembly_line'].upper()
+    if line and line not in ASSEMBLY_LINES:
+        raise ValueError(f"Invalid planned_assembly_line '{values['planned_assembly_line']}' (must be one of {', '.join(ASSEMBLY_LINES)})")
+    status = values['status'].title()
+    if status and status not in IMPORTABLE_STATUSES:
+        raise ValueError(f"Invalid status '{values['status']}' (must be one of {', '.join(IMPORTABLE_STATUSES)})")
+
+    return {
+        'project_id': project_id, 'house_type_id': house_type_id,
+        'house_identifier': values['house_identifier'], 'module_number': module_number,
+        'planned_sequence': planned_sequence,
+        'planned_start_datetime': _parse_datetime(values['planned_start_datetime']) if values['planned_start_datetime'] else None,
+        'planned_assembly_line': line or None, 'tipologia_id': tipologia_id, 'status': status or None,
+        'set_sequence': planned_sequence is not None, 'set_datetime': bool(values['planned_start_datetime']),
+        'set_line': bool(line), 'set_sub_type': bool(values['sub_type']), 'set_status': bool(status),
+    }
+
+def _plan_key(row):
+    return (row['project_id'], row['house_identifier'], row['module_number'])
+
+def _existing_statuses(db, rows):
+    """{(project_id, house_identifier, module_number): status} of the rows' existing plan items."""
+    keys = list(dict.fromkeys(_plan_key(row) for row in rows))
+    values = ', '.join(['(?, ?, ?)'] * len(keys))
+    params = [value for key in keys for value in key]
+    return {
+        (row[0], row[1], row[2]): row[3]
+        for row in db.execute(f"""
+            WITH keys(project_id, house_identifier, module_number) AS (VALUES {values})
+            SELECT pp.project_id, pp.house_identifier, pp.module_sequence_in_house, pp.status
+            FROM keys k
+            JOIN ProductionPlan pp ON pp.project_id = k.project_id AND pp.house_identifier = k.house_identifier
+                AND pp.module_sequence_in_house = k.module_number
+        """, params)
+    }
+
+@write_operation
+def _upsert_rows(rows):
+    """Upserts one validated chunk. New items without a sequence go to the end of the plan."""
+    db = get_db()
+    next_sequence = db.execute("SELECT COALESCE(MAX(planned_sequence), 0) FROM ProductionPlan").fetchone()[0]
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for i, row in enumerate(rows):
+        if row['planned_sequence'] is None:
+            next_sequence += SEQUENCE_GAP
+            row['planned_sequence'] = next_sequence # Ignored on update unless the row set it
+        row['planned_start_datetime'] = row['planned_start_datetime'] or now
+        row['planned_assembly_line'] = row['planned_assembly_line'] or ASSEMBLY_LINES[i % len(ASSEMBLY_LINES)]
+        row['status'] = row['status'] or 'Planned'
+    with db:
+        db.executemany(_UPSERT, rows)
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_plan_csv(stream, dry_run=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Imports plan items from a text stream of CSV (see module docstring).
+    Returns a summary: rows, inserted, updated, failed, chunks, dry_run and errors
+    (the first MAX_REPORTED_ERRORS as {'line', 'error'}). chunk_size is kept between 1
+    and MAX_CHUNK_SIZE. Raises PlanImportError if the header lacks required columns.
+    """
+    chunk_size = max(1, min(int(chunk_size), MAX_CHUNK_SIZE))
+    reader = csv.DictReader(stream)
+    header = [name.strip() for name in (reader.fieldnames or [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise PlanImportError(f"Missing CSV column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+
+    db = get_db()
+    refs = _ReferenceData(db)
+    summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'chunks': 0, 'dry_run': dry_run, 'errors': []}
+
+    def fail(line, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line, 'error': message})
+
+    def records():
+        for record in reader:
+            yield reader.line_num, record
+
+    for chunk in _chunks(records(), chunk_size):
+        summary['chunks'] += 1
+        summary['rows'] += len(chunk)
+        rows = []
+        for line, record in chunk:
+            try:
+                rows.append((line, _parse_row(record, refs)))
+            except ValueError as e:
+                fail(line, str(e))
+        if not rows:
+            continue
+        existing = _existing_statuses(db, [row for _, row in rows])
+        writable = []
+        written_keys = set() # Keys already written by this chunk: a repeat updates that item
+        for line, row in rows:
+            key = _plan_key(row)
+            status = existing.get(key)
+            if status is not None and status not in IMPORTABLE_STATUSES:
+                fail(line, f"House {row['house_identifier']} module {row['module_number']} is already '{status}' and cannot be changed")
+                continue
+            writable.append(row)
+            summary['updated' if status is not None or key in written_keys else 'inserted'] += 1
+            written_keys.add(key)
+        if writable and not dry_run:
+            _upsert_rows(writable)
+
+    logger.info(
+        f"Plan import{' (dry run)' if dry_run else ''}: {summary['rows']} rows, {summary['inserted']} inserted, "
+        f"{summary['updated']} updated, {summary['failed']} failed"
+    )
+    return summary
+
+def text_stream(binary):
+    """Wraps a binary stream (request body, uploaded file) for import_plan_csv."""
+    if not isinstance(binary, io.BufferedIOBase):
+        binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+@click.command('import-plan')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate and count without writing.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help=f'Rows validated and written per batch (at most {MAX_CHUNK_SIZE}).')
+@with_appcontext
+def import_plan_command(csv_file, dry_run, chunk_size):
+    """Import production plan items from a CSV file."""
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        try:
+            summary = import_plan_csv(f, dry_run=dry_run, chunk_size=chunk_size)
+        except PlanImportError as e:
+            print(e)
+            return
+    for error in summary['errors']:
+        print(f"  line {error['line']}: {error['error']}")
+    print(f"{'Dry run: ' if dry_run else ''}{summary['rows']} rows, {summary['inserted']} inserted, "
+          f"{summary['updated']} updated, {summary['failed']} failed.")
+
+
+def init_app(app):
+    """Registers the import-plan CLI command."""
+    app.cli.add_command(import_plan_command)
@@ -0,0 +1,63 @@
+"""Gapped rank keys for the production plan order (planned_sequence).
+
+planned_sequence stays an INTEGER that every query orders by, but items are
+SEQUENCE_GAP apart instead of 1, 2, 3, ... Moving items between two
+neighbours then only assigns the moved rows new keys inside the gap; the
+rest of the plan keeps its keys. Ties are broken by plan_id, so the order is
+always (planned_sequence, plan_id).
+
+When a gap is used up, the move respaces a small window of the following
+rows (see queries.move_production_plan_items). Maintenance runs rebalance()
+once gaps get narrow, restoring even spacing for the whole plan.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Distance between the keys of consecutive plan items after a rebalance
+SEQUENCE_GAP = 1024
+
+# Maintenance rebalances the plan when two consecutive keys are closer than this
+REBALANCE_MIN_GAP = 16
+
+
+def spaced_keys(lo, hi, count):
+    """`count` increasing integer keys strictly between lo and hi, as evenly spread as
+    possible. lo or hi may be None (no neighbour on that side); the keys are then
+    SEQUENCE_GAP apart. Raises ValueError if there is no room for them.
+    """
+    if lo is None and hi is None:
+        lo = 0
+    if hi is None:
+        return [lo + SEQUENCE_GAP * (i + 1) for i in range(count)]
+    if lo is None:
+        lo = hi - SEQUENCE_GAP * (count + 1)
+    if hi - lo <= count:
+        raise ValueError(f"No room for {count} keys between {lo} and {hi}")
+    step = (hi - lo) / (count + 1)
+    return [lo + int(step * (i + 1)) for i in range(count)]
+
+def crowded_gaps(db, min_gap=REBALANCE_MIN_GAP):
+    """Number of consecutive plan items whose keys are less than min_gap apart."""
+    return db.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT planned_sequence - LAG(planned_sequence) OVER (ORDER BY planned_sequence, plan_id) AS gap
+            FROM ProductionPlan
+        ) WHERE gap < ?
+    """, (min_gap,)).fetchone()[0]
+
+def rebalance(db):
+    """Renumbers the whole plan to 1, 2, 3, ... times SEQUENCE_GAP, keeping its order.
+    Only rows whose key changes are written. Runs in the caller's transaction; returns
+    the number of rows updated.
+    """
+    cursor = db.execute(f"""
+        UPDATE ProductionPlan SET planned_sequence = ranked.position * {SEQUENCE_GAP}
+        FROM (
+            SELECT plan_id, ROW_NUMBER() OVER (ORDER BY planned_sequence, plan_id) AS position
+            FROM ProductionPlan
+        ) AS ranked
+        WHERE ProductionPlan.plan_id = ranked.plan_id AND ProductionPlan.planned_sequence <> ranked.position * {SEQUENCE_GAP}
+    """)
+    logger.info(f"Rebalanced ProductionPlan.planned_sequence: {cursor.rowcount} rows renumbered")
+    return cursor.rowcount
@@ -0,0 +1,131 @@
+import collections
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of persistent SQLite connections.
+
+    Connections are created lazily by `factory` (which is expected to apply
+    pragmas and row factory once) and then kept open, so the schema cache and
+    page cache survive between requests. Idle connections are handed out LIFO
+    so the most recently used (warmest) connection is reused first.
+    """
+
+    def __init__(self, factory, max_size=8, timeout=10.0):
+        if max_size < 1:
+            raise ValueError("Pool max_size must be at least 1")
+        self._factory = factory
+        self._max_size = max_size
+        self._timeout = timeout
+        self._idle = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        # Counters reported by stats()
+        self._size = 0 # Open connections (idle + in use)
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0 # Checkouts that had to wait for a connection
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+    def acquire(self):
+        """Borrows a connection, opening a new one if the pool is not full yet.
+        Blocks up to `timeout` seconds when every connection is in use.
+        """
+        start = time.monotonic()
+        deadline = start + self._timeout
+        conn = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self._max_size:
+                    self._size += 1 # Reserve the slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"Timed out after {self._timeout}s waiting for a database connection")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait = time.monotonic() - start
+            self._checkouts += 1
+            self._in_use += 1
+            if waited:
+                self._waits += 1
+            self._wait_time += wait
+            self._max_wait = max(self._max_wait, wait)
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        """Returns a borrowed connection. Any transaction left open by the
+        request is rolled back so the next borrower starts clean; a connection
+        that cannot be reset is discarded instead of being reused.
+        """
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        """Closes idle connections. Connections still in use are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Returns a snapshot of pool size, checkout counts and wait times."""
+        with self._cond:
+            return {
+                'max_size': self._max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'total_wait_ms': round(self._wait_time * 1000, 3),
+                'avg_wait_ms': round(self._wait_time * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
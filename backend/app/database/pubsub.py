@@ -0,0 +1,143 @@
+"""In-process publish/subscribe hub, and Server-Sent Events framing.
+
+A Hub fans messages out by topic to the subscribers of this process: each
+Subscription has its own queue and condition, so a publish wakes only the
+subscribers of that topic (e.g. the tablets of one station), not every
+open stream. A subscriber that falls more than `max_pending` messages behind
+loses its queue and is told so (overflowed), and should resynchronize from
+the source instead of replaying.
+
+Nothing crosses processes: publishers are watcher threads (see watcher.py),
+one per process, that see the commits of every worker through the
+database's generation counters.
+
+A subscriber's response holds a server thread for as long as it is connected.
+StreamSlots bounds how many of a process's threads all of its streams hold
+together, so a full stream cannot starve ordinary requests.
+"""
+import collections
+import os
+import threading
+
+HEARTBEAT = ': heartbeat\n\n' # SSE comment: keeps proxies from closing idle streams, detects gone clients
+
+
+def format_event(event_id, name=None, data=None):
+    """One SSE message. `data` is JSON text without newlines; without `name` only the ID is
+    sent, which moves the client's Last-Event-ID without dispatching an event.
+    """
+    lines = [f"id: {event_id}"]
+    if name is not None:
+        lines.append(f"event: {name}")
+        lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Queue of the messages published to any of `topics` for one subscriber."""
+
+    def __init__(self, hub, topics, max_pending):
+        self.topics = frozenset(topics)
+        self._hub = hub
+        self._max_pending = max_pending
+        self._pending = collections.deque()
+        self._overflowed = False
+        self._cond = threading.Condition()
+
+    def get(self, timeout):
+        """Pending messages, oldest first, waiting up to `timeout` seconds for one (empty on
+        timeout), and whether messages were dropped since the last call.
+        """
+        with self._cond:
+            if not self._pending and not self._overflowed:
+                self._cond.wait(timeout)
+            messages = list(self._pending)
+            self._pending.clear()
+            overflowed, self._overflowed = self._overflowed, False
+        return messages, overflowed
+
+    def close(self):
+        self._hub._remove(self)
+
+    def _put(self, message):
+        with self._cond:
+            if len(self._pending) >= self._max_pending:
+                self._pending.clear()
+                self._overflowed = True
+            else:
+                self._pending.append(message)
+            self._cond.notify()
+
+
+class Hub:
+    """Topic -> subscriptions of this process."""
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, max_pending=100):
+        subscription = Subscription(self, topics, max_pending)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def publish(self, topic, message):
+        """Queues `message` for every subscriber of `topic`. Returns how many there were."""
+        with self._lock:
+            subscriptions = list(self._topics.get(topic, ()))
+        for subscription in subscriptions:
+            subscription._put(message)
+        return len(subscriptions)
+
+    def subscriber_count(self):
+        """Number of open subscriptions (each counted once)."""
+        with self._lock:
+            return len(set().union(*self._topics.values())) if self._topics else 0
+
+    def _remove(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+
+class StreamSlots:
+    """Response threads the event streams of one process may hold between them (0: no limit)."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a slot for a new subscriber; False if none is left."""
+        with self._lock:
+            if self.limit and self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.used -= 1
+
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+def stream_slots(config):
+    """This process's StreamSlots: SERVER_THREADS less STREAM_RESERVED_THREADS, at least one."""
+    pid = os.getpid()
+    slots = _slots.get(pid)
+    if slots is None:
+        with _slots_lock:
+            slots = _slots.get(pid)
+            if slots is None:
+                limit = config.get('SERVER_THREADS', 48) - config.get('STREAM_RESERVED_THREADS', 16)
+                slots = _slots[pid] = StreamSlots(max(1, limit))
+    return slots
@@ -1,6 +1,21 @@
+import logging
 import sqlite3
-import sqlite3
-from .connection import get_db
+from .connection import get_db, write_operation
+from .pagination import decode_cursor, encode_cursor
+from .plan_sequence import SEQUENCE_GAP, spaced_keys
+from .reference_cache import cached_reference
+from .task_graph import get_task_graph, load_task_graph
+
+logger = logging.getLogger(__name__)
+
+
+class NotFoundError(ValueError):
+    """Raised when a write refers to a row that does not exist (the API answers 404)."""
+
+
+class ProjectStateError(ValueError):
+    """Raised when a project's status does not allow the change (the API answers 409)."""
+
 
 # === Projects ===
 
@@ -67,6 +82,7 @@ def get_project_by_id(project_id):
 
     return project_dict
 
+@write_operation
 def add_project(name, description, status, house_types_data):
     """Adds a new project and its associated house types."""
     db = get_db()
@@ -94,7 +110,7 @@ def add_project(name, description, status, house_types_data):
 
             # --- Handle Production Plan Generation if status is 'Active' ---
             if status == 'Active':
-                print(f"Project {project_id} created as Active. Generating production plan...")
+                logger.info(f"Project {project_id} created as Active. Generating production plan...")
                 # Fetch details needed for generation (including house type names and number of modules)
                 # Need to query within the same transaction context 'db'
                 details_query = """
@@ -106,20 +122,20 @@ def add_project(name, description, status, house_types_data):
                 details_cursor = db.execute(details_query, (project_id,))
                 house_types_details = [dict(row) for row in details_cursor.fetchall()]
 
-                if not generate_production_plan_for_project(project_id, name, house_types_details):
-                    # If generation fails, raise an exception to trigger rollback
-                    raise Exception(f"Failed to generate production plan for newly added project {project_id}. Rolling back.")
+                # Raises on failure, which rolls the whole transaction back
+                generate_production_plan_for_project(project_id, name, house_types_details)
 
         return project_id # Return the ID of the newly created project
     except sqlite3.IntegrityError as e:
         # Handle potential unique constraint violation (e.g., duplicate name)
-        print(f"Error adding project (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error adding project (IntegrityError): {e}")
         raise e # Re-raise to be caught by API layer
     except Exception as e: # Catch generation errors too
-        print(f"Error adding project: {e}") # Replace with logging
+        logger.error(f"Error adding project: {e}")
         # Transaction ensures rollback on error
         return None
 
+@write_operation
 def update_project(project_id, name, description, status, house_types_data):
     """Updates an existing project and its associated house types."""
     db = get_db()
@@ -150,14 +166,15 @@ def update_project(project_id, name, description, status, house_types_data):
                     )
         return True # Success
     except sqlite3.IntegrityError as e:
-        print(f"Error updating project (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error updating project (IntegrityError): {e}")
         raise e # Re-raise
     except sqlite3.Error as e:
-        print(f"Error updating project: {e}") # Replace with logging
+        logger.error(f"Error updating project: {e}")
         return False
 
 from datetime import datetime, timedelta # Add imports for date calculation
 
+@write_operation
 def update_project(project_id, name, description, status, house_types_data):
     """Updates an existing project and its associated house types.
        Handles automatic generation/removal of production plan items based on status change.
@@ -176,7 +193,7 @@ def update_project(project_id, name, description, status, house_types_data):
                 (name, description, status, project_id)
             )
             if update_cursor.rowcount == 0:
-                print(f"Project {project_id} not found for update.")
+                logger.info(f"Project {project_id} not found for update.")
                 return False # Project not found
 
             # --- Update ProjectModules ---
@@ -199,7 +216,7 @@ def update_project(project_id, name, description, status, house_types_data):
             # --- Handle Production Plan Generation/Removal ---
             if current_status != 'Active' and status == 'Active':
                 # Project is being activated - Generate plan items
-                print(f"Project {project_id} activated. Generating production plan...")
+                logger.info(f"Project {project_id} activated. Generating production plan...")
                 # Fetch details needed for generation (including house type names and number of modules)
                 details_query = """
                     SELECT pm.house_type_id, pm.quantity, ht.name as house_type_name, ht.number_of_modules
@@ -209,23 +226,22 @@ def update_project(project_id, name, description, status, house_types_data):
                 """
                 details_cursor = db.execute(details_query, (project_id,))
                 house_types_details = [dict(row) for row in details_cursor.fetchall()]
-                if not generate_production_plan_for_project(project_id, name, house_types_details):
-                    # If generation fails, we should ideally roll back the transaction.
-                    # The `with db:` block handles this automatically by not committing if an exception occurs.
-                    raise Exception(f"Failed to generate production plan for project {project_id}. Rolling back.") # Raise exception to trigger rollback
+                # Raises on failure, which rolls the whole transaction back
+                generate_production_plan_for_project(project_id, name, house_types_details)
 
             elif current_status == 'Active' and status != 'Active':
                 # Project is being deactivated - Remove planned items
-                print(f"Project {project_id} deactivated. Removing planned/scheduled items...")
+                logger.info(f"Project {project_id} deactivated. Removing planned/scheduled items...")
                 if not remove_planned_items_for_project(project_id):
                      raise Exception(f"Failed to remove production plan items for project {project_id}. Rolling back.")
 
         return True # Success - transaction committed
     except sqlite3.IntegrityError as e:
-        print(f"Error updating project (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error updating project (IntegrityError): {e}")
         raise e # Re-raise
     except Exception as e: # Catch generation/removal errors too
-        print(f"Error updating project: {e}") # Replace with logging
+        logger.error(f"Error updating project: {e}")
+@write_operation
 def update_production_plan_item_line(plan_id, new_line):
     """Updates only the planned_assembly_line for a specific production plan item."""
     db = get_db()
@@ -241,84 +257,170 @@ def update_production_plan_item_line(plan_id, new_line):
         db.commit()
         return cursor.rowcount > 0 # True if update occurred, False if plan_id not found
     except sqlite3.Error as e:
-        print(f"Error updating production plan item line: {e}") # Replace with logging
+        logger.error(f"Error updating production plan item line: {e}")
         # Rollback might happen automatically depending on connection settings, but good practice to handle
-def update_production_plan_items_line_bulk(plan_ids, new_line):
-    """Updates the planned_assembly_line for a list of production plan items."""
-    db = get_db()
-    allowed_lines = ['A', 'B', 'C']
-    if new_line not in allowed_lines:
-        raise ValueError(f"Invalid assembly line specified: {new_line}. Must be one of {allowed_lines}")
-    if not plan_ids:
-        return 0 # Nothing to update
 
-    # Create placeholders for the IN clause
-    placeholders = ','.join('?' * len(plan_ids))
-    sql = f"UPDATE ProductionPlan SET planned_assembly_line = ? WHERE plan_id IN ({placeholders})"
-    params = [new_line] + plan_ids # Combine parameters
+# === Production Plan Patches ===
+
+PLAN_STATUSES = ('Planned', 'Scheduled', 'In Progress', 'Completed', 'On Hold', 'Cancelled')
+
+def _patch_line(value):
+    if value not in PLAN_ASSEMBLY_LINES:
+        raise ValueError(value)
+    return value
+
+def _patch_integer(value):
+    """int(value), refusing booleans and values with a fractional part (int(3.7) would be 3)."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    return int(value) # Strings must be integer literals: int('3.7') raises
+
+def _patch_tipologia(value):
+    return None if value is None else _patch_integer(value) # None clears the tipologia
+
+def _patch_datetime(value):
+    if not isinstance(value, str):
+        raise ValueError(value)
+    value = value.strip()
+    datetime.strptime(value, '%Y-%m-%d %H:%M:%S') # Raises ValueError unless it is a real date and time
+    return value
+
+def _patch_status(value):
+    if value not in PLAN_STATUSES:
+        raise ValueError(value)
+    return value
+
+# Fields a plan patch may set, with the function that validates and normalizes the new value
+PLAN_PATCH_FIELDS = {
+    'planned_assembly_line': _patch_line,
+    'tipologia_id': _patch_tipologia,
+    'planned_start_datetime': _patch_datetime,
+    'status': _patch_status,
+    'planned_sequence': _patch_integer,
+}
+
+# Per-connection staging table for patch_production_plan_items: the new value of each
+# field plus a set_<field> flag, so a patch can set a field to NULL or leave it alone
+_PLAN_PATCH_TABLE_SQL = "CREATE TEMP TABLE IF NOT EXISTS plan_patch (plan_id INTEGER PRIMARY KEY, {columns})".format(
+    columns=', '.join(f"{field}, set_{field} INTEGER NOT NULL DEFAULT 0" for field in PLAN_PATCH_FIELDS)
+)
+
+def _validate_plan_patches(patches):
+    """Checks and normalizes patches ({'plan_id': ..., field: value, ...}). Several patches
+    for the same plan_id are merged, later values winning. Raises ValueError.
+    """
+    merged = {}
+    for patch in patches:
+        if not isinstance(patch, dict) or 'plan_id' not in patch:
+            raise ValueError("Each patch must be an object with a 'plan_id'")
+        try:
+            plan_id = int(patch['plan_id'])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid plan_id: {patch['plan_id']!r}")
+        unknown = sorted(set(patch) - set(PLAN_PATCH_FIELDS) - {'plan_id'})
+        if unknown:
+            raise ValueError(f"Cannot patch field(s) {', '.join(unknown)} of plan item {plan_id}. Allowed: {', '.join(PLAN_PATCH_FIELDS)}")
+        fields = merged.setdefault(plan_id, {})
+        for field, value in patch.items():
+            if field == 'plan_id':
+                continue
+            try:
+                fields[field] = PLAN_PATCH_FIELDS[field](value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {field} for plan item {plan_id}: {value!r}")
+    return merged
+
+@write_operation
+def patch_production_plan_items(patches):
+    """
+    Applies per-item updates to production plan items in one transaction. Each patch is
+    a dict with a plan_id and any of PLAN_PATCH_FIELDS; items may set different fields
+    to different values. The patches are loaded into a temporary table with executemany
+    (one row bound at a time, so there is no limit on the number of items) and applied
+    with a single UPDATE ... FROM join. Rows whose values do not change are not written.
+    Raises NotFoundError for unknown plan items and ValueError for invalid values or a
+    tipologia that does not belong to the item's house type; nothing is written then. Returns the number of
+    rows updated.
+    """
+    merged = _validate_plan_patches(patches)
+    if not merged:
+        return 0
+
+    rows = []
+    for plan_id, fields in merged.items():
+        row = [plan_id]
+        for field in PLAN_PATCH_FIELDS:
+            row += [fields.get(field), field in fields]
+        rows.append(row)
+    placeholders = ', '.join('?' * (1 + 2 * len(PLAN_PATCH_FIELDS)))
+    columns = ', '.join(f"{field}, set_{field}" for field in PLAN_PATCH_FIELDS)
+    assignments = ',\n            '.join(
+        f"{field} = CASE WHEN p.set_{field} THEN p.{field} ELSE ProductionPlan.{field} END" for field in PLAN_PATCH_FIELDS
+    )
+    changed = ' OR '.join(f"(p.set_{field} AND p.{field} IS NOT ProductionPlan.{field})" for field in PLAN_PATCH_FIELDS)
 
+    db = get_db()
     try:
         with db: # Use transaction
-            cursor = db.execute(sql, params)
+            db.execute(_PLAN_PATCH_TABLE_SQL)
+            db.execute("DELETE FROM temp.plan_patch") # Left over from a failed patch on this connection
+            db.executemany(f"INSERT INTO temp.plan_patch (plan_id, {columns}) VALUES ({placeholders})", rows)
+
+            missing = [row[0] for row in db.execute(
+                "SELECT p.plan_id FROM temp.plan_patch p LEFT JOIN ProductionPlan pp ON pp.plan_id = p.plan_id "
+                "WHERE pp.plan_id IS NULL ORDER BY p.plan_id LIMIT 20"
+            )]
+            if missing:
+                raise NotFoundError(f"Production plan item(s) not found: {', '.join(map(str, missing))}")
+            mismatched = db.execute("""
+                SELECT p.plan_id, p.tipologia_id FROM temp.plan_patch p
+                JOIN ProductionPlan pp ON pp.plan_id = p.plan_id
+                LEFT JOIN HouseTypeTipologias htt ON htt.tipologia_id = p.tipologia_id
+                WHERE p.set_tipologia_id AND p.tipologia_id IS NOT NULL
+                  AND (htt.tipologia_id IS NULL OR htt.house_type_id <> pp.house_type_id)
+                ORDER BY p.plan_id LIMIT 1
+            """).fetchone()
+            if mismatched:
+                raise ValueError(f"Tipologia {mismatched[1]} does not exist for the house type of plan item {mismatched[0]}")
+
+            cursor = db.execute(f"""
+                UPDATE ProductionPlan SET
+                    {assignments},
+                    updated_at = CURRENT_TIMESTAMP
+                FROM temp.plan_patch p
+                WHERE ProductionPlan.plan_id = p.plan_id AND ({changed})
+            """)
             updated_count = cursor.rowcount
-        print(f"Updated assembly line to '{new_line}' for {updated_count} plan items.") # Replace with logging
-        return updated_count # Return the number of rows affected
+            db.execute("DELETE FROM temp.plan_patch")
+        logger.info(f"Patched {len(merged)} plan items ({updated_count} rows changed).")
+        return updated_count
+    except sqlite3.IntegrityError as e:
+        logger.error(f"Error patching production plan items (IntegrityError): {e}")
+        raise e
     except sqlite3.Error as e:
-        print(f"Error updating bulk production plan item lines: {e}") # Replace with logging
-        # Transaction ensures rollback
+        logger.error(f"Error patching production plan items: {e}")
         raise e # Re-raise the exception to be handled by the API layer
 
-def update_production_plan_items_tipologia_bulk(plan_ids, tipologia_id):
-    """Updates the tipologia_id for a list of production plan items."""
-    db = get_db()
-    if not plan_ids:
-        return 0 # Nothing to update
-
-    # Validate tipologia_id exists if not None? Optional, depends on requirements.
-    # If tipologia_id is None, we are clearing the tipologia.
-
-    # Create placeholders for the IN clause
-    placeholders = ','.join('?' * len(plan_ids))
-    sql = f"UPDATE ProductionPlan SET tipologia_id = ? WHERE plan_id IN ({placeholders})"
-    params = [tipologia_id] + plan_ids # Combine parameters
-
-    try:
-        with db: # Use transaction
-            cursor = db.execute(sql, params)
-            updated_count = cursor.rowcount
-        print(f"Updated tipologia_id to '{tipologia_id}' for {updated_count} plan items.") # Replace with logging
-        return updated_count # Return the number of rows affected
-    except sqlite3.Error as e:
-        print(f"Error updating bulk production plan item tipologias: {e}") # Replace with logging
-        # Transaction ensures rollback
-        raise e # Re-raise the exception
+@write_operation
+def update_production_plan_items_line_bulk(plan_ids, new_line):
+    """Updates the planned_assembly_line for a list of production plan items."""
+    return patch_production_plan_items([{'plan_id': plan_id, 'planned_assembly_line': new_line} for plan_id in plan_ids])
 
+@write_operation
+def update_production_plan_items_tipologia_bulk(plan_ids, tipologia_id):
+    """Updates the tipologia_id for a list of production plan items (None clears it)."""
+    return patch_production_plan_items([{'plan_id': plan_id, 'tipologia_id': tipologia_id} for plan_id in plan_ids])
 
+@write_operation
 def update_production_plan_items_datetime_bulk(plan_ids, new_datetime_str):
     """Updates the planned_start_datetime for a list of production plan items."""
-    db = get_db()
-    if not plan_ids:
-        return 0 # Nothing to update
-
-    # Optional: Validate datetime format again at DB level if needed, though API layer should catch it.
-
-    # Create placeholders for the IN clause
-    placeholders = ','.join('?' * len(plan_ids))
-    sql = f"UPDATE ProductionPlan SET planned_start_datetime = ? WHERE plan_id IN ({placeholders})"
-    params = [new_datetime_str] + plan_ids # Combine parameters
-
-    try:
-        with db: # Use transaction
-            cursor = db.execute(sql, params)
-            updated_count = cursor.rowcount
-        print(f"Updated planned_start_datetime to '{new_datetime_str}' for {updated_count} plan items.") # Replace with logging
-        return updated_count # Return the number of rows affected
-    except sqlite3.Error as e:
-        print(f"Error updating bulk production plan item datetimes: {e}") # Replace with logging
-        # Transaction ensures rollback
-        raise e # Re-raise the exception
-
+    return patch_production_plan_items([{'plan_id': plan_id, 'planned_start_datetime': new_datetime_str} for plan_id in plan_ids])
 
+@write_operation
 def delete_project(project_id):
     """Deletes a project. Cascading delete handles ProjectModules."""
     db = get_db()
@@ -329,7 +431,7 @@ def delete_project(project_id):
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         # Handle potential foreign key issues if project_id is used elsewhere without CASCADE
-        print(f"Error deleting project: {e}") # Replace with logging
+        logger.error(f"Error deleting project: {e}")
         return False
 
 # === Production Plan Generation Helpers ===
@@ -341,61 +443,116 @@ def get_max_planned_sequence():
     max_seq = cursor.fetchone()[0]
     return max_seq if max_seq is not None else 0
 
+# Plan generation: modules are spread round-robin over the assembly lines and planned
+# PLAN_MODULE_INTERVAL apart; rows are inserted PLAN_INSERT_CHUNK at a time
+PLAN_ASSEMBLY_LINES = ('A', 'B', 'C')
+PLAN_MODULE_INTERVAL = timedelta(hours=8)
+PLAN_INSERT_CHUNK = 500 # 9 parameters per row, well under SQLite's variable limit
+
+_PLAN_INSERT_COLUMNS = ('project_id, house_type_id, house_identifier, module_sequence_in_house, planned_sequence, '
+                        'planned_start_datetime, planned_assembly_line, tipologia_id, status')
+
+def _plan_rows(project_id, houses, first_sequence, first_line_index, start_datetime):
+    """ProductionPlan rows (in _PLAN_INSERT_COLUMNS order) for `houses`, a list of
+    (house_type_id, house_identifier, number_of_modules) in build order: one row per
+    module, with consecutive gapped sequence keys, lines and start times.
+    """
+    rows = []
+    for house_type_id, house_identifier, number_of_modules in houses:
+        for module_seq in range(1, number_of_modules + 1):
+            i = len(rows)
+            rows.append((
+                project_id, house_type_id, house_identifier, module_seq,
+                first_sequence + i * SEQUENCE_GAP,
+                (start_datetime + i * PLAN_MODULE_INTERVAL).strftime('%Y-%m-%d %H:%M:%S'),
+                PLAN_ASSEMBLY_LINES[(first_line_index + i) % len(PLAN_ASSEMBLY_LINES)],
+                None, # tipologia_id - Set to NULL initially
+                'Planned'
+            ))
+    return rows
+
+def _insert_plan_rows(db, rows):
+    """Inserts ProductionPlan rows with multi-row INSERTs of PLAN_INSERT_CHUNK rows and
+    returns their plan_ids in the order of `rows`. Runs in the caller's transaction.
+    """
+    plan_ids = []
+    for start in range(0, len(rows), PLAN_INSERT_CHUNK):
+        chunk = rows[start:start + PLAN_INSERT_CHUNK]
+        values = ', '.join(['(?, ?, ?, ?, ?, ?, ?, ?, ?)'] * len(chunk))
+        inserted = db.execute(
+            f"INSERT INTO ProductionPlan ({_PLAN_INSERT_COLUMNS}) VALUES {values} RETURNING plan_id",
+            [value for row in chunk for value in row]
+        ).fetchall()
+        # RETURNING order is unspecified; new rowids increase in VALUES order
+        plan_ids.extend(sorted(row[0] for row in inserted))
+    return plan_ids
+
+@write_operation
 def generate_production_plan_for_project(project_id, project_name, house_types_details):
-    """Generates ProductionPlan items (one per module) for a newly activated project."""
-    db = get_db()
-    items_to_add = []
-    current_sequence = get_max_planned_sequence() + 1
-    assembly_lines = ['A', 'B', 'C']
-    line_index = 0
-    start_datetime_base = datetime.now() # Base time for planning
-
-    for ht_detail in house_types_details:
-        house_type_id = ht_detail['house_type_id']
-        quantity = ht_detail['quantity']
-        house_type_name = ht_detail['house_type_name']
-        number_of_modules = ht_detail['number_of_modules'] # Fetch number of modules
-
-        for i in range(quantity): # For each house instance
-            # house_base_identifier = f"{project_name}-{house_type_name}-{i+1}" # Old identifier format
-            house_base_identifier = str(i + 1) # New identifier: Just the sequence number of the house instance
-
-            for module_seq in range(1, number_of_modules + 1): # For each module within the house
-                # Identifier could include module sequence, e.g., "1-M1"
-                # Or keep house_identifier the same and rely on module_sequence_in_house column
-                house_identifier = house_base_identifier # Using house identifier, module sequence is separate column
-
-                planned_assembly_line = assembly_lines[line_index % len(assembly_lines)]
-
-                # Simple date increment logic (e.g., add 8 hours per module) - ADJUST AS NEEDED
-                planned_start_dt = start_datetime_base + timedelta(hours=(current_sequence - (get_max_planned_sequence() + 1)) * 8)
-                planned_start_datetime_str = planned_start_dt.strftime('%Y-%m-%d %H:%M:%S')
-
-                items_to_add.append((
-                    project_id,
-                    house_type_id,
-                    house_identifier,
-                    module_seq, # Add module_sequence_in_house
-                    current_sequence,
-                    planned_start_datetime_str,
-                    planned_assembly_line,
-                    None, # tipologia_id - Set to NULL initially
-                    'Planned' # Default status
-                ))
-                current_sequence += 1
-                line_index += 1 # Alternate line per module
-
-    if items_to_add:
-        try:
-            add_bulk_production_plan_items(items_to_add)
-            print(f"Successfully generated {len(items_to_add)} plan items for project {project_id}.") # Replace with logging
-            return True
-        except Exception as e:
-            print(f"Error generating bulk plan items for project {project_id}: {e}") # Replace with logging
-            # Consider rollback or cleanup if partial insertion occurred? Transaction handles this.
-            return False
-    return True # No items needed, still success
+    """Generates ProductionPlan items (one per module) for a newly activated project,
+    after the end of the current plan. house_types_details has house_type_id, quantity
+    and number_of_modules per house type; houses are numbered 1, 2, ... across the project
+    (house_identifier is unique per project and module).
+    Returns the new plan_ids in plan order; raises sqlite3.Error on failure.
+    """
+    db = get_db()
+    house_types = [
+        (ht_detail['house_type_id'], ht_detail['number_of_modules'])
+        for ht_detail in house_types_details
+        for _ in range(ht_detail['quantity'])
+    ]
+    houses = [(house_type_id, str(i + 1), number_of_modules) for i, (house_type_id, number_of_modules) in enumerate(house_types)]
+    rows = _plan_rows(project_id, houses, get_max_planned_sequence() + SEQUENCE_GAP, 0, datetime.now())
+    with db:
+        plan_ids = _insert_plan_rows(db, rows)
+    logger.info(f"Generated {len(plan_ids)} plan items for project {project_id} ({project_name}).")
+    return plan_ids
+
+@write_operation
+def append_houses_to_project(project_id, house_type_id, count):
+    """Adds `count` houses of a house type to an active project and plans them at the end
+    of the production plan; existing plan items keep their sequence. House identifiers,
+    assembly lines and start times continue from the project's existing items, and the
+    project's ProjectModules quantity grows by `count`.
+    Returns the new plan_ids in plan order. Raises NotFoundError if the project or house
+    type does not exist and ProjectStateError if the project is not Active.
+    """
+    db = get_db()
+    project = db.execute("SELECT name, status FROM Projects WHERE project_id = ?", (project_id,)).fetchone()
+    if project is None:
+        raise NotFoundError(f"Project {project_id} not found")
+    if project['status'] != 'Active':
+        raise ProjectStateError(f"Project {project_id} is not Active; its plan is generated when it is activated")
+    house_type = db.execute("SELECT number_of_modules FROM HouseTypes WHERE house_type_id = ?", (house_type_id,)).fetchone()
+    if house_type is None:
+        raise NotFoundError(f"House type {house_type_id} not found")
 
+    existing = db.execute("""
+        SELECT
+            (SELECT MAX(CAST(house_identifier AS INTEGER)) FROM ProductionPlan WHERE project_id = :project_id) AS last_house,
+            (SELECT COUNT(*) FROM ProductionPlan WHERE project_id = :project_id) AS items,
+            (SELECT MAX(planned_start_datetime) FROM ProductionPlan WHERE project_id = :project_id) AS last_start,
+            (SELECT MAX(planned_sequence) FROM ProductionPlan) AS max_sequence
+    """, {'project_id': project_id}).fetchone()
+    start_datetime = datetime.now()
+    if existing['last_start']:
+        try:
+            start_datetime = max(start_datetime, datetime.strptime(existing['last_start'], '%Y-%m-%d %H:%M:%S') + PLAN_MODULE_INTERVAL)
+        except ValueError:
+            pass # Edited to another format; start from now
+    first_house = (existing['last_house'] or 0) + 1
+    houses = [(house_type_id, str(first_house + i), house_type['number_of_modules']) for i in range(count)]
+    rows = _plan_rows(project_id, houses, (existing['max_sequence'] or 0) + SEQUENCE_GAP, existing['items'], start_datetime)
+    with db:
+        plan_ids = _insert_plan_rows(db, rows)
+        db.execute("""
+            INSERT INTO ProjectModules (project_id, house_type_id, quantity) VALUES (?, ?, ?)
+            ON CONFLICT (project_id, house_type_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        """, (project_id, house_type_id, count))
+    logger.info(f"Appended {count} houses ({len(plan_ids)} plan items) of house type {house_type_id} to project {project_id}.")
+    return plan_ids
+
+@write_operation
 def remove_planned_items_for_project(project_id):
     """Removes 'Planned' or 'Scheduled' ProductionPlan items for a deactivated project."""
     db = get_db()
@@ -406,15 +563,16 @@ def remove_planned_items_for_project(project_id):
             (project_id,)
         )
         db.commit()
-        print(f"Removed {cursor.rowcount} planned/scheduled items for deactivated project {project_id}.") # Replace with logging
+        logger.info(f"Removed {cursor.rowcount} planned/scheduled items for deactivated project {project_id}.")
         return True
     except sqlite3.Error as e:
-        print(f"Error removing planned items for project {project_id}: {e}") # Replace with logging
+        logger.error(f"Error removing planned items for project {project_id}: {e}")
         return False
 
 
 # === Specialties ===
 
+@cached_reference('Specialties')
 def get_all_specialties():
     """Fetches all specialties from the database."""
     db = get_db()
@@ -432,6 +590,7 @@ def get_specialty_by_name(name):
     row = cursor.fetchone()
     return dict(row) if row else None
 
+@write_operation
 def add_specialty(name, description):
     """Adds a new specialty to the database."""
     db = get_db()
@@ -446,6 +605,7 @@ def add_specialty(name, description):
         # Handle potential unique constraint violation (e.g., duplicate name)
         return None # Or raise a custom exception
 
+@write_operation
 def update_specialty(specialty_id, name, description):
     """Updates an existing specialty."""
     db = get_db()
@@ -456,6 +616,7 @@ def update_specialty(specialty_id, name, description):
     db.commit()
     return cursor.rowcount > 0 # Return True if a row was updated, False otherwise
 
+@write_operation
 def delete_specialty(specialty_id):
     """Deletes a specialty."""
     db = get_db()
@@ -467,6 +628,10 @@ def delete_specialty(specialty_id):
 
 def get_all_task_definitions():
     """Fetches all task definitions from the database."""
+    return list(iter_task_definitions())
+
+def iter_task_definitions():
+    """get_all_task_definitions as a generator reading rows as they are consumed."""
     db = get_db()
     # Join with other tables to get names instead of just IDs
     query = """
@@ -481,9 +646,8 @@ def get_all_task_definitions():
         -- Removed join to Stations table
         ORDER BY td.name
     """
-    cursor = db.execute(query)
-    task_defs = cursor.fetchall()
-    return [dict(row) for row in task_defs]
+    for row in db.execute(query):
+        yield dict(row)
 
 def get_task_definition_by_id(task_definition_id):
     """Fetches a single task definition by its ID, including related names."""
@@ -503,77 +667,109 @@ def get_task_definition_by_id(task_definition_id):
     row = cursor.fetchone()
     return dict(row) if row else None
 
+def _set_task_dependencies(db, task_definition_id, task_dependencies):
+    """Replaces the prerequisites of a task (TaskDependencies edges) and mirrors them
+    into TaskDefinitions.task_dependencies. Raises ValueError for unknown task IDs and
+    DependencyCycleError if the edges would close a cycle.
+    """
+    graph = load_task_graph(db) # Fresh: earlier writes in this batch must be seen
+    unknown = [task_id for task_id in task_dependencies if task_id not in graph.house_types]
+    if unknown:
+        raise ValueError(f"Unknown task definitions in dependencies: {unknown}")
+    graph.check_dependencies(task_definition_id, task_dependencies)
+    current = graph.direct_prerequisites(task_definition_id)
+    if set(task_dependencies) != current:
+        db.execute("DELETE FROM TaskDependencies WHERE task_definition_id = ?", (task_definition_id,))
+        db.executemany(
+            "INSERT INTO TaskDependencies (task_definition_id, depends_on_task_definition_id) VALUES (?, ?)",
+            [(task_definition_id, prerequisite) for prerequisite in task_dependencies]
+        )
+    db.execute(
+        "UPDATE TaskDefinitions SET task_dependencies = ? WHERE task_definition_id = ?",
+        (','.join(map(str, task_dependencies)) or None, task_definition_id)
+    )
+
+@write_operation
 def add_task_definition(name, description, house_type_id, specialty_id, station_sequence_order, task_dependencies):
-    """Adds a new task definition."""
+    """Adds a new task definition. task_dependencies is a list of prerequisite task IDs."""
     db = get_db()
     try:
-        cursor = db.execute(
-            """INSERT INTO TaskDefinitions
-               (name, description, house_type_id, specialty_id, station_sequence_order, task_dependencies)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (name, description, house_type_id, specialty_id, station_sequence_order, task_dependencies)
-        )
-        db.commit()
+        with db:
+            cursor = db.execute(
+                """INSERT INTO TaskDefinitions
+                   (name, description, house_type_id, specialty_id, station_sequence_order)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (name, description, house_type_id, specialty_id, station_sequence_order)
+            )
+            _set_task_dependencies(db, cursor.lastrowid, task_dependencies or [])
         return cursor.lastrowid
     except sqlite3.IntegrityError:
         return None # Or raise
 
+@write_operation
 def update_task_definition(task_definition_id, name, description, house_type_id, specialty_id, station_sequence_order, task_dependencies):
-    """Updates an existing task definition."""
+    """Updates an existing task definition. task_dependencies is a list of prerequisite task IDs."""
     db = get_db()
-    cursor = db.execute(
-        """UPDATE TaskDefinitions SET
-           name = ?, description = ?, house_type_id = ?, specialty_id = ?, station_sequence_order = ?, task_dependencies = ?
-           WHERE task_definition_id = ?""",
-        (name, description, house_type_id, specialty_id, station_sequence_order, task_dependencies, task_definition_id)
-    )
-    db.commit()
+    with db:
+        cursor = db.execute(
+            """UPDATE TaskDefinitions SET
+               name = ?, description = ?, house_type_id = ?, specialty_id = ?, station_sequence_order = ?
+               WHERE task_definition_id = ?""",
+            (name, description, house_type_id, specialty_id, station_sequence_order, task_definition_id)
+        )
+        if cursor.rowcount > 0:
+            _set_task_dependencies(db, task_definition_id, task_dependencies or [])
     return cursor.rowcount > 0
 
-def get_potential_task_dependencies(current_station_sequence_order):
+def get_potential_task_dependencies(current_station_sequence_order, task_definition_id=None):
     """
     Fetches task definitions that could be prerequisites for a task at the
     given station sequence order. Potential prerequisites must be from stations
-    with a lower sequence order. Includes their own dependencies.
+    with a lower sequence order. Each comes with its own direct prerequisites
+    ('dependencies', a list of IDs). If task_definition_id is given (editing an
+    existing task), candidates that already depend on it are left out, since
+    choosing them would create a cycle.
     """
     db = get_db()
     # Fetch tasks from stations with sequence order less than the current one,
     # or tasks not linked to any specific station (station_sequence_order IS NULL).
-    # Also fetch their own dependencies to indicate complexity.
-    query = """
-        SELECT
-            td.task_definition_id,
-            td.name,
-            td.station_sequence_order,
-            td.task_dependencies -- Include dependencies of potential parents
-        FROM TaskDefinitions td
-        WHERE td.station_sequence_order < ? OR td.station_sequence_order IS NULL
-        ORDER BY td.station_sequence_order, td.name;
-    """
-    # If current_station_sequence_order is None or 0 (e.g., for a new task before station is set),
-    # we might want to fetch all tasks or none? Let's fetch tasks with NULL sequence order only in that case.
-    # However, the frontend will likely only call this when a sequence order *is* selected.
-    # If current_station_sequence_order is None, the query `td.station_sequence_order < ?` becomes problematic.
-    # Let's assume a valid sequence order > 0 is always passed.
+    # If no station is selected yet, only tasks with NULL sequence order are fetched.
     if current_station_sequence_order is None or current_station_sequence_order <= 0:
-        # Or return an empty list if no station is selected yet?
-        # Fetching only NULL sequence tasks if no station selected:
-        query_no_station = """
+        cursor = db.execute("""
             SELECT task_definition_id, name, station_sequence_order, task_dependencies
             FROM TaskDefinitions
             WHERE station_sequence_order IS NULL
             ORDER BY name;
-        """
-        cursor = db.execute(query_no_station)
+        """)
     else:
-        cursor = db.execute(query, (current_station_sequence_order,))
-
-    potential_deps = cursor.fetchall()
-    return [dict(row) for row in potential_deps]
+        cursor = db.execute("""
+            SELECT
+                td.task_definition_id,
+                td.name,
+                td.station_sequence_order,
+                td.task_dependencies -- Mirror of the edges, kept for older clients
+            FROM TaskDefinitions td
+            WHERE td.station_sequence_order < ? OR td.station_sequence_order IS NULL
+            ORDER BY td.station_sequence_order, td.name;
+        """, (current_station_sequence_order,))
+
+    potential_deps = []
+    graph = get_task_graph(db)
+    for row in cursor.fetchall():
+        dep = dict(row)
+        if task_definition_id is not None and (
+            dep['task_definition_id'] == task_definition_id
+            or task_definition_id in graph.all_prerequisites(dep['task_definition_id'])
+        ):
+            continue
+        dep['dependencies'] = sorted(graph.direct_prerequisites(dep['task_definition_id']))
+        potential_deps.append(dep)
+    return potential_deps
 
 
 # === House Type Panels ===
 
+@cached_reference('HouseTypePanels', 'Multiwalls')
 def get_panels_for_house_type_module(house_type_id, module_sequence_number):
     """Fetches all panels for a specific module within a house type, including multiwall info."""
     db = get_db()
@@ -589,6 +785,7 @@ def get_panels_for_house_type_module(house_type_id, module_sequence_number):
     cursor = db.execute(query, (house_type_id, module_sequence_number))
     return [dict(row) for row in cursor.fetchall()]
 
+@write_operation
 def add_panel_to_house_type_module(house_type_id, module_sequence_number, panel_group, panel_code, typology, multiwall_id=None):
     """Adds a new panel to a specific module within a house type."""
     db = get_db()
@@ -615,12 +812,13 @@ def add_panel_to_house_type_module(house_type_id, module_sequence_number, panel_
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         # Could be UNIQUE constraint violation or CHECK constraint
-        print(f"Error adding panel (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error adding panel (IntegrityError): {e}")
         raise e # Re-raise
     except sqlite3.Error as e:
-        print(f"Error adding panel: {e}") # Replace with logging
+        logger.error(f"Error adding panel: {e}")
         return None
 
+@write_operation
 def update_panel_for_house_type_module(house_type_panel_id, panel_group, panel_code, typology, multiwall_id=None):
     """Updates an existing panel."""
     db = get_db()
@@ -665,12 +863,13 @@ def update_panel_for_house_type_module(house_type_panel_id, panel_group, panel_c
         else:
             return False # Multiwall not found
     except sqlite3.IntegrityError as e:
-        print(f"Error updating panel (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error updating panel (IntegrityError): {e}")
         raise e # Re-raise
     except sqlite3.Error as e:
-        print(f"Error updating panel: {e}") # Replace with logging
+        logger.error(f"Error updating panel: {e}")
         return False
 
+@write_operation
 def delete_panel_from_house_type_module(house_type_panel_id):
     """Deletes a panel by its ID."""
     db = get_db()
@@ -679,7 +878,7 @@ def delete_panel_from_house_type_module(house_type_panel_id):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting panel: {e}") # Replace with logging
+        logger.error(f"Error deleting panel: {e}")
         return False
 
 # === Multiwalls ===
@@ -697,6 +896,7 @@ def get_multiwalls_for_house_type_module(house_type_id, module_sequence_number):
     cursor = db.execute(query, (house_type_id, module_sequence_number))
     return [dict(row) for row in cursor.fetchall()]
 
+@write_operation
 def add_multiwall(house_type_id, module_sequence_number, panel_group, multiwall_code):
     """Adds a new multiwall."""
     db = get_db()
@@ -714,12 +914,13 @@ def add_multiwall(house_type_id, module_sequence_number, panel_group, multiwall_
         db.commit()
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
-        print(f"Error adding multiwall (IntegrityError): {e}")
+        logger.error(f"Error adding multiwall (IntegrityError): {e}")
         raise e
     except sqlite3.Error as e:
-        print(f"Error adding multiwall: {e}")
+        logger.error(f"Error adding multiwall: {e}")
         return None
 
+@write_operation
 def update_multiwall(multiwall_id, panel_group, multiwall_code):
     """Updates an existing multiwall."""
     db = get_db()
@@ -751,12 +952,13 @@ def update_multiwall(multiwall_id, panel_group, multiwall_code):
         else:
             return False # Multiwall not found
     except sqlite3.IntegrityError as e:
-        print(f"Error updating multiwall (IntegrityError): {e}")
+        logger.error(f"Error updating multiwall (IntegrityError): {e}")
         raise e
     except sqlite3.Error as e:
-        print(f"Error updating multiwall: {e}")
+        logger.error(f"Error updating multiwall: {e}")
         return False
 
+@write_operation
 def delete_multiwall(multiwall_id):
     """Deletes a multiwall. Associated panels will have multiwall_id set to NULL due to FK constraint."""
     db = get_db()
@@ -766,7 +968,7 @@ def delete_multiwall(multiwall_id):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting multiwall: {e}")
+        logger.error(f"Error deleting multiwall: {e}")
         return False
 
 # === Admin Team ===
@@ -780,6 +982,7 @@ def get_all_admin_team():
     members = cursor.fetchall()
     return [dict(row) for row in members]
 
+@write_operation
 def add_admin_team_member(first_name, last_name, role, pin, is_active):
     """Adds a new member to the AdminTeam table."""
     db = get_db()
@@ -797,12 +1000,13 @@ def add_admin_team_member(first_name, last_name, role, pin, is_active):
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         # Handle potential unique constraint violation (e.g., duplicate PIN)
-        print(f"Error adding admin team member (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error adding admin team member (IntegrityError): {e}")
         raise e # Re-raise to be caught by the API layer
     except sqlite3.Error as e:
-        print(f"Error adding admin team member: {e}") # Replace with logging
+        logger.error(f"Error adding admin team member: {e}")
         return None
 
+@write_operation
 def update_admin_team_member(admin_team_id, first_name, last_name, role, pin, is_active):
     """Updates an existing member in the팀 table."""
     db = get_db()
@@ -821,12 +1025,13 @@ def update_admin_team_member(admin_team_id, first_name, last_name, role, pin, is
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.IntegrityError as e:
-        print(f"Error updating admin team member (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error updating admin team member (IntegrityError): {e}")
         raise e # Re-raise
     except sqlite3.Error as e:
-        print(f"Error updating admin team member: {e}") # Replace with logging
+        logger.error(f"Error updating admin team member: {e}")
         return False
 
+@write_operation
 def delete_admin_team_member(admin_team_id):
     """Deletes a member from the AdminTeam table."""
     db = get_db()
@@ -835,7 +1040,7 @@ def delete_admin_team_member(admin_team_id):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting admin team member: {e}") # Replace with logging
+        logger.error(f"Error deleting admin team member: {e}")
         return False
 
 def get_all_supervisors():
@@ -861,6 +1066,7 @@ def get_admin_member_by_pin(pin):
     return dict(row) if row else None
 
 
+@write_operation
 def delete_task_definition(task_definition_id):
     """Deletes a task definition."""
     db = get_db()
@@ -870,6 +1076,7 @@ def delete_task_definition(task_definition_id):
 
 # === Helper functions to get related data (for dropdowns etc.) ===
 
+@cached_reference('HouseTypes', 'HouseTypeParameters', 'HouseParameters', 'HouseTypeTipologias')
 def get_all_house_types():
     """
     Fetches all house types, including their associated parameters grouped by house type.
@@ -965,6 +1172,7 @@ def get_tasks_for_module_at_station(station_id, module_id, house_type_id, worker
     - Their station_sequence_order matches the specific station's sequence_order.
     - Their house_type_id matches the module's house_type_id (or task's house_type_id is NULL).
     - Their specialty_id matches the worker's specialty_id (or task's specialty_id is NULL).
+    These are looked up in TaskApplicability (kept by migrations._task_applicability).
     """
     db = get_db()
 
@@ -978,16 +1186,17 @@ def get_tasks_for_module_at_station(station_id, module_id, house_type_id, worker
             tl.started_at,
             tl.completed_at
             -- tl.house_type_panel_id -- This column does not exist in TaskLogs
-        FROM TaskDefinitions td
-        LEFT JOIN TaskLogs tl ON td.task_definition_id = tl.task_definition_id AND tl.module_id = ?
-        -- Ensure the task definition is for the specific station by matching station_id via sequence_order
-        JOIN Stations s ON td.station_sequence_order = s.sequence_order AND s.station_id = ?
+        FROM TaskApplicability ta
+        JOIN TaskDefinitions td ON td.task_definition_id = ta.task_definition_id
+        LEFT JOIN TaskLogs tl ON td.task_definition_id = +tl.task_definition_id AND tl.module_id = ?
         WHERE
-            (td.house_type_id = ? OR td.house_type_id IS NULL)
-            AND (td.specialty_id = ? OR td.specialty_id IS NULL)
+            ta.station_sequence_order = (SELECT sequence_order FROM Stations WHERE station_id = ?)
+            AND ta.house_type_id = ?
+            -- Workers without a (known) specialty see the tasks listed under key 0
+            AND ta.specialty_key = COALESCE((SELECT specialty_id FROM Specialties WHERE specialty_id = ?), 0)
         ORDER BY td.name;
     """
-    # Parameters: module_id, station_id (for the JOIN), house_type_id, worker_specialty_id
+    # Parameters: module_id, station_id (for the sequence_order), house_type_id, worker_specialty_id
     tasks_cursor = db.execute(query, (module_id, station_id, house_type_id, worker_specialty_id))
     return [dict(row) for row in tasks_cursor.fetchall()]
 
@@ -998,6 +1207,7 @@ def get_tasks_for_plan_at_station(station_id, plan_id, house_type_id, worker_spe
     at a specific station, considering the worker's specialty.
     This is used primarily for the first station (sequence 1) to show tasks for the upcoming module.
     It does NOT check TaskLogs as the module hasn't started yet.
+    Tasks are looked up in TaskApplicability (kept by migrations._task_applicability).
     """
     db = get_db()
     query = """
@@ -1010,12 +1220,13 @@ def get_tasks_for_plan_at_station(station_id, plan_id, house_type_id, worker_spe
             NULL AS started_at,
             NULL AS completed_at,
             NULL AS house_type_panel_id -- No panel logged yet
-        FROM TaskDefinitions td
-        -- Ensure the task definition is for the specific station by matching station_id via sequence_order
-        JOIN Stations s ON td.station_sequence_order = s.sequence_order AND s.station_id = ?
+        FROM TaskApplicability ta
+        JOIN TaskDefinitions td ON td.task_definition_id = ta.task_definition_id
         WHERE
-            (td.house_type_id = ? OR td.house_type_id IS NULL)
-            AND (td.specialty_id = ? OR td.specialty_id IS NULL)
+            ta.station_sequence_order = (SELECT sequence_order FROM Stations WHERE station_id = ?)
+            AND ta.house_type_id = ?
+            -- Workers without a (known) specialty see the tasks listed under key 0
+            AND ta.specialty_key = COALESCE((SELECT specialty_id FROM Specialties WHERE specialty_id = ?), 0)
         ORDER BY td.name;
     """
     # Parameters: station_id, house_type_id, worker_specialty_id
@@ -1027,6 +1238,7 @@ def get_tasks_for_plan_at_station(station_id, plan_id, house_type_id, worker_spe
     return tasks
 
 
+@write_operation
 def start_task_log(module_id, task_definition_id, worker_id, station_start, house_type_panel_id=None):
     """
     Starts a task by inserting a new record into TaskLogs or updating an existing 'Paused' one.
@@ -1057,10 +1269,10 @@ def start_task_log(module_id, task_definition_id, worker_id, station_start, hous
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         # Could be foreign key violation or other constraint
-        print(f"Error starting task log (IntegrityError): {e}") # Replace with logging
+        logger.error(f"Error starting task log (IntegrityError): {e}")
         raise e # Re-raise for API layer
     except sqlite3.Error as e:
-        print(f"Error starting task log: {e}") # Replace with logging
+        logger.error(f"Error starting task log: {e}")
         return None
 
 
@@ -1072,6 +1284,7 @@ def get_module_by_plan_id(plan_id):
     return dict(row) if row else None
 
 
+@write_operation
 def create_module_from_plan(plan_id, start_station_id):
     """
     Creates a new Module record based on a ProductionPlan item,
@@ -1104,7 +1317,7 @@ def create_module_from_plan(plan_id, start_station_id):
                 (plan_id,)
             )
 
-        print(f"Created module {new_module_id} for plan {plan_id} at station {start_station_id}.") # Replace with logging
+        logger.info(f"Created module {new_module_id} for plan {plan_id} at station {start_station_id}.")
         return new_module_id
     except sqlite3.IntegrityError as e:
         # Could be a unique constraint violation if module for plan_id already exists (race condition?)
@@ -1116,6 +1329,7 @@ def create_module_from_plan(plan_id, start_station_id):
         raise e # Re-raise
 
 
+@cached_reference('Stations')
 def get_all_stations():
     """Fetches all stations for dropdowns."""
     db = get_db()
@@ -1149,10 +1363,311 @@ def get_next_planned_module():
     return dict(module_data) if module_data else None
 
 
+# Module shown at each station: the module currently there (lowest planned_sequence) or, at
+# an empty first station (sequence 1), the next Planned/Scheduled plan item. The plan item is
+# picked by COALESCE, so the next-planned lookup only runs at an empty first station;
+# +np.status keeps the planner on the planned_sequence index (the first Planned row is near
+# the start, while the status index would sort them all). Stations with nothing to show get
+# a row with NULL plan columns. completed_task_ids feeds the ready/blocked flags (see
+# _mark_readiness). {station_filter} is a WHERE condition on Stations s.
+_STATION_SUBJECT_QUERY = """
+    SELECT
+        s.station_id, s.name AS station_name, s.sequence_order AS station_sequence_order,
+        m.module_id, m.status AS module_status,
+        (SELECT group_concat(cl.task_definition_id)
+         FROM TaskLogs cl
+         WHERE cl.module_id = m.module_id AND +cl.status = 'Completed') AS completed_task_ids,
+        pp.plan_id, pp.project_id, p.name AS project_name,
+        pp.house_type_id, ht.name AS house_type_name, ht.number_of_modules,
+        pp.house_identifier, pp.module_sequence_in_house,
+        pp.planned_sequence, pp.planned_start_datetime,
+        pp.planned_assembly_line, pp.status, pp.created_at, pp.updated_at,
+        pp.tipologia_id, tip.name AS tipologia_name
+    FROM Stations s
+    LEFT JOIN ProductionPlan pp ON pp.plan_id = COALESCE(
+        (SELECT cm.plan_id
+         FROM Modules cm
+         JOIN ProductionPlan cpp ON cm.plan_id = cpp.plan_id
+         WHERE cm.current_station_id = s.station_id
+         ORDER BY cpp.planned_sequence ASC
+         LIMIT 1),
+        CASE WHEN s.sequence_order = 1 THEN (
+            SELECT np.plan_id
+            FROM ProductionPlan np
+            WHERE +np.status IN ('Planned', 'Scheduled')
+            ORDER BY np.planned_sequence ASC
+            LIMIT 1)
+        END)
+    LEFT JOIN Projects p ON pp.project_id = p.project_id
+    LEFT JOIN HouseTypes ht ON pp.house_type_id = ht.house_type_id
+    LEFT JOIN Modules m ON m.plan_id = pp.plan_id AND m.current_station_id = s.station_id
+    LEFT JOIN HouseTypeTipologias tip ON pp.tipologia_id = tip.tipologia_id
+    WHERE {station_filter}
+    ORDER BY s.sequence_order, s.station_id
+"""
+
+_OVERVIEW_TASK_COLUMNS = ('task_definition_id', 'task_name', 'task_description', 'task_status',
+                          'task_log_id', 'started_at', 'completed_at')
+_OVERVIEW_PANEL_COLUMNS = ('house_type_panel_id', 'panel_group', 'panel_code', 'typology',
+                           'multiwall_id', 'multiwall_code')
+
+def _station_subject(row):
+    """Splits a _STATION_SUBJECT_QUERY row into (module, upcoming_module), shaped like
+    get_current_module_for_station / get_next_planned_module. Both are None when the
+    station has nothing to show.
+    """
+    if row['plan_id'] is None or row['project_name'] is None or row['house_type_name'] is None:
+        return None, None
+    if row['module_id'] is not None:
+        return {
+            'module_id': row['module_id'], 'plan_id': row['plan_id'],
+            'project_id': row['project_id'], 'project_name': row['project_name'],
+            'house_type_id': row['house_type_id'], 'house_type_name': row['house_type_name'],
+            'house_identifier': row['house_identifier'],
+            'module_sequence_in_house': row['module_sequence_in_house'],
+            'number_of_modules': row['number_of_modules'],
+            'tipologia_id': row['tipologia_id'], 'tipologia_name': row['tipologia_name'],
+            'planned_sequence': row['planned_sequence'], 'module_status': row['module_status'],
+        }, None
+    upcoming = dict(row)
+    for column in ('station_id', 'station_name', 'station_sequence_order', 'module_id', 'module_status',
+                   'completed_task_ids'):
+        upcoming.pop(column)
+    return None, upcoming
+
+def _overview_task(row, upcoming_module):
+    task = {column: row[column] for column in _OVERVIEW_TASK_COLUMNS}
+    if upcoming_module is not None: # Planned module: startTask needs the plan_id
+        task['house_type_panel_id'] = None
+        task['plan_id'] = upcoming_module['plan_id']
+    return task
+
+def _mark_readiness(tasks, graph, row, subject):
+    """Sets 'ready' and 'blocked_by' (unmet prerequisite task IDs) on each task, from the
+    module's completed tasks in a _STATION_SUBJECT_QUERY row. An upcoming module has
+    completed nothing yet.
+    """
+    completed = {int(task_id) for task_id in row['completed_task_ids'].split(',')} if row['completed_task_ids'] else set()
+    for task in tasks:
+        task['ready'], task['blocked_by'] = graph.readiness(task['task_definition_id'], completed, subject['house_type_id'])
+
+def _shows_panels(station_sequence_order, subject):
+    """Panels are listed on the panel line (W1-W5, sequence 1-5)."""
+    return bool(station_sequence_order and 1 <= station_sequence_order <= 5
+                and subject['module_sequence_in_house'])
+
+def get_station_overview(station_id, worker_specialty_id):
+    """
+    Everything the station page shows, in at most two statements on one connection:
+    1. The module to show (see _STATION_SUBJECT_QUERY) and the station's sequence_order.
+    2. The tasks for that module at this station (with their log status) together with the
+       module's panels when the station is on the panel line (sequence 1-5).
+    Returns a dict with 'module', 'upcoming_module', 'tasks' and 'panels', shaped like the
+    results of get_current_module_for_station / get_next_planned_module,
+    get_tasks_for_module_at_station / get_tasks_for_plan_at_station and
+    get_panels_for_house_type_module. Each task also has 'ready' and 'blocked_by', from
+    the cached dependency graph (see task_graph.py).
+    """
+    db = get_db()
+    overview = {'module': None, 'upcoming_module': None, 'tasks': [], 'panels': []}
+    row = db.execute(_STATION_SUBJECT_QUERY.format(station_filter='s.station_id = ?'), (station_id,)).fetchone()
+    if row is None:
+        return overview
+    module, upcoming_module = _station_subject(row)
+    subject = module or upcoming_module
+    if subject is None:
+        return overview
+
+    # Tasks and panels in one round trip; row_type tells them apart
+    details_query = """
+        SELECT
+            'task' AS row_type,
+            td.task_definition_id,
+            td.name AS task_name,
+            td.description AS task_description,
+            COALESCE(tl.status, 'Not Started') AS task_status,
+            tl.task_log_id,
+            tl.started_at,
+            tl.completed_at,
+            NULL AS house_type_panel_id, NULL AS panel_group, NULL AS panel_code,
+            NULL AS typology, NULL AS multiwall_id, NULL AS multiwall_code
+        FROM TaskApplicability ta
+        JOIN TaskDefinitions td ON td.task_definition_id = ta.task_definition_id
+        -- +tl.task_definition_id: look logs up by module (a handful of rows), not by task
+        -- definition, which matches every module ever built
+        LEFT JOIN TaskLogs tl ON td.task_definition_id = +tl.task_definition_id AND tl.module_id = :module_id
+        WHERE
+            ta.station_sequence_order = :station_sequence_order
+            AND ta.house_type_id = :house_type_id
+            AND ta.specialty_key = COALESCE((SELECT specialty_id FROM Specialties WHERE specialty_id = :specialty_id), 0)
+        UNION ALL
+        SELECT
+            'panel' AS row_type,
+            NULL, NULL, NULL, NULL, NULL, NULL, NULL,
+            htp.house_type_panel_id, htp.panel_group, htp.panel_code, htp.typology,
+            htp.multiwall_id, mw.multiwall_code
+        FROM HouseTypePanels htp
+        LEFT JOIN Multiwalls mw ON htp.multiwall_id = mw.multiwall_id
+        WHERE
+            :with_panels
+            AND htp.house_type_id = :house_type_id
+            AND htp.module_sequence_number = :module_sequence_in_house
+        ORDER BY row_type, task_name, panel_group, multiwall_code, panel_code;
+    """
+    cursor = db.execute(details_query, {
+        'module_id': module['module_id'] if module else None,
+        'station_sequence_order': row['station_sequence_order'],
+        'house_type_id': subject['house_type_id'],
+        'specialty_id': worker_specialty_id,
+        'with_panels': 1 if _shows_panels(row['station_sequence_order'], subject) else 0,
+        'module_sequence_in_house': subject['module_sequence_in_house'],
+    })
+    for detail in cursor.fetchall():
+        if detail['row_type'] == 'task':
+            overview['tasks'].append(_overview_task(detail, upcoming_module))
+        else:
+            overview['panels'].append({column: detail[column] for column in _OVERVIEW_PANEL_COLUMNS})
+    _mark_readiness(overview['tasks'], get_task_graph(db), row, subject)
+    overview['module'] = module
+    overview['upcoming_module'] = upcoming_module
+    return overview
+
+def get_plant_overview(station_ids=None, worker_specialty_id=None, filter_by_specialty=False):
+    """
+    Station overviews for several stations (all of them if station_ids is None) with a fixed
+    number of set-based statements, whatever the number of stations: one for the modules
+    (see _STATION_SUBJECT_QUERY), one for all their tasks and one for the panel-line panels.
+    Tasks are filtered by worker_specialty_id like the station page only if
+    filter_by_specialty is True; otherwise tasks of every specialty are returned.
+    Returns a list ordered by station sequence; each item has 'station_id', 'station_name',
+    'sequence_order' and the keys returned by get_station_overview.
+    Raises ValueError if any requested station does not exist.
+    """
+    db = get_db()
+    if station_ids is None:
+        rows = db.execute(_STATION_SUBJECT_QUERY.format(station_filter='1')).fetchall()
+    else:
+        station_ids = list(dict.fromkeys(station_ids)) # Unique, keeping order
+        if not station_ids:
+            return []
+        placeholders = ','.join('?' * len(station_ids))
+        rows = db.execute(
+            _STATION_SUBJECT_QUERY.format(station_filter=f"s.station_id IN ({placeholders})"), station_ids
+        ).fetchall()
+        missing = set(station_ids) - {row['station_id'] for row in rows}
+        if missing:
+            raise ValueError(f"Unknown station_id(s): {', '.join(sorted(missing))}")
+
+    overviews = {}
+    subjects = {} # station_id -> (module, upcoming_module, subject, sequence_order)
+    subject_rows = {}
+    for row in rows:
+        module, upcoming_module = _station_subject(row)
+        overviews[row['station_id']] = {
+            'station_id': row['station_id'], 'station_name': row['station_name'],
+            'sequence_order': row['station_sequence_order'],
+            'module': module, 'upcoming_module': upcoming_module, 'tasks': [], 'panels': [],
+        }
+        if module or upcoming_module:
+            subjects[row['station_id']] = (module, upcoming_module, module or upcoming_module, row['station_sequence_order'])
+            subject_rows[row['station_id']] = row
+
+    if subjects:
+        # One row per station in a VALUES list, joined to the task definitions of its sequence
+        values = ', '.join(['(?, ?, ?, ?)'] * len(subjects))
+        params = []
+        for station_id, (module, _, subject, sequence_order) in subjects.items():
+            params.extend((station_id, sequence_order, module['module_id'] if module else None, subject['house_type_id']))
+        if filter_by_specialty: # One key for every station, as on the station page
+            specialty_condition = "ta.specialty_key = COALESCE((SELECT specialty_id FROM Specialties WHERE specialty_id = ?), 0)"
+            params.append(worker_specialty_id)
+        else: # Every specialty: each task once, under its own key
+            specialty_condition = "ta.specialty_key = COALESCE(td.specialty_id, 0)"
+        tasks_query = f"""
+            WITH subject(station_id, station_sequence_order, module_id, house_type_id) AS (VALUES {values})
+            SELECT
+                subj.station_id,
+                td.task_definition_id,
+                td.name AS task_name,
+                td.description AS task_description,
+                COALESCE(tl.status, 'Not Started') AS task_status,
+                tl.task_log_id,
+                tl.started_at,
+                tl.completed_at
+            FROM subject subj
+            JOIN TaskApplicability ta
+                ON ta.station_sequence_order = subj.station_sequence_order AND ta.house_type_id = subj.house_type_id
+            JOIN TaskDefinitions td ON td.task_definition_id = ta.task_definition_id
+            -- By module, as in get_station_overview
+            LEFT JOIN TaskLogs tl ON td.task_definition_id = +tl.task_definition_id AND tl.module_id = subj.module_id
+            WHERE {specialty_condition}
+            ORDER BY subj.station_id, td.name;
+        """
+        for row in db.execute(tasks_query, params).fetchall():
+            upcoming_module = subjects[row['station_id']][1]
+            overviews[row['station_id']]['tasks'].append(_overview_task(row, upcoming_module))
+        graph = get_task_graph(db)
+        for station_id, row in subject_rows.items():
+            _mark_readiness(overviews[station_id]['tasks'], graph, row, subjects[station_id][2])
+
+        panel_subjects = [(station_id, subject['house_type_id'], subject['module_sequence_in_house'])
+                          for station_id, (_, _, subject, sequence_order) in subjects.items()
+                          if _shows_panels(sequence_order, subject)]
+        if panel_subjects:
+            values = ', '.join(['(?, ?, ?)'] * len(panel_subjects))
+            panels_query = f"""
+                WITH subject(station_id, house_type_id, module_sequence_in_house) AS (VALUES {values})
+                SELECT
+                    subj.station_id,
+                    htp.house_type_panel_id, htp.panel_group, htp.panel_code, htp.typology,
+                    htp.multiwall_id, mw.multiwall_code
+                FROM subject subj
+                JOIN HouseTypePanels htp
+                    ON htp.house_type_id = subj.house_type_id AND htp.module_sequence_number = subj.module_sequence_in_house
+                LEFT JOIN Multiwalls mw ON htp.multiwall_id = mw.multiwall_id
+                ORDER BY subj.station_id, htp.panel_group, mw.multiwall_code, htp.panel_code;
+            """
+            params = [value for panel_subject in panel_subjects for value in panel_subject]
+            for row in db.execute(panels_query, params).fetchall():
+                overviews[row['station_id']]['panels'].append({column: row[column] for column in _OVERVIEW_PANEL_COLUMNS})
+
+    return list(overviews.values())
+
+def get_station_states():
+    """
+    The station, plan and task log data each station page shows, for change detection (see
+    station_events.py), in two statements: station_id -> (subject, task_logs), where subject
+    is the station's _STATION_SUBJECT_QUERY row as a tuple (module_id first) and task_logs
+    the (task_log_id, task_definition_id, panel_id, status, started_at, completed_at) of its
+    module's logs, module and panel tasks alike.
+    Two stations with equal states show the same page.
+    """
+    db = get_db()
+    rows = db.execute(_STATION_SUBJECT_QUERY.format(station_filter='1')).fetchall()
+    module_ids = [row['module_id'] for row in rows if row['module_id'] is not None]
+    logs = {}
+    if module_ids:
+        placeholders = ','.join('?' * len(module_ids))
+        for log in db.execute(f"""
+            SELECT module_id, task_log_id, task_definition_id, panel_id, status, started_at, completed_at
+            FROM TaskLogs
+            WHERE module_id IN ({placeholders})
+            ORDER BY task_log_id
+        """, module_ids):
+            logs.setdefault(log['module_id'], []).append(tuple(log)[1:])
+    return {
+        row['station_id']: ((row['module_id'],) + tuple(row), tuple(logs.get(row['module_id'], ())))
+        for row in rows
+    }
+
 # === Workers ===
 
 def get_all_workers():
     """Fetches all workers with their specialty name and supervisor name."""
+    return list(iter_workers())
+
+def iter_workers():
+    """get_all_workers as a generator reading rows as they are consumed."""
     db = get_db()
     # Use LEFT JOINs in case specialty or supervisor is NULL
     # Supervisor is now an AdminTeam member
@@ -1166,11 +1681,8 @@ def get_all_workers():
         LEFT JOIN AdminTeam atm ON w.supervisor_id = atm.admin_team_id
         ORDER BY w.last_name, w.first_name
     """
-    cursor = db.execute(query)
-    workers = cursor.fetchall()
     # Combine supervisor first and last names
-    result = []
-    for row in workers:
+    for row in db.execute(query):
         worker_dict = dict(row)
         if worker_dict['supervisor_first_name'] and worker_dict['supervisor_last_name']:
             worker_dict['supervisor_name'] = f"{worker_dict['supervisor_first_name']} {worker_dict['supervisor_last_name']}"
@@ -1179,8 +1691,7 @@ def get_all_workers():
         # Remove redundant supervisor name fields if desired
         # del worker_dict['supervisor_first_name']
         # del worker_dict['supervisor_last_name']
-        result.append(worker_dict)
-    return result
+        yield worker_dict
 
 def get_worker_by_id(worker_id):
     """Fetches a single worker by their ID, including specialty and supervisor names."""
@@ -1219,6 +1730,7 @@ def get_worker_by_pin(pin):
     row = cursor.fetchone()
     return dict(row) if row else None
 
+@write_operation
 def add_worker(first_name, last_name, pin, specialty_id, supervisor_id, is_active):
     """Adds a new worker to the database."""
     db = get_db()
@@ -1233,9 +1745,10 @@ def add_worker(first_name, last_name, pin, specialty_id, supervisor_id, is_activ
         return cursor.lastrowid
     except sqlite3.Error as e:
         # Log error or handle specific constraints (e.g., unique PIN if added)
-        print(f"Error adding worker: {e}") # Replace with proper logging
+        logger.error(f"Error adding worker: {e}")
         return None # Or raise
 
+@write_operation
 def update_worker(worker_id, first_name, last_name, pin, specialty_id, supervisor_id, is_active):
     """Updates an existing worker."""
     db = get_db()
@@ -1250,9 +1763,10 @@ def update_worker(worker_id, first_name, last_name, pin, specialty_id, superviso
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error updating worker: {e}") # Replace with proper logging
+        logger.error(f"Error updating worker: {e}")
         return False # Indicate failure
 
+@write_operation
 def delete_worker(worker_id):
     """Deletes a worker."""
     # Consider implications: What happens to supervised workers? Set supervisor_id to NULL?
@@ -1267,12 +1781,13 @@ def delete_worker(worker_id):
         return cursor.rowcount > 0
     except sqlite3.Error as e:
         # Handle potential foreign key issues if worker_id is used elsewhere (e.g., TaskLogs)
-        print(f"Error deleting worker: {e}") # Replace with proper logging
+        logger.error(f"Error deleting worker: {e}")
         return False # Indicate failure
 
 
 # === Production Plan ===
 
+@write_operation
 def add_production_plan_item(project_id, house_type_id, house_identifier, planned_sequence, planned_start_datetime, planned_assembly_line, status='Planned'):
     """Adds a single item to the production plan."""
     db = get_db()
@@ -1286,70 +1801,105 @@ def add_production_plan_item(project_id, house_type_id, house_identifier, planne
         db.commit()
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
-        print(f"Error adding production plan item (IntegrityError): {e}")
+        logger.error(f"Error adding production plan item (IntegrityError): {e}")
         raise e # Re-raise for API layer to handle (e.g., duplicate identifier)
     except sqlite3.Error as e:
-        print(f"Error adding production plan item: {e}")
+        logger.error(f"Error adding production plan item: {e}")
         return None
 
+@write_operation
 def add_bulk_production_plan_items(items_data):
-    """Adds multiple items to the production plan using executemany."""
+    """Adds multiple items to the production plan with chunked multi-row INSERTs.
+    Returns the new plan_ids, in the order of items_data, or False on a database error."""
     db = get_db()
     # items_data should be a list of tuples/lists matching the order of columns in the INSERT statement
     # e.g., [(proj_id, ht_id, identifier, module_seq, planned_seq, start_dt, line, tipologia_id, status), ...]
-    sql = """INSERT INTO ProductionPlan
-             (project_id, house_type_id, house_identifier, module_sequence_in_house, planned_sequence, planned_start_datetime, planned_assembly_line, tipologia_id, status)
-             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""" # Added tipologia_id
     try:
         with db: # Use transaction
-            db.executemany(sql, items_data)
-        return True # Indicate success (doesn't return IDs easily with executemany)
+            return _insert_plan_rows(db, [tuple(item) for item in items_data])
     except sqlite3.IntegrityError as e:
-        print(f"Error adding bulk production plan items (IntegrityError): {e}")
+        logger.error(f"Error adding bulk production plan items (IntegrityError): {e}")
         raise e # Re-raise
     except sqlite3.Error as e:
-        print(f"Error adding bulk production plan items: {e}")
+        logger.error(f"Error adding bulk production plan items: {e}")
         return False
 
-def get_production_plan(filters=None, sort_by='planned_sequence', sort_order='ASC', limit=None, offset=None):
-    """Fetches production plan items with optional filtering, sorting, and pagination."""
-    db = get_db()
-    base_query = """
-        SELECT
-            pp.plan_id, pp.project_id, p.name as project_name,
-            pp.house_type_id, ht.name as house_type_name, ht.number_of_modules,
-            pp.house_identifier, pp.module_sequence_in_house, -- Added module sequence
-            pp.planned_sequence, pp.planned_start_datetime,
-            pp.planned_assembly_line, pp.status, pp.created_at, pp.updated_at,
-            pp.tipologia_id, htt.name as tipologia_name -- Added tipologia info
-        FROM ProductionPlan pp
-        JOIN Projects p ON pp.project_id = p.project_id
-        JOIN HouseTypes ht ON pp.house_type_id = ht.house_type_id
-        LEFT JOIN HouseTypeTipologias htt ON pp.tipologia_id = htt.tipologia_id -- Join to get tipologia name
-    """
+# Columns and joins of a production plan item as returned by the plan queries
+_PLAN_ITEM_SELECT = """
+    SELECT
+        pp.plan_id, pp.project_id, p.name as project_name,
+        pp.house_type_id, ht.name as house_type_name, ht.number_of_modules,
+        pp.house_identifier, pp.module_sequence_in_house, -- Added module sequence
+        pp.planned_sequence, pp.planned_start_datetime,
+        pp.planned_assembly_line, pp.status, pp.created_at, pp.updated_at,
+        pp.tipologia_id, htt.name as tipologia_name -- Added tipologia info
+    FROM ProductionPlan pp {index_hint}
+    JOIN Projects p ON pp.project_id = p.project_id
+    JOIN HouseTypes ht ON pp.house_type_id = ht.house_type_id
+    LEFT JOIN HouseTypeTipologias htt ON pp.tipologia_id = htt.tipologia_id -- Join to get tipologia name
+"""
+
+# Status condition of the upcoming plan, written exactly as in the WHERE clause of
+# idx_productionplan_upcoming: SQLite only uses a partial index when the query repeats it.
+# Without statistics the planner prefers idx_productionplan_status and sorts, so pages
+# of the upcoming plan name the partial index explicitly, when the database has it
+# (INDEXED BY fails the statement if the index is missing).
+UPCOMING_STATUSES = ('Planned', 'Scheduled')
+UPCOMING_STATUS_SQL = "pp.status IN ('Planned', 'Scheduled')"
+UPCOMING_INDEX = 'idx_productionplan_upcoming'
+
+def _index_exists(db, name):
+    return db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is not None
+
+# Keyset pages of the plan: default and maximum page size
+PLAN_PAGE_SIZE = 100
+PLAN_PAGE_MAX = 1000
+
+def _production_plan_filters(filters):
+    """WHERE clauses and parameters for get_production_plan's filters."""
     where_clauses = []
     params = []
-
-    if filters:
-        if filters.get('project_id'):
-            where_clauses.append("pp.project_id = ?")
-            params.append(filters['project_id'])
-        if filters.get('house_type_id'):
-            where_clauses.append("pp.house_type_id = ?")
-            params.append(filters['house_type_id'])
-        if filters.get('status'):
-            # Handle multiple statuses if needed (e.g., status='Planned,Scheduled')
-            statuses = filters['status'].split(',')
+    if not filters:
+        return where_clauses, params
+
+    if filters.get('project_id'):
+        where_clauses.append("pp.project_id = ?")
+        params.append(filters['project_id'])
+    if filters.get('house_type_id'):
+        where_clauses.append("pp.house_type_id = ?")
+        params.append(filters['house_type_id'])
+    if filters.get('status'):
+        # Handle multiple statuses if needed (e.g., status='Planned,Scheduled')
+        statuses = filters['status'].split(',')
+        if sorted(statuses) == sorted(UPCOMING_STATUSES):
+            where_clauses.append(UPCOMING_STATUS_SQL) # Literal, so the partial index applies
+        else:
             placeholders = ','.join('?' * len(statuses))
             where_clauses.append(f"pp.status IN ({placeholders})")
             params.extend(statuses)
-        if filters.get('start_date_after'): # Example filter
-            where_clauses.append("pp.planned_start_datetime >= ?")
-            params.append(filters['start_date_after'])
-        if filters.get('tipologia_id'):
-            where_clauses.append("pp.tipologia_id = ?")
-            params.append(filters['tipologia_id'])
-        # Add more filters as needed
+    if filters.get('start_date_after'): # Example filter
+        where_clauses.append("pp.planned_start_datetime >= ?")
+        params.append(filters['start_date_after'])
+    if filters.get('tipologia_id'):
+        where_clauses.append("pp.tipologia_id = ?")
+        params.append(filters['tipologia_id'])
+    # Add more filters as needed
+    return where_clauses, params
+
+def get_production_plan(filters=None, sort_by='planned_sequence', sort_order='ASC', limit=None, offset=None):
+    """Fetches production plan items with optional filtering, sorting, and pagination.
+    Deep OFFSET pages rescan every earlier row; get_production_plan_page pages in plan
+    order at a constant cost per page.
+    """
+    return list(iter_production_plan(filters, sort_by, sort_order, limit, offset))
+
+def iter_production_plan(filters=None, sort_by='planned_sequence', sort_order='ASC', limit=None, offset=None):
+    """get_production_plan as a generator: rows are read from the cursor as they are
+    consumed (e.g. by a streamed response) instead of all at once.
+    """
+    db = get_db()
+    base_query = _PLAN_ITEM_SELECT.format(index_hint='')
+    where_clauses, params = _production_plan_filters(filters)
 
     if where_clauses:
         base_query += " WHERE " + " AND ".join(where_clauses)
@@ -1370,8 +1920,55 @@ def get_production_plan(filters=None, sort_by='planned_sequence', sort_order='AS
             base_query += " OFFSET ?"
             params.append(offset)
 
-    cursor = db.execute(base_query, params)
-    return [dict(row) for row in cursor.fetchall()]
+    for row in db.execute(base_query, params):
+        yield dict(row)
+
+def count_production_plan(filters=None):
+    """Number of production plan items matching get_production_plan's filters."""
+    db = get_db()
+    where_clauses, params = _production_plan_filters(filters)
+    query = "SELECT COUNT(*) FROM ProductionPlan pp"
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    return db.execute(query, params).fetchone()[0]
+
+def get_production_plan_page(filters=None, limit=PLAN_PAGE_SIZE, cursor=None, include_total=True):
+    """
+    One page of production plan items in plan order, (planned_sequence, plan_id).
+    `cursor` is the next_cursor of the previous page (None for the first page): the
+    page continues after that item through the planned_sequence index, so it costs
+    the same at any depth. Returns {'items', 'next_cursor' (None on the last page),
+    'total' (items matching the filters; None unless include_total)}.
+    Raises ValueError for a malformed cursor.
+    """
+    db = get_db()
+    limit = max(1, min(int(limit), PLAN_PAGE_MAX))
+    where_clauses, params = _production_plan_filters(filters)
+    page_clauses, page_params = list(where_clauses), list(params)
+    if cursor:
+        after_sequence, after_plan_id = decode_cursor(cursor, 2)
+        # The first term bounds the index range; the second skips ties already returned
+        page_clauses.append("pp.planned_sequence >= ? AND (pp.planned_sequence > ? OR pp.plan_id > ?)")
+        page_params += [after_sequence, after_sequence, after_plan_id]
+
+    index_hint = ''
+    if UPCOMING_STATUS_SQL in where_clauses and _index_exists(db, UPCOMING_INDEX):
+        index_hint = f"INDEXED BY {UPCOMING_INDEX}"
+    query = _PLAN_ITEM_SELECT.format(index_hint=index_hint)
+    if page_clauses:
+        query += " WHERE " + " AND ".join(page_clauses)
+    query += " ORDER BY pp.planned_sequence, pp.plan_id LIMIT ?"
+    rows = db.execute(query, page_params + [limit + 1]).fetchall() # One extra row tells whether there is a next page
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]['planned_sequence'], items[-1]['plan_id'])
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'total': count_production_plan(filters) if include_total else None,
+    }
 
 def get_production_plan_item_by_id(plan_id):
     """Fetches a single production plan item by its ID."""
@@ -1394,6 +1991,7 @@ def get_production_plan_item_by_id(plan_id):
     row = cursor.fetchone()
     return dict(row) if row else None
 
+@write_operation
 def update_production_plan_item(plan_id, updates):
     """Updates specific fields of a production plan item."""
     db = get_db()
@@ -1420,12 +2018,13 @@ def update_production_plan_item(plan_id, updates):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.IntegrityError as e:
-        print(f"Error updating production plan item (IntegrityError): {e}")
+        logger.error(f"Error updating production plan item (IntegrityError): {e}")
         raise e
     except sqlite3.Error as e:
-        print(f"Error updating production plan item: {e}")
+        logger.error(f"Error updating production plan item: {e}")
         return False
 
+@write_operation
 def delete_production_plan_item(plan_id):
     """Deletes a production plan item."""
     db = get_db()
@@ -1436,46 +2035,108 @@ def delete_production_plan_item(plan_id):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting production plan item: {e}")
+        logger.error(f"Error deleting production plan item: {e}")
         return False
 
+@write_operation
 def update_production_plan_sequence(ordered_plan_ids):
     """
     Updates the planned_sequence for a list of production plan items based on
-    the exact order provided in the list. Assigns sequence numbers 1, 2, 3, ...
-    to the items in the list according to their position.
+    the exact order provided in the list. Assigns keys SEQUENCE_GAP, 2 * SEQUENCE_GAP, ...
+    to the items in the list according to their position; rows that already have their
+    key are not written.
     Assumes ordered_plan_ids contains ALL items that should be sequenced contiguously.
+    Moving a few items is cheaper with move_production_plan_items.
     """
     db = get_db()
     if not ordered_plan_ids:
-        print("No plan IDs provided for reordering.")
+        logger.info("No plan IDs provided for reordering.")
         return True # Nothing to reorder
 
     try:
         with db: # Use transaction
-            # Update sequence for each item based on its index in the list (0-based index + 1 for 1-based sequence)
-            for i, plan_id in enumerate(ordered_plan_ids):
-                new_sequence = i + 1
-                cursor = db.execute(
-                    "UPDATE ProductionPlan SET planned_sequence = ? WHERE plan_id = ?",
-                    (new_sequence, plan_id)
-                )
-                if cursor.rowcount == 0:
-                    # This indicates a potential problem - a plan_id sent from frontend doesn't exist?
-                    # Or maybe it was filtered out (e.g., status changed)?
-                    # For robustness, log this but continue. Consider raising an error if strict consistency is needed.
-                    print(f"Warning: plan_id {plan_id} not found during sequence update.") # Replace with logging
-
-        print(f"Successfully reordered {len(ordered_plan_ids)} plan items.") # Replace with logging
+            cursor = db.executemany(
+                "UPDATE ProductionPlan SET planned_sequence = ? WHERE plan_id = ? AND planned_sequence <> ?",
+                [((i + 1) * SEQUENCE_GAP, plan_id, (i + 1) * SEQUENCE_GAP) for i, plan_id in enumerate(ordered_plan_ids)]
+            )
+        logger.info(f"Successfully reordered {len(ordered_plan_ids)} plan items ({cursor.rowcount} rows changed).")
         return True
     except sqlite3.Error as e:
-        print(f"Error updating production plan sequence: {e}") # Replace with logging
+        logger.error(f"Error updating production plan sequence: {e}")
         # Transaction ensures rollback on error
         return False
 
+@write_operation
+def move_production_plan_items(plan_ids, anchor_plan_id, position):
+    """
+    Moves plan items, in the given order, just before or after the anchor item
+    (position 'before' or 'after'). Only the moved rows get new planned_sequence keys,
+    picked inside the gap between the anchor and its neighbour (see plan_sequence.py).
+    If the gap is too narrow, the rows following it are respaced too, in a window that
+    doubles until there is room; maintenance rebalances the plan before that gets large.
+    Returns the changed keys as a list of {'plan_id', 'planned_sequence'}.
+    Raises ValueError if a plan item does not exist, or for an invalid move.
+    """
+    if position not in ('before', 'after'):
+        raise ValueError(f"Invalid position '{position}'. Must be 'before' or 'after'")
+    if not plan_ids or anchor_plan_id in plan_ids:
+        raise ValueError("Items must be moved relative to another item")
+    db = get_db()
+    plan_ids = list(dict.fromkeys(plan_ids))
+    ids = plan_ids + [anchor_plan_id]
+    placeholders = ','.join('?' * len(ids))
+    keys = dict(db.execute(
+        f"SELECT plan_id, planned_sequence FROM ProductionPlan WHERE plan_id IN ({placeholders})", ids
+    ).fetchall())
+    missing = [plan_id for plan_id in ids if plan_id not in keys]
+    if missing:
+        raise ValueError(f"Unknown plan_id(s): {', '.join(map(str, missing))}")
+
+    moved = ','.join('?' * len(plan_ids))
+    anchor = (keys[anchor_plan_id], anchor_plan_id)
+    if position == 'before':
+        # Insert between the anchor's predecessor (other than the moved items) and the anchor
+        prev = db.execute(f"""
+            SELECT planned_sequence FROM ProductionPlan
+            WHERE (planned_sequence, plan_id) < (?, ?) AND plan_id NOT IN ({moved})
+            ORDER BY planned_sequence DESC, plan_id DESC LIMIT 1
+        """, [*anchor, *plan_ids]).fetchone()
+        lo = prev[0] if prev else None
+        following = "(planned_sequence, plan_id) >= (?, ?)"
+    else:
+        lo = anchor[0]
+        following = "(planned_sequence, plan_id) > (?, ?)"
+
+    window = 0 # Following rows respaced along with the moved ones
+    while True:
+        rows = db.execute(f"""
+            SELECT plan_id, planned_sequence FROM ProductionPlan
+            WHERE {following} AND plan_id NOT IN ({moved})
+            ORDER BY planned_sequence, plan_id LIMIT ?
+        """, [*anchor, *plan_ids, window + 1]).fetchall()
+        hi = rows[window]['planned_sequence'] if len(rows) > window else None
+        if hi is None or lo is None or hi - lo > len(plan_ids) + window:
+            break
+        window = window * 2 or len(plan_ids)
+
+    keys.update((row['plan_id'], row['planned_sequence']) for row in rows)
+    reordered = plan_ids + [row['plan_id'] for row in rows[:window]]
+    new_keys = spaced_keys(lo, hi, len(reordered))
+    updates = [(key, plan_id) for key, plan_id in zip(new_keys, reordered) if keys.get(plan_id) != key]
+    db.executemany("UPDATE ProductionPlan SET planned_sequence = ? WHERE plan_id = ?", updates)
+    db.commit()
+    if window:
+        logger.info(f"Moving {len(plan_ids)} plan items respaced {window} following items")
+    return [{'plan_id': plan_id, 'planned_sequence': key} for key, plan_id in updates]
 
-def get_station_status_and_upcoming(upcoming_count=5):
-    """Fetches current module at each station and the next N planned items."""
+
+# Upcoming items returned with the station status (the dashboard loads more on demand)
+UPCOMING_WINDOW = 200
+
+def get_station_status_and_upcoming(upcoming_limit=UPCOMING_WINDOW, upcoming_cursor=None):
+    """Fetches current module at each station and a window of the upcoming planned items
+    in plan order, with the cursor of the next window and the number of upcoming items.
+    """
     db = get_db()
 
     # 1. Get current station occupancy
@@ -1498,29 +2159,15 @@ def get_station_status_and_upcoming(upcoming_count=5):
     station_cursor = db.execute(station_query)
     station_status = [dict(row) for row in station_cursor.fetchall()]
 
-    # 2. Get next N upcoming planned items (status 'Planned' or 'Scheduled')
-    upcoming_query = """
-        SELECT
-            pp.plan_id, pp.project_id, p.name as project_name,
-            pp.house_type_id, ht.name as house_type_name, ht.number_of_modules,
-            pp.house_identifier, pp.module_sequence_in_house, -- Added module sequence
-            pp.planned_sequence, pp.planned_start_datetime,
-            pp.planned_assembly_line, pp.status,
-            pp.tipologia_id, htt.name as tipologia_name -- Added tipologia info
-        FROM ProductionPlan pp
-        JOIN Projects p ON pp.project_id = p.project_id
-        JOIN HouseTypes ht ON pp.house_type_id = ht.house_type_id
-        LEFT JOIN HouseTypeTipologias htt ON pp.tipologia_id = htt.tipologia_id -- Join to get tipologia name
-        WHERE pp.status IN ('Planned', 'Scheduled')
-        ORDER BY pp.planned_sequence ASC, pp.planned_start_datetime ASC -- Sort strictly by sequence, then start time
-        -- Removed LIMIT clause to fetch all items
-    """
-    upcoming_cursor = db.execute(upcoming_query) # Removed upcoming_count parameter
-    upcoming_items = [dict(row) for row in upcoming_cursor.fetchall()]
+    # 2. Get the first window of upcoming planned items (status 'Planned' or 'Scheduled');
+    # the rest is paged with get_production_plan_page and the returned cursor
+    upcoming = get_production_plan_page({'status': ','.join(UPCOMING_STATUSES)}, limit=upcoming_limit, cursor=upcoming_cursor)
 
     return {
         'station_status': station_status,
-        'upcoming_items': upcoming_items
+        'upcoming_items': upcoming['items'],
+        'upcoming_next_cursor': upcoming['next_cursor'],
+        'upcoming_total': upcoming['total'],
     }
 
 
@@ -1528,6 +2175,7 @@ def get_station_status_and_upcoming(upcoming_count=5):
 
 # get_all_house_types is defined above in the helpers section
 
+@write_operation
 def add_house_type(name, description, number_of_modules):
     """Adds a new house type."""
     db = get_db()
@@ -1541,6 +2189,7 @@ def add_house_type(name, description, number_of_modules):
     except sqlite3.IntegrityError:
         return None # Duplicate name
 
+@write_operation
 def update_house_type(house_type_id, name, description, number_of_modules):
     """Updates an existing house type."""
     db = get_db()
@@ -1551,6 +2200,7 @@ def update_house_type(house_type_id, name, description, number_of_modules):
     db.commit()
     return cursor.rowcount > 0
 
+@write_operation
 def delete_house_type(house_type_id):
     """Deletes a house type."""
     db = get_db()
@@ -1565,6 +2215,7 @@ def delete_house_type(house_type_id):
 
 # === House Type Tipologias ===
 
+@cached_reference('HouseTypeTipologias')
 def get_tipologias_for_house_type(house_type_id):
     """Fetches all tipologias for a specific house type."""
     db = get_db()
@@ -1584,6 +2235,7 @@ def get_tipologia_by_id(tipologia_id):
     row = cursor.fetchone()
     return dict(row) if row else None
 
+@write_operation
 def add_tipologia_to_house_type(house_type_id, name, description):
     """Adds a new tipologia to a house type."""
     db = get_db()
@@ -1596,9 +2248,10 @@ def add_tipologia_to_house_type(house_type_id, name, description):
         return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         # Handle unique constraint (house_type_id, name)
-        print(f"Error adding tipologia (IntegrityError): {e}")
+        logger.error(f"Error adding tipologia (IntegrityError): {e}")
         raise e # Re-raise for API layer
 
+@write_operation
 def update_tipologia(tipologia_id, name, description):
     """Updates an existing tipologia."""
     db = get_db()
@@ -1610,9 +2263,10 @@ def update_tipologia(tipologia_id, name, description):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.IntegrityError as e:
-        print(f"Error updating tipologia (IntegrityError): {e}")
+        logger.error(f"Error updating tipologia (IntegrityError): {e}")
         raise e # Re-raise
 
+@write_operation
 def delete_tipologia(tipologia_id):
     """Deletes a tipologia. Associated parameters with this specific tipologia_id will be deleted by CASCADE."""
     db = get_db()
@@ -1622,18 +2276,20 @@ def delete_tipologia(tipologia_id):
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting tipologia: {e}")
+        logger.error(f"Error deleting tipologia: {e}")
         return False
 
 
 # === House Parameters ===
 
+@cached_reference('HouseParameters')
 def get_all_house_parameters():
     """Fetches all house parameters."""
     db = get_db()
     cursor = db.execute("SELECT parameter_id, name, unit FROM HouseParameters ORDER BY name")
     return [dict(row) for row in cursor.fetchall()]
 
+@write_operation
 def add_house_parameter(name, unit):
     """Adds a new house parameter definition."""
     db = get_db()
@@ -1644,6 +2300,7 @@ def add_house_parameter(name, unit):
     except sqlite3.IntegrityError:
         return None # Duplicate name
 
+@write_operation
 def update_house_parameter(parameter_id, name, unit):
     """Updates an existing house parameter definition."""
     db = get_db()
@@ -1651,6 +2308,7 @@ def update_house_parameter(parameter_id, name, unit):
     db.commit()
     return cursor.rowcount > 0
 
+@write_operation
 def delete_house_parameter(parameter_id):
     """Deletes a house parameter definition."""
     db = get_db()
@@ -1679,6 +2337,7 @@ def get_parameters_for_house_type(house_type_id):
     cursor = db.execute(query, (house_type_id,))
     return [dict(row) for row in cursor.fetchall()]
 
+@write_operation
 def add_or_update_house_type_parameter(house_type_id, parameter_id, module_sequence_number, value, tipologia_id=None):
     """Adds or updates the value for a parameter for a specific module and tipologia within a house type."""
     db = get_db()
@@ -1696,9 +2355,10 @@ def add_or_update_house_type_parameter(house_type_id, parameter_id, module_seque
         # For simplicity, return True on success
         return True
     except sqlite3.Error as e:
-        print(f"Error adding/updating house type parameter: {e}") # Replace with logging
+        logger.error(f"Error adding/updating house type parameter: {e}")
         return False
 
+@write_operation
 def delete_house_type_parameter(house_type_parameter_id):
     """Removes a specific parameter link from a house type by its own ID."""
     db = get_db()
@@ -1706,6 +2366,7 @@ def delete_house_type_parameter(house_type_parameter_id):
     db.commit()
     return cursor.rowcount > 0
 
+@write_operation
 def delete_parameter_from_house_type_module(house_type_id, parameter_id, module_sequence_number, tipologia_id=None):
     """Removes a parameter link by house_type_id, parameter_id, module sequence, and optionally tipologia_id."""
     db = get_db()
@@ -1727,5 +2388,5 @@ def delete_parameter_from_house_type_module(house_type_id, parameter_id, module_
         db.commit()
         return cursor.rowcount > 0
     except sqlite3.Error as e:
-        print(f"Error deleting house type parameter: {e}") # Replace with logging
+        logger.error(f"Error deleting house type parameter: {e}")
         return False
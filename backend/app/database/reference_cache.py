@@ -0,0 +1,107 @@
+"""In-process cache of reference data: stations, specialties, house types,
+tipologias, parameters and panels.
+
+These catalogs change a few times a week but are read on almost every page.
+Query functions decorated with @cached_reference(tables...) keep their
+result per process. Each entry remembers the generation of the tables it was
+read from. The generations live in TableGenerations and are bumped by
+triggers on every row change (migration 8 installs them on
+migrations.REFERENCE_TABLES). A lookup reads the current generation of its
+tables, a primary-key read, and serves the cached value while it has not
+moved. A change committed by any worker process, the writer thread or a CLI
+command therefore invalidates the entry everywhere on the next lookup, and
+nothing has to be notified.
+
+PRAGMA data_version was considered and not used. It is kept per connection,
+so every pooled connection would need its own snapshot, and it moves on any
+commit, so each task log written would empty the catalog cache.
+
+Entries are kept pickled and every hit unpickles a fresh copy, so callers
+may modify what they get. Calls inside a transaction (e.g. on the writer
+thread) bypass the cache, as do functions whose tables are not all tracked
+in TableGenerations (e.g. before the migration). Hit/miss counts per
+function are in reference_cache.stats() (/api/admin/database/cache-stats).
+"""
+import functools
+import pickle
+import threading
+
+from flask import current_app
+
+from . import writer as db_writer
+from .connection import get_db
+from .migrations import tables_generation
+
+
+class ReferenceCache:
+    """Cached results per (database, function, arguments), tagged with a table generation."""
+
+    def __init__(self):
+        self._entries = {} # (DATABASE_URI, name, args) -> (generation, pickled value)
+        self._stats = {} # name -> {'hits', 'misses', 'uncached'}
+        self._lock = threading.Lock()
+
+    def get(self, name, tables, args, load):
+        db = get_db()
+        if db.in_transaction: # Uncommitted changes could be cached under a generation that is rolled back
+            self._count(name, 'uncached')
+            return load()
+        generation = tables_generation(db, tables)
+        if generation is None: # No triggers to tell us about changes
+            self._count(name, 'uncached')
+            return load()
+
+        key = (current_app.config['DATABASE_URI'], name, args)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation:
+            self._count(name, 'hits')
+            return pickle.loads(entry[1]) # A fresh copy, several times faster than copying dicts in Python
+        # Generation read first: a change committed while loading makes the entry stale, never wrong
+        value = load()
+        self._entries[key] = (generation, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self._count(name, 'misses')
+        return value
+
+    def _count(self, name, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(name, {'hits': 0, 'misses': 0, 'uncached': 0})
+            counts[outcome] += 1
+
+    def stats(self):
+        """Lookups per cached function, with their hit rate, and the number of entries held."""
+        with self._lock:
+            functions = {}
+            for name, counts in sorted(self._stats.items()):
+                lookups = sum(counts.values())
+                functions[name] = dict(counts, hit_rate=round(counts['hits'] / lookups, 4) if lookups else None)
+        hits = sum(counts['hits'] for counts in functions.values())
+        lookups = sum(counts['hits'] + counts['misses'] + counts['uncached'] for counts in functions.values())
+        return {
+            'entries': len(self._entries),
+            'lookups': lookups,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'functions': functions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def cached_reference(*tables):
+    """Decorator for query functions that only read `tables` (from migrations.REFERENCE_TABLES).
+    Arguments must be hashable. Disabled with DATABASE_REFERENCE_CACHE = False.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            if db_writer.current_connection() is not None or not current_app.config.get('DATABASE_REFERENCE_CACHE', True):
+                return fn(*args) # Writer thread: inside a write transaction, and no app context
+            return reference_cache.get(fn.__name__, tables, args, lambda: fn(*args))
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
@@ -0,0 +1,221 @@
+"""Slow-query log with EXPLAIN QUERY PLAN capture.
+
+Instrumented cursors (see instrumentation.py) report every statement that
+takes at least `threshold_ms`. The statement is explained on the same
+connection, with the parameters it actually ran with, so the plan shows
+what the planner really did (e.g. a SCAN caused by an `OR ... IS NULL`
+predicate). Plans are cached per fingerprint for `plan_ttl` seconds, so a
+burst of the same slow query is explained once.
+
+Each record is kept in an in-memory ring buffer and appended as one JSON
+line to the log file, shared by all workers. Bound parameters are recorded
+as their type and length only (they include worker and admin PINs) unless
+log_params is enabled. The route is included: the
+Flask request, or for writes on the writer thread, the request that
+submitted them.
+"""
+import collections
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Statements that can be explained; PRAGMA, BEGIN/COMMIT, DDL etc. are logged without a plan
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_local = threading.local()
+
+
+def current_route():
+    """'METHOD /rule' of the request this statement runs for, if known."""
+    route = getattr(_local, 'route', None)
+    if route is not None:
+        return route
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        return f"{request.method} {rule}"
+    return None
+
+def with_route(fn, route):
+    """Wraps fn so statements it runs on another thread (the writer) are
+    attributed to `route`.
+    """
+    if route is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'route', None)
+        _local.route = route
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.route = previous
+    return wrapper
+
+def format_plan(rows):
+    """Turns EXPLAIN QUERY PLAN rows (id, parent, notused, detail) into indented lines."""
+    depth = {0: -1}
+    lines = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[3]
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+def full_scans(plan):
+    """Tables read with a full scan (no index) according to a formatted plan."""
+    scans = []
+    for line in plan:
+        detail = line.strip()
+        if detail.startswith('SCAN ') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail:
+            scans.append(detail[len('SCAN '):].split(' ')[0])
+    return scans
+
+
+class SlowQueryLog:
+    """Collects slow statements. Disabled until configure() sets a threshold."""
+
+    def __init__(self):
+        self.threshold_ms = 0.0
+        self.log_params = False
+        self.plan_ttl = 60.0
+        self._recent = collections.deque(maxlen=200)
+        self._plans = {} # fingerprint -> (captured at, plan)
+        self._lock = threading.Lock()
+        self._file_logger = None
+        self.path = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def configure(self, threshold_ms, path=None, log_params=False, plan_ttl=60.0, max_bytes=5_000_000, backup_count=3):
+        self.threshold_ms = float(threshold_ms or 0)
+        self.log_params = log_params
+        self.plan_ttl = plan_ttl
+        if path and path != self.path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            file_logger = logging.getLogger(f"{__name__}.file")
+            file_logger.handlers = [handler]
+            file_logger.setLevel(logging.INFO)
+            file_logger.propagate = False # Only JSON lines in this file, not in the app log
+            self._file_logger = file_logger
+        self.path = path
+
+    def capture(self, conn, sql, parameters, duration, rows, caller, statement_fingerprint):
+        """Records one slow execution. Never raises: logging must not break the query."""
+        try:
+            plan = self._plan(conn, sql, parameters, statement_fingerprint)
+            record = {
+                'ts': datetime.now().isoformat(timespec='milliseconds'),
+                'duration_ms': round(duration * 1000, 3),
+                'threshold_ms': self.threshold_ms,
+                'route': current_route(),
+                'caller': caller,
+                'rows': rows,
+                'fingerprint': statement_fingerprint,
+                'statement': ' '.join(sql.split()),
+                'params': self._params(parameters),
+                'plan': plan,
+                'full_scans': full_scans(plan) if plan else [],
+                'pid': os.getpid(),
+            }
+            with self._lock:
+                self._recent.append(record)
+            logger.warning(
+                f"Slow query ({record['duration_ms']:.1f} ms, {record['route'] or 'no request'}, {caller}): "
+                f"{statement_fingerprint[:200]}" + (f" [full scan: {', '.join(record['full_scans'])}]" if record['full_scans'] else '')
+            )
+            if self._file_logger is not None:
+                self._file_logger.info(json.dumps(record, default=str, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"Could not record slow query: {e}")
+
+    def recent(self, limit=50):
+        """Most recent slow queries, newest first: from the shared log file if
+        there is one (all workers), otherwise from this process's buffer.
+        """
+        if self.path and os.path.exists(self.path):
+            return [json.loads(line) for line in reversed(_tail_lines(self.path, limit))]
+        with self._lock:
+            return list(reversed(self._recent))[:limit]
+
+    def _plan(self, conn, sql, parameters, statement_fingerprint):
+        if parameters is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None # executemany / non-DML: nothing meaningful to explain
+        now = time.monotonic()
+        with self._lock:
+            cached = self._plans.get(statement_fingerprint)
+        if cached is not None and now - cached[0] < self.plan_ttl:
+            return cached[1]
+        # Plain sqlite3 cursor: the EXPLAIN itself is not timed or logged
+        cursor = sqlite3.Connection.cursor(conn)
+        try:
+            plan = format_plan(cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall())
+        finally:
+            cursor.close()
+        with self._lock:
+            self._plans[statement_fingerprint] = (now, plan)
+        return plan
+
+    def _params(self, parameters):
+        if parameters is None:
+            return None
+        def short(value):
+            text = repr(value)
+            return text if len(text) <= 200 else text[:200] + '...'
+        def redacted(value): # Enough to tell a NULL or a 10 kB blob apart, nothing of the value itself
+            if isinstance(value, (str, bytes)):
+                return f"<{type(value).__name__} len={len(value)}>"
+            return f"<{type(value).__name__}>"
+        if not self.log_params:
+            short = redacted
+        if isinstance(parameters, dict):
+            return {key: short(value) for key, value in parameters.items()}
+        return [short(value) for value in parameters]
+
+
+def _tail_lines(path, limit, block_size=65536):
+    """Last `limit` non-empty lines of a file, read backwards in blocks."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        while end > 0 and data.count(b'\n') <= limit:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    lines = [line for line in data.decode('utf-8', errors='replace').splitlines() if line.strip()]
+    return lines[-limit:]
+
+
+# Slow-query log for this process; configured by init_app
+slow_query_log = SlowQueryLog()
+
+
+def init_app(app):
+    """Configures the slow-query log from DATABASE_SLOW_QUERY_* settings."""
+    path = app.config.get('DATABASE_SLOW_QUERY_LOG')
+    if path is None: # Default: next to the database file
+        db_path = app.config['DATABASE_URI'].replace('sqlite:///', '')
+        path = os.path.join(os.path.dirname(db_path), 'slow_queries.jsonl')
+    slow_query_log.configure(
+        app.config.get('DATABASE_SLOW_QUERY_MS', 0),
+        path=path or None,
+        log_params=app.config.get('DATABASE_SLOW_QUERY_LOG_PARAMS', False)
+    )
@@ -0,0 +1,45 @@
+"""One-time database initialization shared by all worker processes.
+
+Every gunicorn worker calls initialize_database() from create_app. Workers
+that find the schema current (one PRAGMA user_version read) go straight to
+serving. Otherwise the migration runs under an exclusive lock on
+`<database>.init.lock`: the first worker migrates, the others block on the
+lock and then see the database already at the latest version. Without flock
+(Windows), migrate() still serializes each step on the SQLite write lock.
+"""
+import logging
+import os
+import time
+from . import migrations
+from .connection import get_db, get_db_path, migrate_db
+from .locks import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+def initialize_database():
+    """Makes sure the database exists and is at the latest schema version.
+    Must be called inside an app context. Returns a dict of timings (ms)
+    and what was done, which is also logged.
+    """
+    start = time.monotonic()
+    db_path = get_db_path()
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    report = {'pid': os.getpid(), 'action': 'current', 'lock_wait_ms': 0.0, 'migrations': []}
+    if migrations.needs_migration(get_db()):
+        with FileLock(db_path + '.init.lock') as lock:
+            report['lock_wait_ms'] = round(lock.wait_time * 1000, 3)
+            # Another worker may have finished the migration while we waited
+            report['migrations'] = migrate_db()
+        report['action'] = 'migrated' if report['migrations'] else 'migrated-by-other-worker'
+    report['schema_version'] = migrations.get_version(get_db())
+    report['total_ms'] = round((time.monotonic() - start) * 1000, 3)
+
+    logger.info(
+        f"Database startup check (pid {report['pid']}): {report['action']}, schema version "
+        f"{report['schema_version']}, {report['total_ms']} ms (lock wait {report['lock_wait_ms']} ms)"
+    )
+    return report
@@ -0,0 +1,223 @@
+"""Per-station change notifications for the station tablets, as Server-Sent Events
+(GET /api/admin/station_overview/<station_id>/events).
+
+Each process has one StationWatcher, a ChangeWatcher (see watcher.py) over
+STATION_TABLES. When their generation moves it reads every station's state
+with queries.get_station_states() (two statements, whatever the number of
+stations) and compares it with the previous one; each station whose state
+changed gets one `station` event, published on the process's Hub (see
+pubsub.py) under the station's ID. A tablet subscribes to its own station
+only, so a task finished at W3 wakes the W3 tablets and nobody else.
+
+Events are notifications, not payloads: the station page shows tasks filtered
+by the worker's specialty, so on an event the tablet refetches
+/station_overview/<station_id> as it does on load. The event data says why:
+- module_arrived: a different module is now at the station (or is next, at
+  the first station);
+- module_left: the station has nothing to show any more;
+- tasks_changed: a task of the station's module, or of one of its panels, was
+  started, paused, resumed or completed;
+- module_updated: anything else about the module (plan item, project, house
+  type, tipologia);
+- missed: sent on subscribing when the client's Last-Event-ID is older than
+  the station's last change, or unknown to this process;
+- resync: the subscriber fell behind and lost events.
+
+Only STATION_TABLES are watched, the tables get_station_states() reads. Edits
+to the task catalog (task definitions and dependencies) do not send events;
+tablets see them on their next refetch.
+
+Event IDs are generations, the same in every process, so a reconnecting
+EventSource (which sends Last-Event-ID by itself) learns whether it missed
+anything whichever worker it lands on. As with the status feed, every
+subscriber keeps a response thread busy; STATION_EVENTS_MAX_SUBSCRIBERS and
+the stream slots shared with the status feed (see pubsub.StreamSlots) cap them
+per process, above either the route answers 503 and the tablet keeps polling.
+"""
+import json
+import os
+import threading
+
+from flask import current_app
+
+from . import queries
+from .connection import get_db_path
+from .migrations import TASK_LOG_TABLES
+from .pubsub import HEARTBEAT, Hub, StreamSlots, format_event, stream_slots
+from .watcher import ChangeWatcher
+
+# Tables read by get_station_states: the station's module and plan item, and the module's
+# task logs (panel tasks are TaskLogs rows with a panel_id)
+STATION_TABLES = (
+    'Stations', 'Modules', 'HouseTypes', 'Projects', 'ProductionPlan', 'HouseTypeTipologias',
+) + TASK_LOG_TABLES
+
+# One watcher per (process, database path), like the connection pools
+_watchers = {}
+_lock = threading.Lock()
+
+
+class EventsUnavailable(RuntimeError):
+    """Raised when a subscriber cannot be served (too many subscribers, or no state yet)."""
+
+
+def change_reason(old, new):
+    """Why a station's get_station_states() entry went from `old` to `new` (see the module
+    docstring), or None if it did not change.
+    """
+    if old == new:
+        return None
+    old_module_id = old[0][0] if old else None
+    new_module_id = new[0][0]
+    if new_module_id != old_module_id:
+        return 'module_arrived' if new_module_id is not None else 'module_left'
+    if new_module_id is not None and old[1] != new[1]:
+        return 'tasks_changed'
+    return 'module_updated'
+
+
+class StationWatcher(ChangeWatcher):
+    """Station state watcher and the hub that fans its events out to the tablets of one process."""
+
+    tables = STATION_TABLES
+    name = 'station-events'
+
+    def __init__(self, app, poll_interval=1.0, max_subscribers=24, slots=None):
+        super().__init__(app, poll_interval)
+        self.max_subscribers = max_subscribers
+        self.slots = slots or StreamSlots(0) # Response threads shared with the process's other streams
+        self.hub = Hub()
+        self._states = None # station_id -> get_station_states() entry
+        self._baseline = None # Generation of the first state: changes before it are unknown
+        self._changed_at = {} # station_id -> generation of its last change
+        self._subscribers = 0
+
+    # --- Subscribers ---
+
+    def subscribe(self, station_id, last_event_id=None, heartbeat=15.0, timeout=5.0):
+        """Registers a subscriber for `station_id` and returns its StationSubscription.
+        Raises KeyError for an unknown station and EventsUnavailable if the watcher or the
+        process's stream slots are full, or it has no state within `timeout` seconds.
+        """
+        with self._cond:
+            if self.max_subscribers and self._subscribers >= self.max_subscribers:
+                raise EventsUnavailable(f"Too many station subscribers ({self._subscribers})")
+            if not self.slots.acquire():
+                raise EventsUnavailable(f"No response threads left for event streams ({self.slots.used})")
+            self._subscribers += 1
+        self.hold()
+        try:
+            if not self.wait_for_poll(timeout):
+                raise EventsUnavailable("Station states are not available")
+            with self._cond: # Publishing happens under the lock: nothing falls between these reads and the queue
+                if station_id not in self._states:
+                    raise KeyError(station_id)
+                subscription = self.hub.subscribe([station_id], max_pending=16)
+                generation = self.generation
+                missed = self._missed(station_id, last_event_id)
+        except Exception:
+            self._unsubscribe()
+            raise
+        return StationSubscription(self, subscription, station_id, generation, missed, heartbeat)
+
+    def _missed(self, station_id, last_event_id):
+        """Whether a client that last saw generation `last_event_id` (None for a new client)
+        may have missed a change of `station_id`. Called with the lock held.
+        """
+        if last_event_id is None:
+            return False
+        try:
+            seen = int(last_event_id)
+        except ValueError:
+            return True
+        if seen >= self.generation:
+            return False
+        return seen < self._changed_at.get(station_id, self._baseline)
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+        self.slots.release()
+        self.release()
+
+    def _event(self, generation, station_id, reason, module_id):
+        return format_event(generation, 'station', json.dumps(
+            {'station_id': station_id, 'reason': reason, 'module_id': module_id}, separators=(',', ':')
+        ))
+
+    # --- Watcher ---
+
+    def load(self, db, generation):
+        states = queries.get_station_states()
+        if self._states is None:
+            return states, []
+        events = []
+        for station_id, state in states.items():
+            reason = change_reason(self._states.get(station_id), state)
+            if reason is not None:
+                events.append((station_id, self._event(generation, station_id, reason, state[0][0])))
+        return states, events
+
+    def apply(self, previous, generation, loaded):
+        self._states, events = loaded
+        if previous is None:
+            self._baseline = generation
+        for station_id, message in events:
+            self._changed_at[station_id] = generation
+            self.hub.publish(station_id, message)
+
+
+class StationSubscription:
+    """Response body of one tablet: an endless iterable of SSE messages. The server calls
+    close() when the client goes away, even if iteration never started.
+    """
+
+    def __init__(self, watcher, subscription, station_id, generation, missed, heartbeat):
+        self._watcher = watcher
+        self._subscription = subscription
+        self._station_id = station_id
+        self._generation = generation
+        self._missed = missed
+        self._heartbeat = heartbeat
+        self._closed = False
+
+    def __iter__(self):
+        watcher = self._watcher
+        yield f"retry: {int(watcher.poll_interval * 1000) + 2000}\n\n" # Reconnect delay for the client
+        if self._missed:
+            yield watcher._event(self._generation, self._station_id, 'missed', None)
+        else:
+            yield format_event(self._generation) # Current position, for Last-Event-ID
+        while not self._closed:
+            messages, overflowed = self._subscription.get(self._heartbeat)
+            if overflowed:
+                yield watcher._event(watcher.generation, self._station_id, 'resync', None)
+            else:
+                yield ''.join(messages) or HEARTBEAT
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._subscription.close()
+            self._watcher._unsubscribe()
+
+
+def get_station_watcher():
+    """Returns this process's StationWatcher for the configured database, starting it on first
+    use (in a request, so CLI commands and a preloading gunicorn master never start one).
+    """
+    key = (os.getpid(), get_db_path())
+    watcher = _watchers.get(key)
+    if watcher is None:
+        with _lock:
+            watcher = _watchers.get(key)
+            if watcher is None:
+                config = current_app.config
+                watcher = StationWatcher(
+                    current_app._get_current_object(),
+                    poll_interval=config.get('STATION_EVENTS_POLL_MS', 1000) / 1000.0,
+                    max_subscribers=config.get('STATION_EVENTS_MAX_SUBSCRIBERS', 24),
+                    slots=stream_slots(config)
+                )
+                _watchers[key] = watcher.start()
+    return watcher
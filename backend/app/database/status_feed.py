@@ -0,0 +1,221 @@
+"""Production status changes as Server-Sent Events
+(GET /api/admin/production_status/events).
+
+Each process has one StatusFeed, a ChangeWatcher (see watcher.py) over
+STATUS_TABLES; subscribers never touch the database. When the tables'
+generation moves, the feed loads get_station_status_and_upcoming() in the
+same read transaction, so the payload is exactly that generation's. The
+difference from the previous
+payload is encoded once as a `delta` event and appended to a short ring
+buffer. Every subscriber replays the buffer from its position and then waits
+on a condition, sending a heartbeat comment when nothing happened for a while.
+
+Local changes (module moves, modules started by a task, plan edits) go out
+within milliseconds of their commit; those of other gunicorn workers on the
+next poll.
+
+Event IDs are generations, which are the same in every process. A client that
+reconnects (EventSource sends Last-Event-ID by itself) gets the events after
+its ID if the buffer still has them, nothing if it is current, and a full
+`snapshot` event otherwise, whichever worker it lands on. Generations that do
+not change the payload (e.g. a plan item beyond the upcoming window) are sent
+as an ID-only message, which moves the client's Last-Event-ID without
+dispatching anything.
+
+Each subscriber keeps a response thread busy, so the app must run with
+threads (gunicorn.conf.py runs gthread workers). STATUS_FEED_MAX_SUBSCRIBERS
+caps them per process, and so do the stream slots shared with the station
+events (see pubsub.StreamSlots); above either the route answers 503 and the
+dashboard falls back to polling.
+"""
+import collections
+import os
+import threading
+import time
+
+from flask import current_app
+
+from . import queries
+from .connection import get_db_path
+from .pubsub import HEARTBEAT, StreamSlots, format_event, stream_slots
+from .watcher import ChangeWatcher
+
+# Tables read by get_station_status_and_upcoming: their generation identifies a status payload
+STATUS_TABLES = ('Stations', 'Modules', 'HouseTypes', 'Projects', 'ProductionPlan', 'HouseTypeTipologias')
+
+# One feed per (process, database path), like the connection pools
+_feeds = {}
+_lock = threading.Lock()
+
+
+class FeedUnavailable(RuntimeError):
+    """Raised when a subscriber cannot be served (too many subscribers, or no status yet)."""
+
+
+def _stations_by_id(station_status):
+    stations = {}
+    for row in station_status:
+        stations.setdefault(row['station_id'], []).append(row)
+    return stations
+
+def diff_status(old, new):
+    """Changes from one get_station_status_and_upcoming() payload to the next, as a dict with
+    only the keys that changed (empty if none):
+    - station_status: all rows of every station whose rows changed;
+    - removed_stations: IDs of stations that are gone;
+    - upcoming_items: upcoming items that are new or changed;
+    - upcoming_order: plan IDs of the new upcoming window, in order, if it changed;
+    - upcoming_total, upcoming_next_cursor: new values.
+    """
+    delta = {}
+    old_stations = _stations_by_id(old['station_status'])
+    new_stations = _stations_by_id(new['station_status'])
+    changed = [row for station_id, rows in new_stations.items() if old_stations.get(station_id) != rows for row in rows]
+    if changed:
+        delta['station_status'] = changed
+    removed = [station_id for station_id in old_stations if station_id not in new_stations]
+    if removed:
+        delta['removed_stations'] = removed
+
+    old_items = {item['plan_id']: item for item in old['upcoming_items']}
+    upserted = [item for item in new['upcoming_items'] if old_items.get(item['plan_id']) != item]
+    if upserted:
+        delta['upcoming_items'] = upserted
+    order = [item['plan_id'] for item in new['upcoming_items']]
+    if order != list(old_items):
+        delta['upcoming_order'] = order
+    for key in ('upcoming_total', 'upcoming_next_cursor'):
+        if old[key] != new[key]:
+            delta[key] = new[key]
+    return delta
+
+
+class StatusFeed(ChangeWatcher):
+    """Status watcher and the event buffer shared by the status subscribers of one process."""
+
+    tables = STATUS_TABLES
+    name = 'status-feed'
+
+    def __init__(self, app, poll_interval=1.0, history=64, max_subscribers=8, slots=None):
+        super().__init__(app, poll_interval)
+        self.max_subscribers = max_subscribers
+        self.slots = slots or StreamSlots(0) # Response threads shared with the process's other streams
+        self._events = collections.deque(maxlen=history) # (previous generation, generation, message)
+        self._status = None
+        self._snapshot = None # (generation, message) of the current status, encoded on demand
+        self._subscribers = 0
+
+    # --- Subscribers ---
+
+    def subscribe(self, last_event_id=None, heartbeat=15.0, timeout=5.0):
+        """Registers a subscriber and returns its StatusSubscription, which yields SSE
+        messages starting after `last_event_id`. Raises FeedUnavailable if the feed or the
+        process's stream slots are full, or it has no status within `timeout` seconds.
+        """
+        with self._cond:
+            if self.max_subscribers and self._subscribers >= self.max_subscribers:
+                raise FeedUnavailable(f"Too many status subscribers ({self._subscribers})")
+            if not self.slots.acquire():
+                raise FeedUnavailable(f"No response threads left for event streams ({self.slots.used})")
+            self._subscribers += 1
+        self.hold()
+        # A fresh status, not whatever was seen before the watcher went idle
+        if not self.wait_for_poll(timeout):
+            self._unsubscribe()
+            raise FeedUnavailable("Production status is not available")
+        return StatusSubscription(self, last_event_id, heartbeat)
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+        self.slots.release()
+        self.release()
+
+    def _next_messages(self, position, heartbeat):
+        """Waits up to `heartbeat` seconds for messages after `position`; returns them
+        (empty on timeout) with the new position.
+        """
+        deadline = time.monotonic() + heartbeat
+        with self._cond:
+            while True:
+                messages, position = self._messages_after(position)
+                remaining = deadline - time.monotonic()
+                if messages or remaining <= 0:
+                    return messages, position
+                self._cond.wait(remaining)
+
+    def _messages_after(self, position):
+        """Messages taking a client from generation `position` (a string, or None) to the
+        current one, and the current generation. Called with the lock held.
+        """
+        current = str(self.generation)
+        if position == current:
+            return [], position
+        for index, (previous, _, _) in enumerate(self._events):
+            if previous == position:
+                return [message for _, _, message in list(self._events)[index:]], current
+        if self._snapshot is None or self._snapshot[0] != current:
+            data = self._app.json.dumps(self._status, separators=(',', ':'))
+            self._snapshot = (current, format_event(current, 'snapshot', data))
+        return [self._snapshot[1]], current
+
+    # --- Watcher ---
+
+    def load(self, db, generation):
+        status = queries.get_station_status_and_upcoming()
+        if self._status is None:
+            return status, None
+        delta = diff_status(self._status, status)
+        if delta:
+            return status, format_event(generation, 'delta', self._app.json.dumps(delta, separators=(',', ':')))
+        return status, format_event(generation)
+
+    def apply(self, previous, generation, loaded):
+        self._status, message = loaded
+        if message is not None:
+            self._events.append((str(previous), str(generation), message))
+
+
+class StatusSubscription:
+    """Response body of one subscriber: an endless iterable of SSE messages. The server
+    calls close() when the client goes away, even if iteration never started.
+    """
+
+    def __init__(self, feed, last_event_id, heartbeat):
+        self._feed = feed
+        self._position = last_event_id
+        self._heartbeat = heartbeat
+        self._closed = False
+
+    def __iter__(self):
+        yield f"retry: {int(self._feed.poll_interval * 1000) + 2000}\n\n" # Reconnect delay for the client
+        while not self._closed:
+            messages, self._position = self._feed._next_messages(self._position, self._heartbeat)
+            yield ''.join(messages) or HEARTBEAT
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._feed._unsubscribe()
+
+
+def get_status_feed():
+    """Returns this process's StatusFeed for the configured database, starting it on first use
+    (in a request, so CLI commands and a preloading gunicorn master never start one).
+    """
+    key = (os.getpid(), get_db_path())
+    feed = _feeds.get(key)
+    if feed is None:
+        with _lock:
+            feed = _feeds.get(key)
+            if feed is None:
+                config = current_app.config
+                feed = StatusFeed(
+                    current_app._get_current_object(),
+                    poll_interval=config.get('STATUS_FEED_POLL_MS', 1000) / 1000.0,
+                    history=config.get('STATUS_FEED_HISTORY', 64),
+                    max_subscribers=config.get('STATUS_FEED_MAX_SUBSCRIBERS', 8),
+                    slots=stream_slots(config)
+                )
+                _feeds[key] = feed.start()
+    return feed
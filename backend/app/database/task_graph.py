@@ -0,0 +1,186 @@
+"""Task dependency graph (TaskDependencies edges) held in memory per process.
+
+A TaskGraph is built from the edge table and the task definitions' house types.
+It answers in memory what would otherwise take a query per dependency:
+- the transitive prerequisites of a task (computed once, then cached);
+- a topological order of the catalog;
+- whether new edges would close a cycle;
+- whether a task is ready or blocked for a module, given the tasks the module
+  has completed.
+
+get_task_graph() keeps one graph per database. It is rebuilt only when the
+TaskDefinitions/TaskDependencies generation counters in TableGenerations have
+moved, so every worker picks up catalog changes made by the others with a
+single integer read.
+"""
+import threading
+
+from flask import current_app
+
+from .migrations import tables_generation
+
+# TableGenerations rows whose sum identifies a version of the graph
+GRAPH_TABLES = ('TaskDefinitions', 'TaskDependencies')
+
+
+class DependencyCycleError(ValueError):
+    """Raised when dependencies would make a task (transitively) depend on itself."""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__(f"Task dependencies would form a cycle: {' -> '.join(map(str, cycle))}")
+
+
+class TaskGraph:
+    """Immutable dependency graph. Edges point from a task to its prerequisites."""
+
+    def __init__(self, house_types, edges, generation=None):
+        self.generation = generation
+        self.house_types = dict(house_types) # task_definition_id -> house_type_id (None if generic)
+        prerequisites = {}
+        dependents = {}
+        for task, prerequisite in edges:
+            prerequisites.setdefault(task, set()).add(prerequisite)
+            dependents.setdefault(prerequisite, set()).add(task)
+        self.prerequisites = {task: frozenset(deps) for task, deps in prerequisites.items()}
+        self.dependents = {task: frozenset(deps) for task, deps in dependents.items()}
+        self._closure = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(deps) for deps in self.prerequisites.values())
+
+    def direct_prerequisites(self, task):
+        return self.prerequisites.get(task, frozenset())
+
+    def all_prerequisites(self, task):
+        """Every task `task` depends on, directly or transitively (cached)."""
+        closure = self._closure.get(task)
+        if closure is None:
+            with self._lock:
+                closure = self._closure.get(task)
+                if closure is None:
+                    closure = self._closure[task] = self._reachable(task, self.prerequisites)
+        return closure
+
+    def _reachable(self, start, adjacency):
+        seen = set()
+        stack = list(adjacency.get(start, ()))
+        while stack:
+            task = stack.pop()
+            if task not in seen:
+                seen.add(task)
+                stack.extend(adjacency.get(task, ()))
+        return frozenset(seen)
+
+    def find_cycle(self):
+        """Returns one cycle as [a, b, ..., a] (a depends on b ...), or None."""
+        state = {} # task -> 1 while on the DFS path, 2 when done
+        for root in self.prerequisites:
+            if state.get(root):
+                continue
+            path = [root]
+            iterators = [iter(self.prerequisites.get(root, ()))]
+            state[root] = 1
+            while iterators:
+                task = next(iterators[-1], None)
+                if task is None:
+                    state[path.pop()] = 2
+                    iterators.pop()
+                elif state.get(task) == 1:
+                    return path[path.index(task):] + [task]
+                elif not state.get(task):
+                    state[task] = 1
+                    path.append(task)
+                    iterators.append(iter(self.prerequisites.get(task, ())))
+        return None
+
+    def topological_order(self):
+        """All tasks with dependencies, prerequisites first. Raises DependencyCycleError."""
+        indegree = {task: len(deps) for task, deps in self.prerequisites.items()}
+        for deps in self.prerequisites.values():
+            for task in deps:
+                indegree.setdefault(task, 0)
+        ready = sorted(task for task, count in indegree.items() if count == 0)
+        order = []
+        while ready:
+            task = ready.pop(0)
+            order.append(task)
+            for dependent in sorted(self.dependents.get(task, ())):
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) < len(indegree):
+            raise DependencyCycleError(self.find_cycle())
+        return order
+
+    def check_dependencies(self, task, prerequisites):
+        """Raises DependencyCycleError if giving `task` these prerequisites would close a cycle."""
+        for prerequisite in prerequisites:
+            if prerequisite == task:
+                raise DependencyCycleError([task, task])
+            if task in self.all_prerequisites(prerequisite):
+                # Path back from the prerequisite to the task, for the error message
+                raise DependencyCycleError([task] + self._path(prerequisite, task))
+
+    def _path(self, start, goal):
+        previous = {start: None}
+        queue = [start]
+        while queue:
+            node = queue.pop(0)
+            if node == goal:
+                break
+            for nxt in sorted(self.prerequisites.get(node, ())):
+                if nxt not in previous:
+                    previous[nxt] = node
+                    queue.append(nxt)
+        path = [goal]
+        while previous.get(path[-1]) is not None:
+            path.append(previous[path[-1]])
+        return path[::-1]
+
+    def applies_to(self, task, house_type_id):
+        """True if the task is done on modules of this house type (its own or a generic task)."""
+        task_house_type = self.house_types.get(task)
+        return task_house_type is None or house_type_id is None or task_house_type == house_type_id
+
+    def readiness(self, task, completed, house_type_id=None):
+        """(ready, blocked_by) for `task` on a module that has completed the task IDs in
+        `completed`. Only prerequisites that apply to the module's house type count;
+        blocked_by lists the unmet direct prerequisites (or, if those are all done, the
+        unmet transitive ones).
+        """
+        pending = [t for t in self.all_prerequisites(task) if t not in completed and self.applies_to(t, house_type_id)]
+        if not pending:
+            return True, []
+        direct = self.direct_prerequisites(task)
+        return False, sorted(t for t in pending if t in direct) or sorted(pending)
+
+
+def load_task_graph(db):
+    generation = tables_generation(db, GRAPH_TABLES)
+    house_types = db.execute("SELECT task_definition_id, house_type_id FROM TaskDefinitions").fetchall()
+    edges = db.execute("SELECT task_definition_id, depends_on_task_definition_id FROM TaskDependencies").fetchall()
+    return TaskGraph(((row[0], row[1]) for row in house_types), ((row[0], row[1]) for row in edges), generation)
+
+
+_graphs = {} # DATABASE_URI -> TaskGraph
+_graphs_lock = threading.Lock()
+
+
+def get_task_graph(db):
+    """The cached graph for the app's database, rebuilt if the graph tables' generation
+    moved. Without generation counters on those tables it is loaded on every call.
+    """
+    key = current_app.config['DATABASE_URI']
+    generation = tables_generation(db, GRAPH_TABLES)
+    if generation is None:
+        return load_task_graph(db)
+    graph = _graphs.get(key)
+    if graph is not None and graph.generation == generation:
+        return graph
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is None or graph.generation != generation:
+            graph = _graphs[key] = load_task_graph(db)
+    return graph
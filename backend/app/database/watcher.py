@@ -0,0 +1,127 @@
+"""Per-process threads that react to committed changes of a set of tables.
+
+A ChangeWatcher reads the generation of its tables (the TableGenerations
+counters bumped by triggers) in a read transaction and, when it moved, calls
+load(db, generation) within the same transaction, so what it reads is
+exactly that generation; apply() then publishes the result together with the
+new generation, under the watcher's lock. The thread is woken by this
+process's writer after every commit (see DatabaseWriter.add_commit_listener),
+so local changes are seen within milliseconds, and otherwise polls every
+`poll_interval` seconds for commits made by other gunicorn workers or CLI
+commands. Watching costs one primary-key read per wake-up, and the thread
+sleeps while nobody holds the watcher (hold()/release()), e.g. while no
+client is subscribed.
+
+Used by status_feed.py and station_events.py, which turn the changes into
+events for their subscribers.
+"""
+import logging
+import threading
+import time
+
+from .connection import get_db, get_writer
+from .migrations import tables_generation
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeWatcher:
+    """Base class: subclasses set `tables` and implement load() and apply()."""
+
+    tables = ()
+    name = 'change-watcher'
+
+    def __init__(self, app, poll_interval=1.0):
+        self._app = app
+        self.poll_interval = poll_interval
+        self.generation = None
+        self._polls = 0
+        self._holders = 0
+        self._cond = threading.Condition() # Also guards the subclasses' state
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+
+    def start(self):
+        """Starts the thread and subscribes it to this process's writer commits.
+        Call with an app context.
+        """
+        writer = get_writer()
+        if writer is not None:
+            writer.add_commit_listener(self.wake)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Makes the watcher look for changes now."""
+        self._wake.set()
+
+    def hold(self):
+        """Keeps the watcher polling until the matching release()."""
+        with self._cond:
+            self._holders += 1
+            self._cond.notify_all() # Resumes the thread if it was idle
+
+    def release(self):
+        with self._cond:
+            self._holders -= 1
+
+    def wait_for_poll(self, timeout):
+        """Wakes the watcher and waits until it has looked for changes (so its state is
+        not older than this call). Returns False on timeout or if it has never
+        loaded anything.
+        """
+        with self._cond:
+            polls = self._polls
+            self._wake.set()
+            deadline = time.monotonic() + timeout
+            while self._polls == polls or self.generation is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def load(self, db, generation):
+        """Called on the watcher thread, inside the read transaction, when the generation
+        moved (and on the first poll). Returns what apply() gets. Only this thread changes
+        the subclass's state, so it may read it without the lock.
+        """
+        raise NotImplementedError
+
+    def apply(self, previous, generation, loaded):
+        """Called with the lock held, right after self.generation moved from `previous`
+        (None on the first poll) to `generation`. Must not block.
+        """
+        raise NotImplementedError
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._holders == 0:
+                    self._cond.wait()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                with self._app.app_context():
+                    self._poll()
+            except Exception as e:
+                logger.error(f"{self.name} poll failed: {e}", exc_info=True)
+            with self._cond:
+                self._polls += 1
+                self._cond.notify_all()
+
+    def _poll(self):
+        db = get_db()
+        db.execute("BEGIN") # One read snapshot for the generation and what load() reads
+        try:
+            generation = tables_generation(db, self.tables)
+            if generation is None:
+                raise RuntimeError(f"No generation counters on {', '.join(self.tables)}")
+            if generation == self.generation:
+                return
+            loaded = self.load(db, generation)
+        finally:
+            db.rollback()
+        with self._cond:
+            previous, self.generation = self.generation, generation
+            self.apply(previous, generation, loaded)
@@ -0,0 +1,280 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Set on the writer thread only; get_db() returns it so query functions
+# executed by the writer transparently use the write connection.
+_local = threading.local()
+
+_STOP = object()
+
+
+def current_connection():
+    """Returns the write connection if called from the writer thread, else None."""
+    return getattr(_local, 'connection', None)
+
+
+class _WriteOperation:
+    __slots__ = ('fn', 'args', 'kwargs', 'future')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriterConnection:
+    """Connection handed to write operations running inside a group-commit batch.
+
+    The batch transaction is owned by DatabaseWriter, so commit() is a no-op
+    and `with db:` blocks become savepoints: they roll back only their own
+    statements on error instead of the whole batch. Everything else is
+    delegated to the underlying sqlite3 connection.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, parameters=()):
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._conn.executemany(sql, seq_of_parameters)
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        pass # Committed by the writer once the whole batch has run
+
+    def rollback(self):
+        raise sqlite3.ProgrammingError("Write operations cannot roll back the batch; raise an exception or use 'with db:' instead")
+
+    def executescript(self, sql_script):
+        raise sqlite3.ProgrammingError("executescript() commits implicitly and cannot run inside a write batch")
+
+    def __enter__(self):
+        self._depth += 1
+        self._conn.execute(f"SAVEPOINT write_block_{self._depth}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        name = f"write_block_{self._depth}"
+        self._depth -= 1
+        if exc_type is not None:
+            self._conn.execute(f"ROLLBACK TO {name}")
+        self._conn.execute(f"RELEASE {name}")
+        return False
+
+
+class DatabaseWriter:
+    """Dedicated thread owning the process's only write connection.
+
+    Write operations (plain functions that use get_db()) are queued with
+    submit() and answered through futures. Operations that arrive together
+    are run in a single BEGIN IMMEDIATE ... COMMIT transaction (group
+    commit), each inside its own savepoint so one failing operation does not
+    undo the others. Futures are resolved only after the commit succeeded.
+    """
+
+    def __init__(self, connect, max_batch=64, batch_window=0.002, name='db-writer'):
+        self._connect = connect
+        self._max_batch = max_batch
+        self._batch_window = batch_window
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._operations = 0
+        self._failed_operations = 0
+        self._failed_commits = 0
+        self._max_batch_seen = 0
+        self._commit_time = 0.0
+        self._commit_listeners = []
+
+    def start(self):
+        with self._start_lock:
+            if not self._started:
+                self._thread.start()
+                self._started = True
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the writer after the operations already queued have run."""
+        if self._started:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def is_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) to run on the write connection. Returns a Future."""
+        self.start()
+        op = _WriteOperation(fn, args, kwargs)
+        self._queue.put(op)
+        return op.future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Runs fn on the writer and waits for its (committed) result, re-raising its exception."""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def add_commit_listener(self, fn):
+        """Calls fn() on the writer thread after each batch that committed changes.
+        Listeners must return quickly (e.g. set an Event); their errors are logged.
+        """
+        self._commit_listeners.append(fn)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'operations': self._operations,
+                'failed_operations': self._failed_operations,
+                'failed_commits': self._failed_commits,
+                'avg_batch_size': round(self._operations / self._batches, 2) if self._batches else 0.0,
+                'max_batch_size': self._max_batch_seen,
+                'total_commit_ms': round(self._commit_time * 1000, 3),
+            }
+
+    # --- Writer thread ---
+
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None # Transactions are managed explicitly below
+        _local.connection = WriterConnection(conn)
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    try:
+                        self._run_batch(conn, batch)
+                    except Exception as e: # Keep serving later writes whatever went wrong with this batch
+                        logger.error(f"Writer batch of {len(batch)} operations failed: {e}", exc_info=True)
+                        self._abandon(conn, batch, e)
+                if stop:
+                    break
+        finally:
+            _local.connection = None
+            conn.close()
+
+    def _next_batch(self):
+        """Blocks for the first operation, then collects whatever else arrives
+        within the batch window (up to max_batch operations).
+        """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self._batch_window
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                op = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is _STOP:
+                return batch, True
+            batch.append(op)
+        return batch, False
+
+    def _run_batch(self, conn, batch):
+        batch = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            logger.error(f"Writer could not begin a transaction for {len(batch)} operations: {e}")
+            for op in batch:
+                op.future.set_exception(e)
+            self._record(len(batch), len(batch), 0.0, commit_failed=True)
+            return
+
+        outcomes = []
+        failed = 0
+        for op in batch:
+            conn.execute("SAVEPOINT write_op")
+            result, error = None, None
+            try:
+                result = op.fn(*op.args, **op.kwargs)
+            except BaseException as e:
+                error = e
+            try:
+                if error is not None and conn.in_transaction:
+                    conn.execute("ROLLBACK TO write_op")
+                if conn.in_transaction:
+                    conn.execute("RELEASE write_op")
+            except sqlite3.Error as e:
+                error = error or e
+            if not conn.in_transaction:
+                # The operation ended the batch transaction (e.g. a trigger's RAISE(ROLLBACK)),
+                # taking the earlier operations' writes with it: none of the batch succeeded
+                lost = error or sqlite3.OperationalError("A write operation ended the batch transaction")
+                logger.error(f"Writer lost a batch of {len(batch)} operations: {lost}")
+                self._abandon(conn, batch, lost)
+                return
+            outcomes.append((op, result, error))
+            if error is not None:
+                failed += 1
+
+        start = time.monotonic()
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Writer failed to commit a batch of {len(batch)} operations: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for op in batch:
+                op.future.set_exception(e)
+            self._record(len(batch), len(batch), time.monotonic() - start, commit_failed=True)
+            return
+        self._record(len(batch), failed, time.monotonic() - start)
+        if failed < len(batch):
+            for listener in self._commit_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    logger.error(f"Writer commit listener failed: {e}", exc_info=True)
+
+        for op, result, error in outcomes:
+            if error is not None:
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(result)
+
+    def _abandon(self, conn, batch, error):
+        """Rolls back whatever is left of the batch transaction and fails the operations
+        that have no outcome yet with `error`.
+        """
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error as e:
+            logger.error(f"Writer could not roll back an abandoned batch: {e}")
+        for op in batch:
+            if not op.future.done():
+                op.future.set_exception(error)
+        self._record(len(batch), len(batch), 0.0, commit_failed=True)
+
+    def _record(self, size, failed, commit_time, commit_failed=False):
+        with self._stats_lock:
+            self._batches += 1
+            self._operations += size
+            self._failed_operations += failed
+            self._failed_commits += 1 if commit_failed else 0
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._commit_time += commit_time
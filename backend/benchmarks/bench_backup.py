@@ -0,0 +1,114 @@
+"""Write latency while an online backup runs.
+
+Tablets keep inserting task logs at a steady rate while the database is
+copied: first with no backup (baseline), then with BackupManager's paced
+page batches, then with a one-shot copy of the whole file (pages=-1) for
+comparison.
+
+    python benchmarks/bench_backup.py [--rows 500000] [--threads 8] [--profile kiosk-safe]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import create_seeded_database, summarize_ms
+
+from config import Config
+from app.database.backup import BackupManager
+from app.database.connection import _connect
+
+INSERT_TASK_LOG = """
+    INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, station_start)
+    VALUES (?, ?, ?, 'In Progress', '2026-01-01 07:00:00', ?)
+"""
+
+
+def pad_task_logs(db_path, rows):
+    """Grows TaskLogs so the database is large enough for the copy to take a while."""
+    db = _connect(db_path)
+    with db:
+        db.executemany(
+            """INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, completed_at, station_start, notes)
+               VALUES (1, ?, ?, 'Completed', '2025-06-01 08:00:00', '2025-06-01 09:00:00', 'W1', ?)""",
+            ((i % 96 + 1, i % 40 + 1, f"Registro histórico {i:08d}") for i in range(rows))
+        )
+    db.close()
+    return os.path.getsize(db_path)
+
+
+def measure_writes(db_path, stations, profile, threads, stop, interval=0.01):
+    """Inserts one task log per tablet every `interval` seconds until `stop` is set."""
+    latencies = []
+    lock = threading.Lock()
+
+    def tablet(index):
+        conn = _connect(db_path, profile)
+        samples = []
+        n = 0
+        while not stop.is_set():
+            n += 1
+            start = time.perf_counter()
+            conn.execute(INSERT_TASK_LOG, ((index % len(stations)) + 1, (n % 96) + 1, (index % 40) + 1, stations[index % len(stations)]))
+            conn.commit()
+            samples.append(time.perf_counter() - start)
+            time.sleep(interval)
+        conn.close()
+        with lock:
+            latencies.extend(samples)
+
+    workers = [threading.Thread(target=tablet, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    return workers, latencies
+
+
+def run_phase(db_path, stations, profile, threads, backup=None, seconds=2.0):
+    stop = threading.Event()
+    workers, latencies = measure_writes(db_path, stations, profile, threads, stop)
+    start = time.monotonic()
+    if backup is None:
+        time.sleep(seconds)
+    else:
+        backup()
+    duration = time.monotonic() - start
+    stop.set()
+    for t in workers:
+        t.join()
+    return duration, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000, help='Task logs added to grow the database')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--profile', default='kiosk-safe', choices=sorted(Config.DATABASE_PROFILES))
+    args = parser.parse_args()
+    profile = Config.DATABASE_PROFILES[args.profile]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'database.db')
+        stations = create_seeded_database(db_path)
+        _connect(db_path, profile).close() # Switch the file to the profile's journal mode
+        size = pad_task_logs(db_path, args.rows)
+        print(f"database={size / 1e6:.1f} MB threads={args.threads} profile={args.profile}")
+
+        paced = BackupManager(db_path, os.path.join(tmp, 'paced'),
+                              pages_per_step=Config.DATABASE_BACKUP_PAGES_PER_STEP,
+                              step_sleep=Config.DATABASE_BACKUP_STEP_SLEEP_MS / 1000.0)
+        one_shot = BackupManager(db_path, os.path.join(tmp, 'one_shot'), pages_per_step=-1, step_sleep=0)
+
+        phases = (
+            ('no backup', None),
+            ('paced backup', paced.run),
+            ('one-shot backup', one_shot.run),
+        )
+        for label, backup in phases:
+            duration, latencies = run_phase(db_path, stations, profile, args.threads, backup)
+            worst = max(latencies) * 1000 if latencies else 0.0
+            print(f"{label:<16} duration={duration:>6.2f}s writes={len(latencies):>5} latency={summarize_ms(latencies)} max_ms={worst:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Mixed read/write throughput of each DATABASE_PROFILES entry.
+
+Several threads, each with its own connection (like gunicorn threads with
+pooled connections), run a station-tablet style mix for a fixed duration:
+reads are the station task list query, writes insert a TaskLogs row and
+commit. Reports operations per second and "database is locked" errors.
+
+    python benchmarks/bench_db_profiles.py [--threads 8] [--seconds 5] [--write-ratio 0.2]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import create_seeded_database
+
+from config import Config
+from app.database.connection import _connect
+
+READ_QUERY = """
+    SELECT td.task_definition_id, td.name, COALESCE(tl.status, 'Not Started') AS task_status
+    FROM TaskDefinitions td
+    LEFT JOIN TaskLogs tl ON td.task_definition_id = tl.task_definition_id AND tl.module_id = ?
+    JOIN Stations s ON td.station_sequence_order = s.sequence_order AND s.station_id = ?
+    WHERE (td.house_type_id = ? OR td.house_type_id IS NULL)
+      AND (td.specialty_id = ? OR td.specialty_id IS NULL)
+"""
+WRITE_QUERY = """
+    INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, station_start)
+    VALUES (?, ?, ?, 'In Progress', '2026-01-01 10:00:00', ?)
+"""
+
+
+def run_profile(db_path, stations, profile, threads, seconds, write_ratio):
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        conn = _connect(db_path, profile)
+        reads = writes = locked = 0
+        while time.monotonic() < deadline:
+            index = rng.randrange(len(stations))
+            module_id = index + 1
+            try:
+                if rng.random() < write_ratio:
+                    conn.execute(WRITE_QUERY, (module_id, rng.randint(1, 96), rng.randint(1, 40), stations[index]))
+                    conn.commit()
+                    writes += 1
+                else:
+                    conn.execute(READ_QUERY, (module_id, stations[index], rng.randint(1, 3), rng.randint(1, 5))).fetchall()
+                    reads += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                conn.rollback()
+                locked += 1
+        conn.close()
+        with lock:
+            counts['reads'] += reads
+            counts['writes'] += writes
+            counts['locked'] += locked
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    counts['ops_per_s'] = round((counts['reads'] + counts['writes']) / seconds, 1)
+    counts['writes_per_s'] = round(counts['writes'] / seconds, 1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # SQLite defaults (rollback journal, no busy timeout) as the baseline
+    profiles = {'(sqlite defaults)': {}}
+    profiles.update(Config.DATABASE_PROFILES)
+
+    print(f"threads={args.threads} seconds={args.seconds} write_ratio={args.write_ratio}")
+    print(f"{'profile':<20}{'ops/s':>10}{'writes/s':>10}{'reads':>10}{'writes':>10}{'locked':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, profile) in enumerate(profiles.items()):
+            db_path = os.path.join(tmp, f"bench-{i}.db")
+            stations = create_seeded_database(db_path)
+            result = run_profile(db_path, stations, profile, args.threads, args.seconds, args.write_ratio)
+            print(f"{name:<20}{result['ops_per_s']:>10}{result['writes_per_s']:>10}{result['reads']:>10}{result['writes']:>10}{result['locked']:>10}")
+
+
+if __name__ == '__main__':
+    main()
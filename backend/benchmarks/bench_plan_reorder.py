@@ -0,0 +1,101 @@
+"""Dashboard drag-and-drop: full plan reorder vs. moving only the dragged items.
+
+The dashboard used to send the whole upcoming queue after every drag and
+update_production_plan_sequence rewrote planned_sequence for each item.
+move_production_plan_items gives only the dragged items new keys inside the
+gap next to the drop target. Both are run through the app (writer thread
+included) on the same random drags of 1-3 items, and the final orders are
+checked against each other. Latency and rows written per drag are reported
+for several plan sizes.
+
+    python benchmarks/bench_plan_reorder.py [--drags 300] [--houses 100,500,2500]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import create_seeded_database, summarize_ms
+
+from config import Config
+from app import create_app
+from app.database import queries
+from app.database.connection import get_db
+
+
+def plan_order(app):
+    with app.app_context():
+        return [row[0] for row in get_db().execute(
+            "SELECT plan_id FROM ProductionPlan WHERE status IN ('Planned', 'Scheduled') ORDER BY planned_sequence, plan_id"
+        )]
+
+
+def plan_keys(app):
+    with app.app_context():
+        return dict(get_db().execute("SELECT plan_id, planned_sequence FROM ProductionPlan").fetchall())
+
+
+def random_drags(order, count, seed=1):
+    """(moved plan IDs, anchor plan ID, 'before'/'after', resulting order) for `count` drags."""
+    rng = random.Random(seed)
+    drags = []
+    for _ in range(count):
+        moved = rng.sample(order, rng.choice((1, 1, 2, 3)))
+        rest = [plan_id for plan_id in order if plan_id not in moved]
+        anchor = rng.choice(rest)
+        position = rng.choice(('before', 'after'))
+        index = rest.index(anchor) + (1 if position == 'after' else 0)
+        order = rest[:index] + moved + rest[index:]
+        drags.append((moved, anchor, position, order))
+    return drags
+
+
+def run(houses, drags):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        create_seeded_database(db_path, houses_per_project=houses)
+
+        class BenchConfig(Config):
+            DATABASE_URI = f'sqlite:///{db_path}'
+            DATABASE_BACKUP_INTERVAL_MINUTES = 0
+            DATABASE_MAINTENANCE_WINDOWS = ''
+            DATABASE_QUERY_STATS = False
+            DATABASE_SLOW_QUERY_MS = 0
+
+        app = create_app(BenchConfig)
+        start_order = plan_order(app)
+        plan = random_drags(start_order, drags)
+        results = {}
+        for name in ('full reorder', 'move'):
+            with app.app_context(): # Both start from the same order
+                queries.update_production_plan_sequence(start_order)
+            latencies = []
+            rows = 0
+            for moved, anchor, position, order in plan:
+                before = plan_keys(app)
+                with app.app_context():
+                    start = time.perf_counter()
+                    if name == 'move':
+                        queries.move_production_plan_items(moved, anchor, position)
+                    else:
+                        queries.update_production_plan_sequence(order)
+                    latencies.append(time.perf_counter() - start)
+                rows += len(plan_keys(app).items() - before.items())
+            results[name] = plan_order(app)
+            print(f"  {len(start_order):>6} items  {name:<13} {summarize_ms(latencies)}  rows written/drag: {rows / drags:.1f}")
+        if results['full reorder'] != results['move'] or results['move'] != plan[-1][3]:
+            print("  !! final plan orders differ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drags', type=int, default=300)
+    parser.add_argument('--houses', default='100,500,2500', help='Houses per project, comma-separated plan sizes')
+    args = parser.parse_args()
+    for houses in (int(value) for value in args.houses.split(',')):
+        run(houses, args.drags)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Station page refresh: the previous sequence of queries vs. get_station_overview.
+
+The station overview used to run 3-5 queries per refresh (current module,
+station sequence, tasks, then panels; or the next planned module and its
+tasks at an empty first station). queries.get_station_overview resolves the
+same data with at most two statements. Both are run through the app's
+pooled connections for every station and a few specialties, their results
+are compared, and per-refresh latency is reported. A second pass empties the
+first station so the "upcoming module" path is measured too. --history adds
+completed modules with their task logs, as a plant accumulates them.
+Finally a wall display refresh (every station at once) is measured as one
+get_station_overview call per station vs. a single get_plant_overview.
+
+    python benchmarks/bench_station_overview.py [--refreshes 5000] [--houses 200] [--history 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import create_seeded_database, summarize_ms
+
+from config import Config
+from app import create_app
+from app.database import queries
+from app.database.connection import _connect, get_db
+
+
+def add_history(db_path, modules):
+    """Adds completed modules, each with a completed log for every task definition."""
+    db = _connect(db_path)
+    task_definition_ids = [row[0] for row in db.execute("SELECT task_definition_id FROM TaskDefinitions")]
+    with db:
+        first_module = db.execute("SELECT COALESCE(MAX(module_id), 0) + 1 FROM Modules").fetchone()[0]
+        db.executemany(
+            "INSERT INTO Modules (module_id, project_id, house_type_id, module_sequence_in_house, status) VALUES (?, 1, 1, 1, 'Completed')",
+            ((first_module + i,) for i in range(modules))
+        )
+        db.executemany(
+            """INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, completed_at, station_start)
+               VALUES (?, ?, 1, 'Completed', '2025-06-01 08:00:00', '2025-06-01 09:00:00', NULL)""",
+            ((first_module + i, td) for i in range(modules) for td in task_definition_ids)
+        )
+    db.close()
+
+
+def legacy_station_overview(station_id, worker_specialty_id):
+    """The station overview as it was computed before get_station_overview."""
+    module_info = queries.get_current_module_for_station(station_id)
+    upcoming_module_info = None
+    tasks = []
+    panels = []
+    station_details = get_db().execute("SELECT sequence_order FROM Stations WHERE station_id = ?", (station_id,)).fetchone()
+    station_sequence_order = station_details['sequence_order'] if station_details else None
+    if module_info:
+        tasks = queries.get_tasks_for_module_at_station(
+            station_id=station_id, module_id=module_info['module_id'],
+            house_type_id=module_info['house_type_id'], worker_specialty_id=worker_specialty_id
+        )
+        if station_sequence_order and 1 <= station_sequence_order <= 5 and module_info.get('module_sequence_in_house'):
+            panels = queries.get_panels_for_house_type_module(module_info['house_type_id'], module_info['module_sequence_in_house'])
+    elif station_sequence_order == 1:
+        upcoming_module_info = queries.get_next_planned_module()
+        if upcoming_module_info:
+            tasks = queries.get_tasks_for_plan_at_station(
+                station_id=station_id, plan_id=upcoming_module_info['plan_id'],
+                house_type_id=upcoming_module_info['house_type_id'], worker_specialty_id=worker_specialty_id
+            )
+            if upcoming_module_info.get('module_sequence_in_house'):
+                panels = queries.get_panels_for_house_type_module(
+                    upcoming_module_info['house_type_id'], upcoming_module_info['module_sequence_in_house']
+                )
+    return {'module': module_info, 'upcoming_module': upcoming_module_info, 'tasks': tasks, 'panels': panels}
+
+
+def measure(app, fn, requests):
+    latencies = []
+    for station_id, specialty_id in requests:
+        with app.app_context():
+            start = time.perf_counter()
+            fn(station_id, specialty_id)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def without_readiness(overview):
+    """The overview without the ready/blocked_by task flags, which the previous queries lacked."""
+    tasks = [{key: value for key, value in task.items() if key not in ('ready', 'blocked_by')} for task in overview['tasks']]
+    return dict(overview, tasks=tasks)
+
+
+def compare(app, requests):
+    """Returns the requests for which both implementations disagree."""
+    mismatches = []
+    for station_id, specialty_id in set(requests):
+        with app.app_context():
+            if legacy_station_overview(station_id, specialty_id) != without_readiness(queries.get_station_overview(station_id, specialty_id)):
+                mismatches.append((station_id, specialty_id))
+    return mismatches
+
+
+def run_pass(label, app, requests):
+    mismatches = compare(app, requests)
+    for name, fn in (('previous queries', legacy_station_overview), ('get_station_overview', queries.get_station_overview)):
+        measure(app, fn, requests[:200]) # Warm up the pool and statement caches
+        print(f"  {label:<22} {name:<22} {summarize_ms(measure(app, fn, requests))}")
+    if mismatches:
+        print(f"  !! results differ for {sorted(mismatches)}")
+
+
+def run_plant_pass(app, stations, refreshes):
+    def per_station():
+        return [queries.get_station_overview(station_id, 1) for station_id in stations]
+
+    def batched():
+        return queries.get_plant_overview(None, 1, filter_by_specialty=True)
+
+    with app.app_context():
+        same = [{key: item[key] for key in ('module', 'upcoming_module', 'tasks', 'panels')} for item in batched()] == per_station()
+    for name, fn in (('per-station calls', per_station), ('get_plant_overview', batched)):
+        latencies = []
+        for _ in range(refreshes):
+            with app.app_context():
+                start = time.perf_counter()
+                fn()
+                latencies.append(time.perf_counter() - start)
+        print(f"  {'whole plant':<22} {name:<22} {summarize_ms(latencies)}")
+    if not same:
+        print("  !! plant overview differs from the per-station overviews")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--refreshes', type=int, default=5000)
+    parser.add_argument('--houses', type=int, default=200, help='Houses per project (plan size)')
+    parser.add_argument('--history', type=int, default=5000, help='Completed modules with task logs')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        stations = create_seeded_database(db_path, houses_per_project=args.houses)
+        add_history(db_path, args.history)
+
+        class BenchConfig(Config):
+            DATABASE_URI = f'sqlite:///{db_path}'
+            DATABASE_BACKUP_INTERVAL_MINUTES = 0
+            DATABASE_MAINTENANCE_WINDOWS = ''
+            DATABASE_QUERY_STATS = False
+            DATABASE_SLOW_QUERY_MS = 0
+
+        app = create_app(BenchConfig)
+        specialties = (None, 1, 3)
+        requests = [(stations[i % len(stations)], specialties[i % len(specialties)]) for i in range(args.refreshes)]
+
+        print(f"{args.refreshes} station refreshes over {len(stations)} stations, {args.history} completed modules")
+        run_pass('module at station', app, requests)
+
+        with app.app_context():
+            db = get_db()
+            first_station = db.execute("SELECT station_id FROM Stations WHERE sequence_order = 1 ORDER BY station_id LIMIT 1").fetchone()[0]
+            db.execute("UPDATE Modules SET current_station_id = NULL WHERE current_station_id = ?", (first_station,))
+            db.commit()
+        run_pass('empty first station', app, [(first_station, specialties[i % len(specialties)]) for i in range(args.refreshes)])
+        run_plant_pass(app, stations, max(1, args.refreshes // len(stations)))
+
+
+if __name__ == '__main__':
+    main()
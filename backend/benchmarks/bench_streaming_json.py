@@ -0,0 +1,91 @@
+"""Large list endpoints: jsonify vs. streamed JSON (?stream=true).
+
+GET /api/admin/production_plan is requested once per mode, each in a fresh
+process, for several plan sizes. The response is consumed chunk by chunk
+and discarded, like a client writing it to a socket. Reported per mode:
+time to the first body chunk, total time, and how much the process's peak
+RSS grew during the request. jsonify holds the rows, their dicts and the
+whole JSON document at once, so its peak grows with the plan. The streamed
+response holds one chunk at a time.
+
+    python benchmarks/bench_streaming_json.py [--houses 2500,12500,25000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import create_seeded_database
+
+MODES = ('jsonify', 'stream')
+
+
+def child(db_path, mode):
+    """Runs one request in this (fresh) process and prints its measurements as JSON."""
+    from config import Config
+    from app import create_app
+
+    class BenchConfig(Config):
+        DATABASE_URI = f'sqlite:///{db_path}'
+        DATABASE_BACKUP_INTERVAL_MINUTES = 0
+        DATABASE_MAINTENANCE_WINDOWS = ''
+        DATABASE_QUERY_STATS = False
+        DATABASE_SLOW_QUERY_MS = 0
+
+    app = create_app(BenchConfig)
+    client = app.test_client()
+    url = '/api/admin/production_plan' + ('?stream=true' if mode == 'stream' else '')
+    client.get(url + ('&' if '?' in url else '?') + 'limit=10').close() # Warm up pools and imports
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'status': response.status_code, 'bytes': size,
+        'first_byte_ms': first_byte * 1000, 'total_ms': total * 1000,
+        'peak_rss_growth_mb': (rss_after - rss_before) / 1024, # ru_maxrss is in KiB on Linux
+    }))
+
+
+def run(houses):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        create_seeded_database(db_path, houses_per_project=houses)
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', db_path, mode],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"  {houses * 4:>7} items  {mode:<8} {result['bytes'] / 1e6:7.1f} MB body  "
+                  f"first byte {result['first_byte_ms']:8.1f} ms  total {result['total_ms']:8.1f} ms  "
+                  f"peak RSS +{result['peak_rss_growth_mb']:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--houses', default='2500,12500,25000', help='Houses per project, comma-separated plan sizes')
+    parser.add_argument('--child', nargs=2, metavar=('DB_PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+    for houses in (int(value) for value in args.houses.split(',')):
+        run(houses)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Sustained TaskLogs insert throughput: per-connection commits vs. the group-commit writer.
+
+Simulates shift start, when every station starts tasks at once: N threads
+each insert task logs as fast as they can for a fixed duration, either
+committing on their own connection (the previous behaviour) or submitting
+the insert to a DatabaseWriter and waiting for the batch commit.
+
+    python benchmarks/bench_writer.py [--threads 24] [--seconds 5] [--profile kiosk-safe] [--dir PATH]
+
+What group commit saves is commits, i.e. fsyncs under synchronous=FULL: the
+report shows commits per insert next to throughput. Throughput only improves
+where an fsync is expensive (disks, SD cards); on storage that makes fsync
+nearly free the two modes are on par. Use --dir to run on the storage that
+matters (temporary files are used otherwise).
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import create_seeded_database, summarize_ms
+
+from config import Config
+from app.database.connection import _connect
+from app.database.writer import DatabaseWriter, current_connection
+
+INSERT_TASK_LOG = """
+    INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, station_start)
+    VALUES (?, ?, ?, 'In Progress', '2026-01-01 07:00:00', ?)
+"""
+
+
+def insert_task_log(module_id, task_definition_id, worker_id, station_id):
+    return current_connection().execute(INSERT_TASK_LOG, (module_id, task_definition_id, worker_id, station_id)).lastrowid
+
+
+def run(db_path, stations, profile, threads, seconds, use_writer):
+    writer = DatabaseWriter(lambda: _connect(db_path, profile)).start() if use_writer else None
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def station_tablet(index):
+        station_id = stations[index % len(stations)]
+        module_id = (index % len(stations)) + 1
+        conn = None if use_writer else _connect(db_path, profile)
+        samples = []
+        n = 0
+        while time.monotonic() < deadline:
+            n += 1
+            args = (module_id, (n % 96) + 1, (index % 40) + 1, station_id)
+            start = time.perf_counter()
+            try:
+                if use_writer:
+                    writer.run(insert_task_log, *args)
+                else:
+                    conn.execute(INSERT_TASK_LOG, args)
+                    conn.commit()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+                continue
+            samples.append(time.perf_counter() - start)
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(samples)
+
+    pool = [threading.Thread(target=station_tablet, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    stats = writer.stats() if writer else None
+    if writer:
+        writer.stop()
+    return len(latencies), latencies, len(errors), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=24)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profile', default='kiosk-safe', choices=sorted(Config.DATABASE_PROFILES))
+    parser.add_argument('--dir', default=None, help='Directory for the benchmark databases')
+    args = parser.parse_args()
+    profile = Config.DATABASE_PROFILES[args.profile]
+
+    print(f"threads={args.threads} seconds={args.seconds} profile={args.profile}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for label, use_writer in (('per-connection commit', False), ('group-commit writer', True)):
+            db_path = os.path.join(tmp, f"{'writer' if use_writer else 'direct'}.db")
+            stations = create_seeded_database(db_path)
+            count, latencies, errors, stats = run(db_path, stations, profile, args.threads, args.seconds, use_writer)
+            commits = stats['batches'] if stats else count # One commit per insert without the writer
+            print(f"{label:<24} inserts/s={count / args.seconds:>9.1f} errors={errors} latency={summarize_ms(latencies)}")
+            print(f"{'':<24} commits/insert={commits / count if count else 0:.3f}"
+                  + (f" avg_batch_size={stats['avg_batch_size']} max_batch_size={stats['max_batch_size']}" if stats else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Shared helpers for the database benchmarks in this directory.
+
+Benchmarks are plain scripts, run from the backend directory, e.g.:
+    python benchmarks/bench_db_profiles.py
+"""
+import os
+import sqlite3
+import statistics
+import sys
+
+# Make `app` and `config` importable when run as a script from anywhere
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+SCHEMA_PATH = os.path.join(BACKEND_DIR, 'app', 'database', 'schema.sql')
+
+
+def create_seeded_database(db_path, projects=2, houses_per_project=50, modules_per_house=2,
+                           task_definitions_per_station=8, workers=40):
+    """Creates a database from schema.sql and fills it with a plant-sized data set:
+    stations (from the schema), house types with tipologias and panels, task
+    definitions for every station sequence, workers, projects, plan items and
+    modules spread over the line with some task logs.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db = sqlite3.connect(db_path)
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        db.executescript(f.read())
+
+    with db:
+        db.executemany("INSERT INTO Specialties (name) VALUES (?)", [(f"Especialidad {i}",) for i in range(1, 6)])
+        for ht in range(1, 4):
+            db.execute("INSERT INTO HouseTypes (name, number_of_modules) VALUES (?, ?)", (f"Tipo {ht}", modules_per_house))
+            db.executemany("INSERT INTO HouseTypeTipologias (house_type_id, name) VALUES (?, ?)",
+                           [(ht, 'Standard'), (ht, 'Premium')])
+            for module in range(1, modules_per_house + 1):
+                db.executemany(
+                    "INSERT INTO HouseTypePanels (house_type_id, module_sequence_number, panel_group, panel_code) VALUES (?, ?, ?, ?)",
+                    [(ht, module, 'Paneles Perimetrales', f"P{ht}-{module}-{p}") for p in range(1, 13)]
+                )
+        task_rows = []
+        for seq in range(1, 13):
+            for i in range(task_definitions_per_station):
+                house_type_id = None if i % 3 == 0 else (i % 3)
+                specialty_id = None if i % 2 == 0 else (i % 5) + 1
+                task_rows.append((f"Tarea {seq}-{i}", house_type_id, specialty_id, seq))
+        db.executemany(
+            "INSERT INTO TaskDefinitions (name, house_type_id, specialty_id, station_sequence_order) VALUES (?, ?, ?, ?)",
+            task_rows
+        )
+        db.executemany(
+            "INSERT INTO Workers (first_name, last_name, pin, specialty_id) VALUES (?, ?, ?, ?)",
+            [(f"Nombre{i}", f"Apellido{i}", f"{1000 + i}", (i % 5) + 1) for i in range(workers)]
+        )
+
+        stations = [row[0] for row in db.execute("SELECT station_id FROM Stations ORDER BY sequence_order, station_id")]
+        sequence = 0
+        for project in range(1, projects + 1):
+            db.execute("INSERT INTO Projects (name, status) VALUES (?, 'Active')", (f"Proyecto {project}",))
+            for house in range(1, houses_per_project + 1):
+                house_type_id = (house % 3) + 1
+                for module in range(1, modules_per_house + 1):
+                    sequence += 1
+                    db.execute(
+                        """INSERT INTO ProductionPlan
+                           (project_id, house_type_id, house_identifier, module_sequence_in_house, planned_sequence,
+                            planned_start_datetime, planned_assembly_line, tipologia_id, status)
+                           VALUES (?, ?, ?, ?, ?, '2026-01-01 08:00:00', ?, ?, ?)""",
+                        (project, house_type_id, str(house), module, sequence, 'ABC'[sequence % 3],
+                         (house_type_id - 1) * 2 + 1, 'In Progress' if sequence <= len(stations) else 'Planned')
+                    )
+        # One module in progress at every station, with a few task logs each
+        for i, station_id in enumerate(stations):
+            plan_id = i + 1
+            plan = db.execute("SELECT project_id, house_type_id, module_sequence_in_house FROM ProductionPlan WHERE plan_id = ?", (plan_id,)).fetchone()
+            cursor = db.execute(
+                """INSERT INTO Modules (project_id, house_type_id, module_sequence_in_house, current_station_id, status, plan_id)
+                   VALUES (?, ?, ?, ?, 'In Progress', ?)""",
+                (plan[0], plan[1], plan[2], station_id, plan_id)
+            )
+            module_id = cursor.lastrowid
+            db.executemany(
+                """INSERT INTO TaskLogs (module_id, task_definition_id, worker_id, status, started_at, station_start)
+                   VALUES (?, ?, ?, 'Completed', '2026-01-01 09:00:00', ?)""",
+                [(module_id, td, (td % workers) + 1, station_id) for td in range(1, 4)]
+            )
+    db.close()
+    return stations
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (0-100) of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize_ms(samples):
+    """Formats latency samples (seconds) as p50/p99/mean in milliseconds."""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3) if samples else 0.0,
+    }
@@ -11,6 +11,105 @@ class Config:
     """Base configuration."""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'you-should-really-change-this')
     DATABASE_URI = f'sqlite:///{DATABASE_PATH}'
+    # Persistent connections kept open per worker process (see database/pool.py)
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 8))
+    # Seconds a request waits for a free connection before failing
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 10))
+    # GET/HEAD/OPTIONS requests use a separate pool of read-only (mode=ro, query_only)
+    # connections; under WAL they never wait on the write lock.
+    DATABASE_READ_ONLY_GETS = os.environ.get('DATABASE_READ_ONLY_GETS', 'True').lower() == 'true'
+    DATABASE_READ_POOL_SIZE = int(os.environ.get('DATABASE_READ_POOL_SIZE', 16))
+
+    # Named durability/concurrency profiles. The selected profile's pragmas are
+    # applied once to every connection handed out by get_db (see connection.apply_profile).
+    #   cache_size: negative values are KiB (-16000 = ~16 MB), positive values are pages
+    #   busy_timeout: milliseconds a connection waits on a lock before "database is locked"
+    #   auto_vacuum: only applies when the database file is created; existing files keep theirs
+    DATABASE_PROFILES = {
+        # Survives power loss on the tablets' host: every commit is fsynced.
+        'kiosk-safe': {
+            'auto_vacuum': 'INCREMENTAL', # Lets maintenance return free pages without a full VACUUM
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+            'cache_size': -16000,
+            'mmap_size': 0,
+            'temp_store': 'DEFAULT',
+        },
+        # WAL + synchronous=NORMAL only fsyncs at checkpoints; a power cut can lose
+        # the last few commits but never corrupts the database.
+        'high-throughput': {
+            'auto_vacuum': 'INCREMENTAL',
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 10000,
+            'cache_size': -64000,
+            'mmap_size': 268435456, # 256 MB
+            'temp_store': 'MEMORY',
+        },
+    }
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'kiosk-safe')
+
+    # Single-writer thread: write query functions are queued and group-committed
+    # (see database/writer.py). Disable to write directly on pooled connections.
+    DATABASE_WRITER_ENABLED = os.environ.get('DATABASE_WRITER_ENABLED', 'True').lower() == 'true'
+    DATABASE_WRITER_MAX_BATCH = 64 # Max operations committed in one transaction
+    DATABASE_WRITER_BATCH_WINDOW_MS = 2 # How long the writer waits for more operations to join a batch
+    DATABASE_WRITER_TIMEOUT = 30 # Seconds a request waits for its write to commit
+    # Time every statement on pooled/writer connections and aggregate per query
+    # (see database/instrumentation.py, /api/admin/database/query-stats)
+    DATABASE_QUERY_STATS = os.environ.get('DATABASE_QUERY_STATS', 'True').lower() == 'true'
+    # Statements slower than this (ms) are logged with their EXPLAIN QUERY PLAN; 0 disables.
+    # Requires DATABASE_QUERY_STATS. Records are appended to DATABASE_SLOW_QUERY_LOG
+    # (default: slow_queries.jsonl next to the database, '' for memory only).
+    DATABASE_SLOW_QUERY_MS = float(os.environ.get('DATABASE_SLOW_QUERY_MS', 100))
+    DATABASE_SLOW_QUERY_LOG = os.environ.get('DATABASE_SLOW_QUERY_LOG')
+    # Parameter values go to the log in plain text (PINs included) only if enabled; otherwise type and length
+    DATABASE_SLOW_QUERY_LOG_PARAMS = os.environ.get('DATABASE_SLOW_QUERY_LOG_PARAMS', 'False').lower() == 'true'
+    # Keep stations, specialties, house types etc. in memory per worker, revalidated against
+    # table generation counters on every read (see database/reference_cache.py)
+    DATABASE_REFERENCE_CACHE = os.environ.get('DATABASE_REFERENCE_CACHE', 'True').lower() == 'true'
+    # ETags on admin GET routes from the same counters; a matching If-None-Match gets a
+    # 304 without running the route's queries (see api/conditional.py)
+    DATABASE_CONDITIONAL_GET = os.environ.get('DATABASE_CONDITIONAL_GET', 'True').lower() == 'true'
+
+    # Response threads per worker process (gunicorn.conf.py reads the same variable). Each
+    # event stream subscriber below holds one while connected; all streams together may use
+    # all but STREAM_RESERVED_THREADS, kept for ordinary requests (see database/pubsub.py).
+    SERVER_THREADS = int(os.environ.get('GUNICORN_THREADS', 48))
+    STREAM_RESERVED_THREADS = int(os.environ.get('STREAM_RESERVED_THREADS', 16))
+
+    # Production status events (see database/status_feed.py)
+    STATUS_FEED_POLL_MS = int(os.environ.get('STATUS_FEED_POLL_MS', 1000)) # How soon other workers' commits are seen
+    STATUS_FEED_HEARTBEAT_SECONDS = 15 # Comment sent to idle subscribers, which also detects closed connections
+    STATUS_FEED_HISTORY = 64 # Events kept for clients resuming with Last-Event-ID
+    STATUS_FEED_MAX_SUBSCRIBERS = int(os.environ.get('STATUS_FEED_MAX_SUBSCRIBERS', 8)) # Per process; 0 = only the thread bound
+    # Station tablet events (see database/station_events.py): one stream per tablet
+    STATION_EVENTS_POLL_MS = int(os.environ.get('STATION_EVENTS_POLL_MS', 1000))
+    STATION_EVENTS_HEARTBEAT_SECONDS = 15
+    STATION_EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('STATION_EVENTS_MAX_SUBSCRIBERS', 24)) # Per process; 0 = only the thread bound
+
+    # Online backups (see database/backup.py): snapshots are copied a few pages at a
+    # time while the app keeps serving. Set the interval to 0 to disable scheduled backups.
+    DATABASE_BACKUP_DIR = os.environ.get('DATABASE_BACKUP_DIR') # Default: 'backups' next to the database file
+    DATABASE_BACKUP_KEEP = int(os.environ.get('DATABASE_BACKUP_KEEP', 7)) # Newest snapshots kept
+    DATABASE_BACKUP_INTERVAL_MINUTES = int(os.environ.get('DATABASE_BACKUP_INTERVAL_MINUTES', 24 * 60))
+    DATABASE_BACKUP_PAGES_PER_STEP = 256 # Pages copied between sleeps (1 MB at the default 4 KB page size)
+    DATABASE_BACKUP_STEP_SLEEP_MS = 20 # Pause between steps so writers are never starved
+
+    # Maintenance (see database/maintenance.py): plan rebalance, ANALYZE/optimize,
+    # incremental vacuum, WAL checkpoint and quick_check, once per quiet window. Local time, comma-separated
+    # "HH:MM-HH:MM" ranges (may cross midnight); empty disables the scheduler.
+    DATABASE_MAINTENANCE_WINDOWS = os.environ.get('DATABASE_MAINTENANCE_WINDOWS', '02:00-05:00')
+    DATABASE_MAINTENANCE_ANALYSIS_LIMIT = 1000 # Rows sampled per index by ANALYZE (0 = all rows)
+    DATABASE_MAINTENANCE_VACUUM_PAGES = 0 # Free pages released per run (0 = all)
+    DATABASE_MAINTENANCE_CHECKPOINT_MODE = 'TRUNCATE'
+    # Days of ChangeLog entries kept for GET /api/changes (see database/change_log.py); clients
+    # whose cursor is older reload everything. 0 keeps them forever.
+    DATABASE_CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('DATABASE_CHANGE_LOG_RETENTION_DAYS', 7))
+    # Databases created before auto_vacuum=INCREMENTAL was in the profile need one full
+    # VACUUM (blocks writes while it runs) before incremental vacuum can work.
+    DATABASE_MAINTENANCE_CONVERT_AUTO_VACUUM = os.environ.get('DATABASE_MAINTENANCE_CONVERT_AUTO_VACUUM', 'False').lower() == 'true'
     # Disable modification tracking for SQLAlchemy if not needed, reduces overhead
     SQLALCHEMY_TRACK_MODIFICATIONS = False # Although we are not using SQLAlchemy yet, good practice
 
@@ -0,0 +1,14 @@
+"""gunicorn settings, picked up by `gunicorn run:app` when started from backend/.
+
+The status feed and the station tablets hold a response thread per Server-Sent
+Events subscriber for as long as the browser stays connected. With the default
+sync workers each stream would take a whole worker process, so workers run
+threads (gthread). GUNICORN_THREADS is read by config.py too, to bound the
+threads the event streams may hold (see database/pubsub.py).
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 48))
@@ -17,5 +17,7 @@ if __name__ == '__main__':
     print(f" * Debug mode: {'on' if debug else 'off'}")
 
     # Note: For production, use a WSGI server like Gunicorn or Waitress
-    # Example: gunicorn -w 4 -b 0.0.0.0:5001 run:app
+    # Example: gunicorn run:app (settings in gunicorn.conf.py), i.e.
+    # gunicorn -w 4 --worker-class gthread --threads 48 -b 0.0.0.0:5001 run:app
+    # Threaded workers are required: every open event stream holds a thread.
     app.run(host=host, port=port, debug=debug)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import {
     DndContext,
     closestCenter,
@@ -226,10 +226,16 @@ const generateDeterministicColor = (projectId) => {
     return `hsl(${hue}, ${saturation}%, ${lightness}%)`;
 };
 
+// --- Helper Function to compare plan positions (planned_sequence, then plan_id, as the server pages them) ---
+const isBeforeInPlan = (item, other) => (
+    item.planned_sequence < other.planned_sequence
+    || (item.planned_sequence === other.planned_sequence && item.plan_id < other.plan_id)
+);
+
 
 // --- Sortable Item Component (for dnd-kit) ---
 // Moved outside ActiveProductionDashboard for correct component definition scope
-function SortableItem({ id, item, isSelected, onClick, onChangeLine, showProjectSeparator, projectColor, disabled, formatPlannedDate, onHouseTypeBadgeClick, onDateTimeBadgeClick }) { // Added onDateTimeBadgeClick prop
+function SortableItem({ id, item, position, isSelected, onClick, onChangeLine, showProjectSeparator, projectColor, disabled, formatPlannedDate, onHouseTypeBadgeClick, onDateTimeBadgeClick }) { // Added onDateTimeBadgeClick prop
     const {
         attributes,
         listeners: dndListeners, // Original dnd-kit listeners
@@ -298,7 +304,7 @@ function SortableItem({ id, item, isSelected, onClick, onChangeLine, showProject
                 }}
             >
                 {/* Sequence Number - Placed inside draggable part */}
-                <span style={{ fontWeight: 'bold', marginRight: '10px', color: '#666' }}>#{item.planned_sequence}:</span>
+                <span style={{ fontWeight: 'bold', marginRight: '10px', color: '#666' }}>#{position}:</span>
                 {/* Main text content - Now using JSX with colored project name and module badge */}
                 <span style={{ flexGrow: 1, overflow: 'hidden', textOverflow: 'ellipsis', whiteSpace: 'nowrap' }}>
                     <span style={{ color: projectColor, fontWeight: 'bold' }}>[{item.project_name}]</span>
@@ -369,6 +375,9 @@ function SortableItem({ id, item, isSelected, onClick, onChangeLine, showProject
 function ActiveProductionDashboard() {
     const [stationStatus, setStationStatus] = useState([]);
     const [upcomingItems, setUpcomingItems] = useState([]);
+    const [upcomingTotal, setUpcomingTotal] = useState(0); // All upcoming items, loaded or not
+    const [upcomingNextCursor, setUpcomingNextCursor] = useState(null); // Cursor of the next window, null when all are loaded
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState('');
     const [lastUpdated, setLastUpdated] = useState(null);
@@ -564,6 +573,106 @@ function ActiveProductionDashboard() {
     // --- End DateTime Modal Handlers ---
 
 
+    // Last upcoming item appended with "Cargar más" ({ planned_sequence, plan_id }), null while only the
+    // first window is shown. A refresh or snapshot loads the windows again up to it.
+    const loadedUntilRef = useRef(null);
+    const reloadIdRef = useRef(0); // Discards a reload overtaken by a newer refresh or snapshot
+
+    // Upcoming items after `cursor`, window by window, until the item `until` is reached
+    const reloadUpcomingUntil = useCallback(async (cursor, until) => {
+        let items = [];
+        let nextCursor = cursor;
+        while (nextCursor) {
+            const page = await adminService.getUpcomingProductionPlanPage(nextCursor);
+            items = items.concat(page.items);
+            nextCursor = page.next_cursor;
+            const last = page.items[page.items.length - 1];
+            if (!last || !isBeforeInPlan(last, until)) break;
+        }
+        return { items, nextCursor };
+    }, []);
+
+    // Replace everything with a full status payload (production_status or a `snapshot` event)
+    const applyStatusData = useCallback((statusData) => {
+        // Process station data into a map for easy lookup
+        const statusMap = statusData.station_status.reduce((acc, station) => {
+            acc[station.station_id] = station;
+            return acc;
+        }, {});
+        setStationStatus(statusMap);
+        setUpcomingTotal(statusData.upcoming_total);
+        setLastUpdated(new Date());
+
+        const reloadId = ++reloadIdRef.current;
+        const windowItems = statusData.upcoming_items;
+        const loadedUntil = loadedUntilRef.current;
+        if (!loadedUntil || !statusData.upcoming_next_cursor || !windowItems.length) {
+            loadedUntilRef.current = null;
+            setUpcomingItems(windowItems);
+            setUpcomingNextCursor(statusData.upcoming_next_cursor);
+            setIsLoadingMore(false);
+            return;
+        }
+        // Windows loaded with "Cargar más" stay on screen while they are loaded again up to the same item
+        const windowLast = windowItems[windowItems.length - 1];
+        const windowIds = new Set(windowItems.map(item => item.plan_id));
+        setUpcomingItems(prevItems => [
+            ...windowItems,
+            ...prevItems.filter(item => !windowIds.has(item.plan_id) && isBeforeInPlan(windowLast, item)),
+        ]);
+        setIsLoadingMore(true);
+        reloadUpcomingUntil(statusData.upcoming_next_cursor, loadedUntil).then(({ items, nextCursor }) => {
+            if (reloadId !== reloadIdRef.current) return;
+            setUpcomingItems(prevItems => {
+                // Deltas received meanwhile may have changed the first window: keep it as it is now
+                const headItems = prevItems.filter(item => !isBeforeInPlan(windowLast, item));
+                const headIds = new Set(headItems.map(item => item.plan_id));
+                return [...headItems, ...items.filter(item => !headIds.has(item.plan_id))];
+            });
+            setUpcomingNextCursor(nextCursor);
+        }).catch(err => {
+            if (reloadId !== reloadIdRef.current) return;
+            setError(`Error loading more upcoming items: ${err.message}`);
+            console.error(err);
+        }).finally(() => {
+            if (reloadId === reloadIdRef.current) setIsLoadingMore(false);
+        });
+    }, [reloadUpcomingUntil]);
+
+    // Merge a `delta` event: only the stations and upcoming items that changed are sent
+    const applyStatusDelta = useCallback((delta) => {
+        if (delta.station_status || delta.removed_stations) {
+            setStationStatus(prevStatus => {
+                const statusMap = { ...prevStatus };
+                (delta.removed_stations || []).forEach(stationId => { delete statusMap[stationId]; });
+                (delta.station_status || []).forEach(station => { statusMap[station.station_id] = station; });
+                return statusMap;
+            });
+        }
+        if (delta.upcoming_items || delta.upcoming_order) {
+            setUpcomingItems(prevItems => {
+                const itemsById = new Map(prevItems.map(item => [item.plan_id, item]));
+                (delta.upcoming_items || []).forEach(item => itemsById.set(item.plan_id, item));
+                if (!delta.upcoming_order) {
+                    return prevItems.map(item => itemsById.get(item.plan_id));
+                }
+                // The order covers the first window; items loaded after it with "Cargar más" are kept
+                const windowItems = delta.upcoming_order.map(planId => itemsById.get(planId)).filter(Boolean);
+                const windowIds = new Set(delta.upcoming_order);
+                const lastSequence = windowItems.length ? windowItems[windowItems.length - 1].planned_sequence : -Infinity;
+                const laterItems = prevItems.filter(item => !windowIds.has(item.plan_id) && item.planned_sequence > lastSequence);
+                return [...windowItems, ...laterItems];
+            });
+        }
+        if (delta.upcoming_total !== undefined) {
+            setUpcomingTotal(delta.upcoming_total);
+        }
+        if (delta.upcoming_next_cursor !== undefined && loadedUntilRef.current === null) {
+            setUpcomingNextCursor(delta.upcoming_next_cursor); // Only follows the first window
+        }
+        setLastUpdated(new Date());
+    }, []);
+
     const fetchData = useCallback(async () => {
         // Preserve selection if items still exist after fetch? For now, clear on fetch.
         // If preservation is needed, logic would compare old/new items.
@@ -572,22 +681,40 @@ function ActiveProductionDashboard() {
         setIsLoading(true);
         setError('');
         try {
-            const statusData = await adminService.getProductionStatus(); // Fetch status and ALL upcoming items
-            // Process station data into a map for easy lookup
-            const statusMap = statusData.station_status.reduce((acc, station) => {
-                acc[station.station_id] = station;
-                return acc;
-            }, {});
-            setStationStatus(statusMap);
-            setUpcomingItems(statusData.upcoming_items);
-            setLastUpdated(new Date());
+            const statusData = await adminService.getProductionStatus(); // Fetch status and the first window of upcoming items
+            applyStatusData(statusData);
         } catch (err) {
             setError(`Error fetching production status: ${err.message}`);
             console.error(err);
         } finally {
             setIsLoading(false);
         }
-    }, []);
+    }, [applyStatusData]);
+
+    // Append the next window of upcoming items (kept across refreshes, see applyStatusData)
+    const loadMoreUpcoming = useCallback(async () => {
+        if (!upcomingNextCursor) return;
+        const reloadId = reloadIdRef.current;
+        setIsLoadingMore(true);
+        try {
+            const page = await adminService.getUpcomingProductionPlanPage(upcomingNextCursor);
+            if (reloadId !== reloadIdRef.current) return; // A refresh replaced the list meanwhile
+            setUpcomingItems(prevItems => {
+                const loadedIds = new Set(prevItems.map(item => item.plan_id));
+                return [...prevItems, ...page.items.filter(item => !loadedIds.has(item.plan_id))];
+            });
+            setUpcomingNextCursor(page.next_cursor);
+            if (page.items.length) {
+                const last = page.items[page.items.length - 1];
+                loadedUntilRef.current = { planned_sequence: last.planned_sequence, plan_id: last.plan_id };
+            }
+        } catch (err) {
+            setError(`Error loading more upcoming items: ${err.message}`);
+            console.error(err);
+        } finally {
+            if (reloadId === reloadIdRef.current) setIsLoadingMore(false);
+        }
+    }, [upcomingNextCursor]);
 
     // --- Derived State ---
     // Get unique project details from the flat upcomingItems list
@@ -609,12 +736,44 @@ function ActiveProductionDashboard() {
         });
     }, [uniqueProjects]); // Dependency: uniqueProjects
 
+    // Live updates: status events pushed by the server, or polling every 30 seconds where
+    // EventSource is unavailable or the server refuses the stream (e.g. too many subscribers)
     useEffect(() => {
-        fetchData();
-        // Optional: Set up auto-refresh interval
-        const intervalId = setInterval(fetchData, 30000); // Refresh every 30 seconds
-        return () => clearInterval(intervalId); // Cleanup on unmount
-    }, [fetchData]);
+        let intervalId = null;
+        const startPolling = () => {
+            if (intervalId === null) {
+                fetchData();
+                intervalId = setInterval(fetchData, 30000); // Refresh every 30 seconds
+            }
+        };
+        if (typeof EventSource === 'undefined') {
+            startPolling();
+            return () => clearInterval(intervalId);
+        }
+
+        setIsLoading(true); // Until the first snapshot arrives
+        const source = adminService.openProductionStatusEvents();
+        source.addEventListener('snapshot', (event) => {
+            applyStatusData(JSON.parse(event.data));
+            setIsLoading(false);
+            setError('');
+        });
+        source.addEventListener('delta', (event) => {
+            applyStatusDelta(JSON.parse(event.data));
+        });
+        source.onerror = () => {
+            // A dropped connection is retried by the browser (readyState CONNECTING);
+            // a refused one is closed for good
+            if (source.readyState === EventSource.CLOSED) {
+                setIsLoading(false);
+                startPolling();
+            }
+        };
+        return () => { // Cleanup on unmount
+            source.close();
+            if (intervalId !== null) clearInterval(intervalId);
+        };
+    }, [fetchData, applyStatusData, applyStatusDelta]);
 
     // Removed toggleProjectCollapse function
 
@@ -682,6 +841,8 @@ function ActiveProductionDashboard() {
         if (over && active.id !== over.id) {
             const originalItems = [...upcomingItems]; // Store original order for potential revert
             let reorderedItems = originalItems;
+            let movedPlanIds = [active.id]; // Items whose position changes, in their new order
+            let movePosition = 'before'; // Where they go relative to over.id
 
             // Check if we dragged a group (more than one item)
             const isGroupDrag = draggedItemIds.size > 1;
@@ -718,6 +879,7 @@ function ActiveProductionDashboard() {
                     ...groupBeingDragged,                                   // The dragged group
                     ...itemsWithoutGroup.slice(newIndexInFilteredList)      // Items from 'over.id' onwards in the filtered list
                 ];
+                movedPlanIds = groupBeingDragged.map(item => item.plan_id);
 
             } else {
                 // --- Single Item Drag Logic (Existing) ---
@@ -729,23 +891,23 @@ function ActiveProductionDashboard() {
                     return;
                 }
                 reorderedItems = arrayMove(originalItems, oldIndex, newIndex);
+                // Moving down lands the item after 'over.id', moving up lands it before
+                movePosition = oldIndex < newIndex ? 'after' : 'before';
             }
 
             // --- Apply Changes (Optimistic Update & Backend Call) ---
-            // Update planned_sequence locally for immediate visual feedback
-            const itemsWithUpdatedSequence = reorderedItems.map((item, index) => ({
-                ...item,
-                planned_sequence: index + 1, // Update sequence based on new position (1-based)
-            }));
-
-            setUpcomingItems(itemsWithUpdatedSequence); // Update local state immediately with new sequence numbers
-
-            const orderedPlanIds = itemsWithUpdatedSequence.map(item => item.plan_id);
+            // Update the order locally for immediate visual feedback (positions are shown from the list order)
+            setUpcomingItems(reorderedItems);
 
             try {
                 setIsLoading(true);
                 setError('');
-                await adminService.reorderProductionPlan(orderedPlanIds);
+                // Only the moved items get new sequence keys on the server
+                const { updated } = await adminService.moveProductionPlanItems(movedPlanIds, over.id, movePosition);
+                const newKeys = new Map(updated.map(({ plan_id, planned_sequence }) => [plan_id, planned_sequence]));
+                setUpcomingItems(items => items.map(item =>
+                    newKeys.has(item.plan_id) ? { ...item, planned_sequence: newKeys.get(item.plan_id) } : item
+                ));
                 setLastUpdated(new Date());
                 // Optional: Clear selection after successful drag?
                 // setSelectedItemIds(new Set());
@@ -1075,7 +1237,7 @@ function ActiveProductionDashboard() {
 
             {/* Upcoming Items - Single Sortable List using dnd-kit */}
             <div style={{ marginTop: '20px' }}>
-                <h3 style={styles.header}>Plan de Producción Pendiente ({upcomingItems.length} items)</h3>
+                <h3 style={styles.header}>Plan de Producción Pendiente ({upcomingItems.length} de {upcomingTotal} items)</h3>
                 <DndContext
                     sensors={sensors}
                     collisionDetection={closestCenter}
@@ -1099,6 +1261,7 @@ function ActiveProductionDashboard() {
                                             key={item.plan_id}
                                             id={item.plan_id}
                                             item={item}
+                                            position={index + 1} // Place in the queue; planned_sequence keys are gapped
                                             isSelected={selectedItemIds.has(item.plan_id)} // Pass selection state
                                             onClick={handleItemClick} // Pass click handler for selection
                                             onChangeLine={handleChangeAssemblyLine} // Pass line change handler
@@ -1119,6 +1282,11 @@ function ActiveProductionDashboard() {
                         </div>
                     </SortableContext>
                 </DndContext>
+                {upcomingNextCursor && (
+                    <button onClick={loadMoreUpcoming} disabled={isLoadingMore} style={{ marginTop: '10px', padding: '5px 10px' }}>
+                        {isLoadingMore ? 'Cargando...' : `Cargar más (${upcomingTotal - upcomingItems.length} restantes)`}
+                    </button>
+                )}
                 {tipologiaModalOpen && (
                     <SetTipologiaModal
                         houseTypeName={tipologiaHouseTypeName}
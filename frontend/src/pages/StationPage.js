@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useMemo, useCallback } from 'react';
 import { Navigate } from 'react-router-dom';
 import SpecificStationSelectorModal from '../components/station/SpecificStationSelectorModal'; // Import the modal
-import { getStationOverviewData, startTask } from '../services/adminService'; // Import services
+import { getStationOverviewData, openStationEvents, startTask } from '../services/adminService'; // Import services
 
 const PANEL_LINE_GENERAL_VALUE = 'PANEL_LINE_GENERAL';
 const PANEL_LINE_GENERAL_LABEL = 'Línea de Paneles (General)';
@@ -82,8 +82,9 @@ const StationPage = ({ user, activeStationSequenceOrder, allStations, isLoadingA
         }
     }, [user, activeStationSequenceOrder, allStations, isLoadingAllStations]); // Removed currentSpecificStationId from deps as it's set inside
 
-    // Define fetchStationData using useCallback to stabilize its identity
-    const fetchStationData = useCallback(async () => {
+    // Define fetchStationData using useCallback to stabilize its identity.
+    // quiet: refresh in place (pushed changes), without clearing the page or showing the spinner
+    const fetchStationData = useCallback(async ({ quiet = false } = {}) => {
         if (!currentSpecificStationId || !user || user.specialty_id === undefined) {
             // Clear data if station or user/specialty is not set
             setModuleData(null);
@@ -93,12 +94,14 @@ const StationPage = ({ user, activeStationSequenceOrder, allStations, isLoadingA
             return;
         }
 
-        setIsLoadingStationData(true);
+        if (!quiet) {
+            setIsLoadingStationData(true);
+            setModuleData(null);
+            setUpcomingModuleData(null); // Clear upcoming module before fetch
+            setTasks([]);
+            setAvailablePanels([]); // Clear panels before fetch
+        }
         setStationDataError('');
-        setModuleData(null);
-        setUpcomingModuleData(null); // Clear upcoming module before fetch
-        setTasks([]);
-        setAvailablePanels([]); // Clear panels before fetch
         try {
             // console.log("Fetching station data for:", currentSpecificStationId, "Specialty:", user.specialty_id);
             const data = await getStationOverviewData(currentSpecificStationId, user.specialty_id);
@@ -111,7 +114,7 @@ const StationPage = ({ user, activeStationSequenceOrder, allStations, isLoadingA
             console.error("Error fetching station data:", error);
             setStationDataError(error.message || 'Error al cargar datos de la estación.');
         } finally {
-            setIsLoadingStationData(false);
+            if (!quiet) setIsLoadingStationData(false);
         }
     }, [currentSpecificStationId, user]); // Dependencies for useCallback
 
@@ -120,6 +123,34 @@ const StationPage = ({ user, activeStationSequenceOrder, allStations, isLoadingA
         fetchStationData();
     }, [fetchStationData]); // Depend on the stable fetchStationData function
 
+    // Refetch when the server says this station changed (a module moved in or out, a task
+    // was started or finished by anyone). Falls back to polling every minute when
+    // EventSource is unavailable or the server refuses the stream (e.g. too many subscribers)
+    useEffect(() => {
+        if (!currentSpecificStationId) return undefined;
+        let intervalId = null;
+        const refresh = () => fetchStationData({ quiet: true });
+        const startPolling = () => {
+            if (intervalId === null) intervalId = setInterval(refresh, 60000);
+        };
+        if (typeof EventSource === 'undefined') {
+            startPolling();
+            return () => clearInterval(intervalId);
+        }
+
+        const source = openStationEvents(currentSpecificStationId);
+        source.addEventListener('station', refresh);
+        source.onerror = () => {
+            // A dropped connection is retried by the browser (readyState CONNECTING);
+            // a refused one is closed for good
+            if (source.readyState === EventSource.CLOSED) startPolling();
+        };
+        return () => {
+            source.close();
+            if (intervalId !== null) clearInterval(intervalId);
+        };
+    }, [currentSpecificStationId, fetchStationData]);
+
     const handleSaveSpecificStation = (specificStationId) => {
         localStorage.setItem(SELECTED_SPECIFIC_STATION_ID_KEY, specificStationId);
         setCurrentSpecificStationId(specificStationId);
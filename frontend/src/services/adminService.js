@@ -32,6 +32,17 @@ export const reorderProductionPlan = async (orderedPlanIds) => {
     return handleResponse(response);
 };
 
+// Move production plan items just before or after another item (only the moved items are rewritten)
+export const moveProductionPlanItems = async (planIds, anchorPlanId, position = 'before') => {
+    const response = await fetch(`${API_BASE_URL}/production_plan/move`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ plan_ids: planIds, anchor_plan_id: anchorPlanId, position }),
+    });
+    // Returns { updated: [{ plan_id, planned_sequence }, ...] }
+    return handleResponse(response);
+};
+
 // === Workers ===
 
 export const getWorkers = async () => {
@@ -505,6 +516,7 @@ export const deleteParameterFromHouseTypeModule = async (houseTypeId, parameterI
 // Get production plan items with filtering/sorting/pagination
 export const getProductionPlan = async (params = {}) => {
     // params = { projectId, houseTypeId, status, startDateAfter, sortBy, sortOrder, limit, offset }
+    // or, for a keyset page in plan order, { ...filters, pageSize, cursor } -> { items, next_cursor, total }
     const query = new URLSearchParams(params).toString();
     const response = await fetch(`${API_BASE_URL}/production_plan?${query}`);
     return handleResponse(response);
@@ -520,6 +532,18 @@ export const changeProductionPlanItemLine = async (planId, newLine) => {
     return handleResponse(response); // Returns the updated plan item on success
 };
 
+// Apply per-item updates to plan items in one request and transaction.
+// patches: [{ plan_id, planned_assembly_line?, tipologia_id?, planned_start_datetime?, status?, planned_sequence? }, ...]
+export const patchProductionPlanItems = async (patches) => {
+    const response = await fetch(`${API_BASE_URL}/production_plan/patch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ patches }),
+    });
+    // Expects a 200 OK with a message and updated_count on success
+    return handleResponse(response);
+};
+
 // Change the planned assembly line for multiple plan items
 export const changeProductionPlanItemsLineBulk = async (planIds, newLine) => {
     const response = await fetch(`${API_BASE_URL}/production_plan/change_line_bulk`, {
@@ -558,8 +582,26 @@ export const setProductionPlanItemsDateTimeBulk = async (planIds, newDateTime) =
 
 // === Production Status Dashboard ===
 
-export const getProductionStatus = async () => { // Removed upcomingCount parameter
-    const response = await fetch(`${API_BASE_URL}/production_status`); // Removed query parameter
+// Station status plus the first window of upcoming items:
+// { station_status, upcoming_items, upcoming_next_cursor, upcoming_total }
+export const getProductionStatus = async (upcomingLimit = null) => {
+    const query = upcomingLimit ? `?upcomingLimit=${upcomingLimit}` : '';
+    const response = await fetch(`${API_BASE_URL}/production_status${query}`);
+    return handleResponse(response);
+};
+
+// Server-Sent Events with production status changes: a `snapshot` event (same payload as
+// getProductionStatus) and `delta` events with what changed. The browser reconnects by itself
+// and resumes from the last event it received.
+export const openProductionStatusEvents = () => {
+    return new EventSource(`${API_BASE_URL}/production_status/events`);
+};
+
+// Next window of upcoming items after `cursor` (an upcoming_next_cursor / next_cursor value):
+// { items, next_cursor, total }
+export const getUpcomingProductionPlanPage = async (cursor, pageSize = 200) => {
+    const query = new URLSearchParams({ status: 'Planned,Scheduled', pageSize, cursor, includeTotal: 'false' }).toString();
+    const response = await fetch(`${API_BASE_URL}/production_plan?${query}`);
     return handleResponse(response);
 };
 
@@ -592,6 +634,14 @@ export const getStationOverviewData = async (stationId, specialtyId) => {
     return handleResponse(response);
 };
 
+// Server-Sent Events telling a station's tablets when to refetch getStationOverviewData:
+// a `station` event (data: { station_id, reason, module_id }) whenever the module at the
+// station or one of its task logs changes. The browser reconnects by itself and is told
+// (reason 'missed') if the station changed meanwhile.
+export const openStationEvents = (stationId) => {
+    return new EventSource(`${API_BASE_URL}/station_overview/${stationId}/events`);
+};
+
 
 /**
  * Sends a request to start a specific task for a planned production item (module).
@@ -622,3 +672,24 @@ export const startTask = async (planId, taskDefinitionId, workerId, stationStart
     });
     return handleResponse(response); // handleResponse throws error on non-ok status
 };
+
+// === Change Feed ===
+const CHANGES_API_URL = `${API_BASE_URL.replace('/api/admin', '')}/api/changes`;
+
+/**
+ * Row-level changes since a cursor, to keep local copies of tables in sync instead of
+ * refetching whole lists. Call without a cursor first to get the current one, load the
+ * lists, then call with next_cursor until has_more is false. A 410 error means the cursor
+ * is too old: reload the lists and start over.
+ * @param {string|null} cursor - next_cursor of the previous call, or null.
+ * @param {Array<string>} [tables] - Table names to follow (e.g. ['ProductionPlan', 'Workers']); all if omitted.
+ * @returns {Promise<{changes: Array<{table: string, op: 'upsert'|'delete', key: Array, row?: object}>, key_columns: object, next_cursor: string, has_more: boolean}>}
+ */
+export const getChanges = async (cursor = null, tables = null) => {
+    const params = new URLSearchParams();
+    if (cursor) params.append('since', cursor);
+    if (tables && tables.length > 0) params.append('tables', tables.join(','));
+    const queryString = params.toString();
+    const response = await fetch(`${CHANGES_API_URL}${queryString ? `?${queryString}` : ''}`);
+    return handleResponse(response);
+};